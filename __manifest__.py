@@ -15,15 +15,26 @@
         'base',       
         'web',       
         'mail',       
+        'bus',
     ],
     'data': [
         'security/ir.model.access.csv', 
+        'data/ir_cron_data.xml',
         'views/pesquisa_aiia_server_actions.xml',
         'views/pesquisa_aiia_search_wizard_view.xml', 
+        'views/pesquisa_aiia_export_wizard_view.xml',
         'views/pesquisa_aiia_search_views.xml', 
         'views/pesquisa_aiia_lead_views.xml',          
+        'views/pesquisa_aiia_outbox_views.xml',
+        'views/pesquisa_aiia_report_views.xml',
+        'views/pesquisa_aiia_campaign_views.xml',
         'views/res_config_settings_views.xml'
     ],
+    'assets': {
+        'web.assets_backend': [
+            'pesquisa_aiia/static/src/js/search_bus.js',
+        ],
+    },
     'installable': True,
     'application': True, 
     'auto_install': False,
@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 from . import webhook_controller
-from . import aiia_search_controller
\ No newline at end of file
+from . import aiia_search_controller
+from . import metrics_controller
+from . import export_controller
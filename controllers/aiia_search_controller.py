@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
 import logging
 from odoo import http
@@ -6,46 +7,56 @@ from odoo.http import request, Response
 import werkzeug
 from odoo.exceptions import UserError, ValidationError # Importar ValidationError
 
+from ..utils import http_body
+from .idempotency import idempotent_call, request_idempotency_key
+from .metrics_controller import instrumented
+
 _logger = logging.getLogger(__name__)
 
 class AiiaSearchUpdate(http.Controller):
 
-    def _validate_request(self):
-        """Valida o segredo do webhook de update, se configurado."""
-        secret = request.env['ir.config_parameter'].sudo().get_param('pesquisa_aiia.aiia_odoo_update_secret') # Usa o novo segredo
-        if secret:
-            received_secret = request.httprequest.headers.get('X-N8N-Odoo-Update-Secret') # Header específico
-            if not received_secret or received_secret != secret:
-                _logger.warning("AI Search Update: Chamada não autorizada (segredo inválido/ausente).")
-                raise werkzeug.exceptions.Unauthorized("Segredo inválido.")
-        return True
+    def _read_verified_body(self):
+        """
+        Valida o segredo do webhook de update (se configurado) sobre os bytes
+        crus e retorna o corpo já descomprimido.
+        :raises http_body.BodyError: com o status HTTP a devolver
+        """
+        settings = request.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        return http_body.read_verified(request.httprequest.stream, request.httprequest.headers,
+                                       settings.update_secret, 'X-N8N-Odoo-Update-Secret', # Header específico
+                                       settings.webhook_max_body_mb * 1024 * 1024)
 
     @http.route('/pesquisa_aiia/update_search', type='http', auth='public', methods=['POST'], csrf=False)
+    @instrumented('/pesquisa_aiia/update_search')
     def update_search_status(self, **kwargs):
         """ Recebe atualização do N8N sobre status e token da próxima página."""
         try:
-            self._validate_request()
-        except werkzeug.exceptions.Unauthorized as e:
-             return Response(json.dumps({'status': 'error', 'message': str(e)}),
-                             content_type='application/json', status=401)
+            raw_body = self._read_verified_body()
+        except http_body.BodyError as e:
+            if e.status == 401:
+                _logger.warning("AI Search Update: Chamada não autorizada (segredo inválido/ausente).")
+            else:
+                _logger.warning("AI Search Update: Corpo recusado (HTTP %s) - %s", e.status, e)
+            return Response(json.dumps({'status': 'error', 'message': str(e)}),
+                            content_type='application/json', status=e.status)
 
         webhook_data = None
         try:
-            raw_body = request.httprequest.data
             if not raw_body:
                  _logger.warning("AI Search Update: Corpo vazio recebido.")
                  return Response(json.dumps({'status': 'error', 'message': 'Corpo vazio'}),
                                  content_type='application/json', status=400)
-            body_str = raw_body.decode('utf-8')
-            _logger.info("AI Search Update: Corpo Raw Recebido: %s", body_str)
-            webhook_data = json.loads(body_str)
+            webhook_data = json.loads(raw_body)
 
         except Exception as e:
             _logger.error("AI Search Update: Erro ao processar corpo: %s", str(e))
             return Response(json.dumps({'status': 'error', 'message': f'Erro corpo: {str(e)}'}),
                             content_type='application/json', status=400)
 
-        _logger.info("AI Search Update: Dados recebidos: %s", json.dumps(webhook_data))
+        if not isinstance(webhook_data, dict):
+            _logger.error("AI Search Update: Payload inválido - esperava um objeto JSON.")
+            return Response(json.dumps({'status': 'error', 'message': 'Payload inválido (esperava um objeto JSON)'}),
+                            content_type='application/json', status=400)
 
         # Validação do payload
         search_id = webhook_data.get('search_id')
@@ -60,8 +71,17 @@ class AiiaSearchUpdate(http.Controller):
             return Response(json.dumps({'status': 'error', 'message': 'Payload inválido (search_id ou status ausente/inválido)'}),
                             content_type='application/json', status=400)
 
+        # Idempotência: retentativas do N8N recebem a resposta original sem reescrever a pesquisa
+        route = '/pesquisa_aiia/update_search'
+        settings = request.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        key = request_idempotency_key(route, search_id, status, next_page_token, hashlib.sha256(raw_body).hexdigest())
+        return idempotent_call(route, key, settings.idempotency_ttl_hours,
+                               lambda: self._apply_search_update(search_id, status, next_page_token, error_message))
+
+    def _apply_search_update(self, search_id, status, next_page_token, error_message):
         # Atualizar o registro da pesquisa
-        search_record = request.env['pesquisa_aiia.search'].sudo().browse(search_id)
+        # tracking_disable: a transição fica no histórico de status, sem custo de chatter
+        search_record = request.env['pesquisa_aiia.search'].sudo().with_context(tracking_disable=True).browse(search_id)
         if not search_record.exists():
             _logger.error(f"AI Search Update: Search ID {search_id} não encontrado.")
             return Response(json.dumps({'status': 'error', 'message': f'Search ID {search_id} não encontrado'}),
@@ -83,13 +103,19 @@ class AiiaSearchUpdate(http.Controller):
             request.env.cr.rollback()
             return Response(json.dumps({'status': 'error', 'message': f'Erro interno ao atualizar pesquisa: {str(e)}'}),
                             content_type='application/json', status=500)
-        
+
     @http.route('/pesquisa_aiia/rpc/start_search', type='json', auth='user')
-    def rpc_start_new_search(self, query):
-        """Endpoint RPC para iniciar uma nova pesquisa."""
+    @instrumented('/pesquisa_aiia/rpc/start_search')
+    def rpc_start_new_search(self, query, auto_paginate=False, auto_max_pages=0, auto_max_leads=0, force_refresh=False):
+        """
+        Endpoint RPC para iniciar uma nova pesquisa (opcionalmente com paginação automática).
+        force_refresh=True ignora o cache de resultados e consulta o N8N.
+        """
         try:
             # Chama o método de classe no modelo
-            search_id = request.env['pesquisa_aiia.search'].start_new_search(query)
+            search_id = request.env['pesquisa_aiia.search'].start_new_search(
+                query, auto_paginate=auto_paginate, auto_max_pages=auto_max_pages, auto_max_leads=auto_max_leads,
+                force_refresh=force_refresh)
             return {'status': 'success', 'search_id': search_id}
         except (UserError, ValidationError) as e:
             # Retorna erros de validação/usuário como erros tratados
@@ -102,7 +128,30 @@ class AiiaSearchUpdate(http.Controller):
             # Retorna erro genérico (Odoo pode já fazer isso, mas para garantir)
             raise werkzeug.exceptions.InternalServerError(f"Erro interno: {str(e)}")
 
+    @http.route('/pesquisa_aiia/rpc/start_campaign', type='json', auth='user')
+    @instrumented('/pesquisa_aiia/rpc/start_campaign')
+    def rpc_start_campaign(self, name, terms, locations=None, max_parallel=5, message=None, auto_paginate=False,
+                           auto_max_pages=0, auto_max_leads=0, force_refresh=False):
+        """
+        Endpoint RPC para iniciar uma campanha: `terms` (e opcionalmente
+        `locations`, para o produto termo × local) como listas ou texto com um
+        item por linha. Retorna a campanha e as pesquisas criadas.
+        """
+        try:
+            campaign = request.env['pesquisa_aiia.campaign'].start_campaign(
+                name, terms, locations=locations, max_parallel=max_parallel, message=message,
+                auto_paginate=auto_paginate, auto_max_pages=auto_max_pages, auto_max_leads=auto_max_leads,
+                force_refresh=force_refresh)
+            return {'status': 'success', 'campaign_id': campaign.id, 'search_ids': campaign.search_ids.ids}
+        except (UserError, ValidationError) as e:
+            _logger.warning(f"Erro ao iniciar campanha via RPC: {e}")
+            raise e
+        except Exception as e:
+            _logger.exception(f"Erro inesperado em RPC start_campaign: {e}")
+            raise werkzeug.exceptions.InternalServerError(f"Erro interno: {str(e)}")
+
     @http.route('/pesquisa_aiia/rpc/search_next_page', type='json', auth='user')
+    @instrumented('/pesquisa_aiia/rpc/search_next_page')
     def rpc_search_next_page(self, search_id):
         """Endpoint RPC para solicitar a próxima página."""
         if not search_id:
@@ -113,10 +162,39 @@ class AiiaSearchUpdate(http.Controller):
                  raise UserError(f"Pesquisa com ID {search_id} não encontrada.")
             # Chama o método de instância no registro correto
             search_record.search_next_page()
-            return {'status': 'success', 'message': 'Solicitação da próxima página enviada.'}
+            return {'status': 'success', 'message': 'Solicitação da próxima página enfileirada.'}
         except (UserError, ValidationError) as e:
             _logger.warning(f"Erro ao solicitar próxima página via RPC (Search ID: {search_id}): {e}")
             raise e
         except Exception as e:
             _logger.exception(f"Erro inesperado em RPC search_next_page (Search ID: {search_id}): {e}")
-            raise werkzeug.exceptions.InternalServerError(f"Erro interno: {str(e)}")
\ No newline at end of file
+            raise werkzeug.exceptions.InternalServerError(f"Erro interno: {str(e)}")
+
+    @http.route('/pesquisa_aiia/rpc/whatsapp_links', type='json', auth='user')
+    @instrumented('/pesquisa_aiia/rpc/whatsapp_links')
+    def rpc_whatsapp_links(self, lead_ids, format='json'):
+        """
+        Endpoint RPC para gerar links WhatsApp de vários leads em uma chamada.
+        format='json' retorna os links e os inválidos; format='csv' gera um
+        anexo temporário (apagado após uma hora) e retorna a URL de download.
+        """
+        if not lead_ids or not isinstance(lead_ids, list):
+            raise ValidationError("Lista de IDs de leads não fornecida.")
+        leads = request.env['pesquisa_aiia.lead'].browse([int(lead_id) for lead_id in lead_ids]).exists()
+        if format == 'csv':
+            action = leads.action_export_whatsapp_links('csv')
+            return {'status': 'success', 'url': action['url']}
+        links, invalid = leads._prepare_whatsapp_links()
+        return {'status': 'success', 'links': links, 'invalid': invalid}
+
+    @http.route('/pesquisa_aiia/rpc/search_leads', type='json', auth='user')
+    @instrumented('/pesquisa_aiia/rpc/search_leads')
+    def rpc_search_leads(self, query, limit=50, offset=0, search_id=None):
+        """
+        Endpoint RPC de busca textual nos leads, ordenada por relevância
+        (nome, resumo da atividade, endereço e e-mail).
+        """
+        if not query or not isinstance(query, str):
+            raise ValidationError("Texto da busca não fornecido.")
+        leads = request.env['pesquisa_aiia.lead'].search_ranked(query, limit=limit, offset=offset, search_id=search_id)
+        return {'status': 'success', 'leads': leads}
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import logging
+from odoo import api, http
+from odoo.fields import Datetime
+from odoo.http import request, Response, content_disposition
+from odoo.tools import SQL
+
+from ..utils import lead_export
+from .metrics_controller import instrumented
+
+_logger = logging.getLogger(__name__)
+
+
+def _iter_lead_batches(registry, uid, context, search_id, field_names):
+    """
+    Lê os leads da pesquisa (próprios e vinculados pela deduplicação) em lotes
+    de um cursor do servidor, num cursor de banco próprio: o da requisição já
+    foi fechado quando a resposta começa a ser enviada.
+    """
+    with registry.cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        Lead = env['pesquisa_aiia.lead']
+        # _search aplica os direitos de acesso e as regras de registro do usuário
+        query = Lead._search(['|', ('search_id', '=', search_id), ('linked_search_ids', 'in', search_id)],
+                             order='id')
+        columns = ['"%s"."%s"' % (query.table, field_name) for field_name in field_names]
+        cr.execute(SQL("DECLARE pesquisa_aiia_export NO SCROLL CURSOR FOR %s", query.select(*columns)))
+        total = 0
+        while True:
+            cr.execute("FETCH FORWARD %s FROM pesquisa_aiia_export", [lead_export.FETCH_SIZE])
+            rows = cr.fetchall()
+            if not rows:
+                break
+            total += len(rows)
+            yield rows
+        _logger.info("Exportação Pesquisa AIIA: %d lead(s) da pesquisa %s enviados.", total, search_id)
+
+
+class PesquisaAiiaExport(http.Controller):
+
+    @http.route('/pesquisa_aiia/export/<int:search_id>', type='http', auth='user', methods=['GET'])
+    @instrumented('/pesquisa_aiia/export')
+    def export_search_leads(self, search_id, format='csv', fields=None, **kwargs):
+        """
+        Exporta os leads de uma pesquisa em CSV ou XLSX, em fluxo: a memória
+        não cresce com o número de leads e o CSV começa a chegar de imediato.
+        Parâmetros: format=csv|xlsx, fields=name,phone,... (ver EXPORT_FIELDS).
+        """
+        if format not in lead_export.FORMATS:
+            return Response("Formato inválido. Use csv ou xlsx.", status=400, content_type='text/plain')
+        try:
+            field_names = lead_export.parse_fields(fields)
+        except lead_export.ExportError as e:
+            return Response(str(e), status=400, content_type='text/plain')
+        if format == 'xlsx' and lead_export.xlsxwriter is None:
+            return Response("Exportação XLSX indisponível: xlsxwriter não instalado.", status=501,
+                            content_type='text/plain')
+
+        search = request.env['pesquisa_aiia.search'].browse(search_id).exists()
+        if not search:
+            return Response("Pesquisa não encontrada.", status=404, content_type='text/plain')
+        # Falha aqui (403) antes de começar a enviar o arquivo
+        search.check_access_rights('read')
+        search.check_access_rule('read')
+        Lead = request.env['pesquisa_aiia.lead']
+        Lead.check_access_rights('read')
+
+        headers = [Lead._fields[field_name].string for field_name in field_names]
+        batches = _iter_lead_batches(request.env.registry, request.env.uid, dict(request.env.context),
+                                     search.id, field_names)
+        if format == 'xlsx':
+            body = lead_export.iter_xlsx(headers, batches)
+        else:
+            body = lead_export.iter_csv(headers, batches)
+
+        filename = 'leads_pesquisa_%s_%s.%s' % (search.id, Datetime.now().strftime('%Y%m%d_%H%M%S'), format)
+        _logger.info("Exportação Pesquisa AIIA: pesquisa %s em %s (%s).", search.id, format, ", ".join(field_names))
+        return Response(body, status=200, direct_passthrough=True, headers=[
+            ('Content-Type', lead_export.FORMATS[format]),
+            ('Content-Disposition', content_disposition(filename)),
+            ('Cache-Control', 'no-store'),
+            ('X-Accel-Buffering', 'no'),  # nginx: repassa os pedaços sem acumular
+        ])
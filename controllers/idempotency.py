@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+from odoo.http import request, Response
+
+from ..utils import metrics
+
+_logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def request_idempotency_key(route, *derived_parts):
+    """
+    Chave da requisição: o header Idempotency-Key (por rota) ou, na falta
+    dele, um hash das partes informadas (search_id, token, digest do corpo...).
+    """
+    header_key = (request.httprequest.headers.get(IDEMPOTENCY_HEADER) or '').strip()
+    if header_key:
+        return 'header:%s:%s' % (route, header_key[:200])
+    return request.env['pesquisa_aiia.idempotency'].sudo()._derive_key(route, *derived_parts)
+
+
+def idempotent_call(route, key, ttl_hours, handler):
+    """
+    Executa `handler()` uma única vez por chave. Retentativas recebem a
+    resposta original (2xx) de volta; respostas de erro não são guardadas.
+    """
+    Idempotency = request.env['pesquisa_aiia.idempotency'].sudo()
+    outcome, claim_id, stored = Idempotency._claim(key, route, ttl_hours)
+    if outcome == 'replay':
+        status, body = stored
+        _logger.info("Idempotência Pesquisa AIIA: retentativa em %s respondida com a resposta original.", route)
+        metrics.inc('pesquisa_aiia_idempotent_replays_total', route=route)
+        return Response(body, content_type='application/json', status=status,
+                        headers=[('Idempotent-Replayed', 'true')])
+    if outcome == 'busy':
+        _logger.info("Idempotência Pesquisa AIIA: requisição com a mesma chave em andamento em %s.", route)
+        return Response(json.dumps({'status': 'error', 'message': 'Requisição com a mesma chave em processamento.'}),
+                        content_type='application/json', status=409, headers=[('Retry-After', '5')])
+
+    response = handler()
+    if 200 <= response.status_code < 300:
+        Idempotency._store_response(claim_id, response.status_code, response.get_data(as_text=True))
+    else:
+        Idempotency._release(claim_id)
+    return response
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import functools
+import hmac
+import logging
+import time
+from odoo import http
+from odoo.http import request, Response
+
+from ..utils import metrics
+
+_logger = logging.getLogger(__name__)
+
+
+def instrumented(route):
+    """
+    Decorador para as rotas do módulo: conta requisições por status, bytes
+    recebidos e latência. Deve ficar abaixo de @http.route.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            status = 500
+            try:
+                result = endpoint(*args, **kwargs)
+                status = getattr(result, 'status_code', 200)
+                return result
+            except Exception as e:
+                status = getattr(e, 'code', None) or 500
+                raise
+            finally:
+                metrics.inc('pesquisa_aiia_requests_total', route=route, status=status)
+                metrics.inc('pesquisa_aiia_request_bytes_total', request.httprequest.content_length or 0, route=route)
+                metrics.observe('pesquisa_aiia_request_duration_seconds', time.perf_counter() - started_at, route=route)
+                request.env['pesquisa_aiia.metric'].sudo()._flush_process_metrics()
+        return wrapper
+    return decorator
+
+
+class PesquisaAiiaMetrics(http.Controller):
+
+    @http.route('/pesquisa_aiia/metrics', type='http', auth='public', methods=['GET'], csrf=False)
+    def metrics_endpoint(self, **kwargs):
+        """Exposição no formato texto do Prometheus, protegida por token."""
+        token = request.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().metrics_token
+        if not token:
+            # Sem token configurado o endpoint fica desativado
+            return Response('Not Found', status=404, content_type='text/plain')
+        auth_header = request.httprequest.headers.get('Authorization', '')
+        received = auth_header[7:] if auth_header.startswith('Bearer ') else kwargs.get('token', '')
+        if not hmac.compare_digest(received.encode('utf-8'), token.encode('utf-8')):
+            _logger.warning("Métricas Pesquisa AIIA: token inválido.")
+            return Response('Unauthorized', status=401, content_type='text/plain')
+        body = request.env['pesquisa_aiia.metric'].sudo()._render_prometheus()
+        return Response(body, status=200, content_type='text/plain; version=0.0.4; charset=utf-8')
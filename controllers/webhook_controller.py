@@ -1,120 +1,181 @@
 # -*- coding: utf-8 -*-
+import itertools
 import json
 import logging
+import time
 from odoo import http
 from odoo.http import request, Response
-import werkzeug
+
+from ..utils import http_body, json_stream, metrics
+from .idempotency import IDEMPOTENCY_HEADER, idempotent_call, request_idempotency_key
+from .metrics_controller import instrumented
 
 _logger = logging.getLogger(__name__)
 
+REQUIRED_FIELDS = ['search_id', 'nome_empresa', 'contato_telefonico', 'email', 'endereco', 'resumo_atividade']
+
+
 class PesquisaAiiaWebhook(http.Controller):
 
     @http.route('/pesquisa_aiia/webhook', type='http', auth='public', methods=['POST'], csrf=False)
+    @instrumented('/pesquisa_aiia/webhook')
     def handle_webhook_http(self, **kwargs):
         """
         Recebe uma LISTA de dados de leads do N8N via POST, lê o corpo manualmente como JSON.
+        O segredo/HMAC é verificado sobre os bytes crus antes do parse; aceita gzip/deflate.
+        A lista é decodificada incrementalmente, um item por vez, e os leads são
+        criados em lotes: a memória fica limitada ao tamanho do lote, não do payload.
+        Retentativas (mesmo header Idempotency-Key ou mesmo corpo) recebem a
+        resposta original sem criar leads de novo.
+        """
+        return self._handle_stream(json_stream.iter_json_array, '/pesquisa_aiia/webhook', 'Webhook Pesquisa AIIA')
+
+    @http.route('/pesquisa_aiia/webhook/ndjson', type='http', auth='public', methods=['POST'], csrf=False)
+    @instrumented('/pesquisa_aiia/webhook/ndjson')
+    def handle_webhook_ndjson(self, **kwargs):
+        """
+        Variante NDJSON do webhook: um lead (objeto JSON) por linha.
+        Linhas inválidas são reportadas em errors_details sem interromper as demais.
+        Mesma autenticação, limites, idempotência e resposta de /pesquisa_aiia/webhook.
         """
-        all_webhook_data = None
+        return self._handle_stream(json_stream.iter_ndjson, '/pesquisa_aiia/webhook/ndjson', 'Webhook Pesquisa AIIA (NDJSON)')
+
+    def _handle_stream(self, parser, route, log_prefix):
+        settings = request.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+
+        # --- Autenticação (antes de qualquer parse) ---
+        # Sem header Idempotency-Key, a chave deriva do digest do corpo cru
+        with_digest = not request.httprequest.headers.get(IDEMPOTENCY_HEADER)
         try:
-            raw_body = request.httprequest.data
-            if not raw_body:
-                _logger.warning("Webhook Pesquisa AIIA: Corpo da requisição vazio recebido.")
-                return Response(json.dumps({'status': 'error', 'message': 'Corpo da requisição vazio'}),
-                                content_type='application/json', status=400)
-
-            body_str = raw_body.decode('utf-8')
-            _logger.info("Webhook Pesquisa AIIA: Corpo Raw Recebido (esperando lista): %s", body_str[:1000]) # Loga parte do corpo
-
-            all_webhook_data = json.loads(body_str)
-
-            # *** VALIDAÇÃO: Espera-se uma LISTA ***
-            if not isinstance(all_webhook_data, list):
-                 _logger.error("Webhook Pesquisa AIIA: Formato inválido - Esperava uma lista, recebeu %s.", type(all_webhook_data).__name__)
-                 return Response(json.dumps({'status': 'error', 'message': 'Formato inválido. Esperava uma lista de leads.'}),
-                                 content_type='application/json', status=400)
-
-        except json.JSONDecodeError as e:
-            _logger.error("Webhook Pesquisa AIIA: Erro ao decodificar JSON - %s. Corpo: %s", str(e), body_str[:500])
-            return Response(json.dumps({'status': 'error', 'message': f'Erro ao decodificar JSON: {str(e)}'}),
-                            content_type='application/json', status=400)
-        except Exception as e:
-            _logger.exception("Webhook Pesquisa AIIA: Erro inesperado ao processar corpo da requisição - %s", str(e))
-            return Response(json.dumps({'status': 'error', 'message': f'Erro ao processar corpo: {str(e)}'}),
-                            content_type='application/json', status=500)
-
-        _logger.info("Webhook Pesquisa AIIA Recebido: %d leads na lista.", len(all_webhook_data))
-
-        # --- Validação de Segurança (Opcional) ---
-        secret = request.env['ir.config_parameter'].sudo().get_param('pesquisa_aiia.webhook_secret')
-        received_secret = request.httprequest.headers.get('X-N8N-Signature')
-        if secret and received_secret != secret:
-            _logger.warning("Webhook Pesquisa AIIA: Segredo inválido recebido.")
-            return Response(json.dumps({'status': 'error', 'message': 'Unauthorized'}),
-                            content_type='application/json', status=401)
-
-        # --- Processamento e Criação dos Leads (Iterando a Lista) ---
-        leads_criados_count = 0
-        leads_erros_count = 0
+            opened = http_body.open_verified(request.httprequest.stream, request.httprequest.headers,
+                                             settings.webhook_secret, 'X-N8N-Signature',
+                                             settings.webhook_max_body_mb * 1024 * 1024,
+                                             with_digest=with_digest)
+        except http_body.BodyError as e:
+            if e.status == 401:
+                _logger.warning("%s: Segredo/assinatura inválido recebido.", log_prefix)
+            else:
+                _logger.warning("%s: Corpo recusado (HTTP %s) - %s", log_prefix, e.status, e)
+            return Response(json.dumps({'status': 'error', 'message': str(e)}),
+                            content_type='application/json', status=e.status)
+        chunks, body_digest = opened if with_digest else (opened, None)
+
+        # --- Idempotência: retentativas do N8N recebem a resposta original ---
+        key = request_idempotency_key(route, body_digest)
+        return idempotent_call(route, key, settings.idempotency_ttl_hours,
+                               lambda: self._ingest_stream(chunks, parser, settings, log_prefix))
+
+    def _ingest_stream(self, chunks, parser, settings, log_prefix):
+        # --- Validação e Criação dos Leads em Lotes (dedup + create multi + savepoint por lote) ---
+        started_at = time.perf_counter()
+        batch_size = max(settings.webhook_batch_size, 1)
+        dedup_policy = settings.dedup_policy
+        counters = {'processed': 0}
         erros_detalhes = []
-        required_fields = ['search_id', 'nome_empresa', 'contato_telefonico', 'email', 'endereco', 'resumo_atividade']
-
-        PesquisaSearch = request.env['pesquisa_aiia.search'].sudo()
         PesquisaLead = request.env['pesquisa_aiia.lead'].sudo()
+        try:
+            items = self._count_items(parser(chunks), counters)
+            batches = self._iter_valid_batches(items, batch_size, erros_detalhes, log_prefix)
+            ingest_summary = PesquisaLead._ingest_batches(batches, dedup_policy=dedup_policy, release_cache=True)
+        except (http_body.BodyError, json_stream.StreamFormatError) as e:
+            # Nada é gravado se o corpo estiver truncado/malformado
+            request.env.cr.rollback()
+            status = getattr(e, 'status', 400)
+            _logger.error("%s: Corpo inválido após %d item(ns) - %s", log_prefix, counters['processed'], e)
+            return Response(json.dumps({'status': 'error', 'message': str(e)}),
+                            content_type='application/json', status=status)
+
+        if not counters['processed'] and parser is json_stream.iter_ndjson:
+            _logger.warning("%s: Corpo da requisição vazio recebido.", log_prefix)
+            return Response(json.dumps({'status': 'error', 'message': 'Corpo da requisição vazio'}),
+                            content_type='application/json', status=400)
 
-        # Verificar search_ids únicos para buscar em lote (otimização)
-        search_ids_na_lista = {item.get('search_id') for item in all_webhook_data if isinstance(item.get('search_id'), int)}
-        existing_searches = PesquisaSearch.browse(list(search_ids_na_lista))
-        existing_search_map = {s.id: s for s in existing_searches}
+        leads_criados_count = ingest_summary['created']
+        erros_detalhes.extend(ingest_summary['errors'])
+        erros_detalhes.sort(key=lambda err: err['index'])
+        leads_erros_count = len(erros_detalhes)
 
-        for index, lead_data in enumerate(all_webhook_data):
-            try:
-                # --- Validação dos Dados de cada lead na lista ---
-                search_id = lead_data.get('search_id') if isinstance(lead_data, dict) else None
+        elapsed = time.perf_counter() - started_at
+        leads_per_second = round(leads_criados_count / elapsed, 1) if elapsed > 0 else float(leads_criados_count)
+        _logger.info("%s: %d itens recebidos, %d leads criados, %d duplicados (%s), %d erros em %.3fs (%.1f leads/s, lotes de %d).",
+                     log_prefix, counters['processed'], leads_criados_count, ingest_summary['duplicates'], dedup_policy,
+                     leads_erros_count, elapsed, leads_per_second, batch_size)
 
-                if not isinstance(lead_data, dict) \
-                   or not all(field in lead_data for field in required_fields) \
-                   or not isinstance(search_id, int):
-                    _logger.error("Webhook AIIA Lead (item %d): Dados incompletos/inválidos - %s", index, lead_data)
-                    erros_detalhes.append({'index': index, 'error': 'Dados incompletos ou formato inválido (search_id obrigatório e inteiro)'})
-                    leads_erros_count += 1
-                    continue # Pula para o próximo item da lista
-
-                # Verificar se a pesquisa existe (usando o mapa pré-buscado)
-                search_record = existing_search_map.get(search_id)
-                if not search_record:
-                     _logger.warning(f"Webhook AIIA Lead (item %d): Search ID {search_id} não encontrado ao tentar criar lead.", index)
-                     # Decisão: Continuar ou falhar? Vamos continuar e logar.
-                     # Pode ser que a pesquisa tenha sido apagada entre o envio e o recebimento.
-
-                # Criar o lead
-                lead_vals = {
-                    'search_id': search_id,
-                    'name': lead_data.get('nome_empresa'),
-                    'phone': lead_data.get('contato_telefonico'),
-                    'email': lead_data.get('email'),
-                    'address': lead_data.get('endereco'),
-                    'activity_summary': lead_data.get('resumo_atividade'),
-                }
-                new_lead = PesquisaLead.create(lead_vals)
-                _logger.info(f"Webhook AIIA Lead (item %d): Lead {new_lead.id} criado e vinculado à pesquisa {search_id}.")
-                leads_criados_count += 1
-
-            except Exception as e:
-                _logger.exception("Webhook Pesquisa AIIA (item %d): Erro ao criar lead - %s. Dados: %s", index, str(e), lead_data)
-                leads_erros_count += 1
-                erros_detalhes.append({'index': index, 'error': f'Erro interno: {str(e)}'})
-                # Importante: Não fazer rollback aqui para não desfazer leads já criados com sucesso na mesma requisição
-                # request.env.cr.rollback() # <<-- EVITAR DENTRO DO LOOP SE QUISER PROCESSAMENTO PARCIAL
+        metrics.observe('pesquisa_aiia_webhook_leads_per_request', counters['processed'], buckets=metrics.SIZE_BUCKETS)
+        metrics.inc('pesquisa_aiia_leads_created_total', leads_criados_count)
+        metrics.inc('pesquisa_aiia_leads_errors_total', leads_erros_count)
+        metrics.inc('pesquisa_aiia_leads_duplicated_total', ingest_summary['duplicates'])
 
         # --- Resposta Final ---
         response_status = 200 if leads_erros_count == 0 else 207 # 200 OK ou 207 Multi-Status
         response_data = {
             'status': 'success' if leads_erros_count == 0 else 'partial_success',
-            'leads_processed': len(all_webhook_data),
+            'leads_processed': counters['processed'],
             'leads_created': leads_criados_count,
             'leads_errors': leads_erros_count,
+            'leads_duplicated': ingest_summary['duplicates'],
+            'leads_merged': ingest_summary['merged'],
+            'leads_linked': ingest_summary['linked'],
+            'duration_seconds': round(elapsed, 3),
+            'leads_per_second': leads_per_second,
         }
         if erros_detalhes:
              response_data['errors_details'] = erros_detalhes
 
-        return Response(json.dumps(response_data), content_type='application/json', status=response_status)
\ No newline at end of file
+        return Response(json.dumps(response_data), content_type='application/json', status=response_status)
+
+    @staticmethod
+    def _count_items(items, counters):
+        for index, item in items:
+            counters['processed'] += 1
+            yield index, item
+
+    def _iter_valid_batches(self, items, batch_size, erros_detalhes, log_prefix):
+        """
+        Agrupa os itens decodificados em lotes de `batch_size`, valida cada item
+        e gera os lotes [(índice, vals), ...] prontos para `_ingest_batches`.
+        A existência dos search_ids é verificada com uma consulta por lote,
+        apenas para os ids ainda não vistos na requisição.
+        """
+        PesquisaSearch = request.env['pesquisa_aiia.search'].sudo()
+        known_search_ids = {}  # search_id -> existe
+        while True:
+            raw_batch = list(itertools.islice(items, batch_size))
+            if not raw_batch:
+                return
+
+            new_search_ids = {item.get('search_id') for _index, item in raw_batch
+                              if isinstance(item, dict) and isinstance(item.get('search_id'), int)} - known_search_ids.keys()
+            if new_search_ids:
+                existing = set(PesquisaSearch.browse(list(new_search_ids)).exists().ids)
+                known_search_ids.update((search_id, search_id in existing) for search_id in new_search_ids)
+                if new_search_ids - existing:
+                    # Pode ser que a pesquisa tenha sido apagada entre o envio e o recebimento.
+                    _logger.warning("%s: Search IDs não encontrados: %s", log_prefix, sorted(new_search_ids - existing))
+
+            batch = []
+            for index, lead_data in raw_batch:
+                if isinstance(lead_data, json_stream.StreamFormatError):
+                    erros_detalhes.append({'index': index, 'error': str(lead_data)})
+                    continue
+                search_id = lead_data.get('search_id') if isinstance(lead_data, dict) else None
+
+                if not isinstance(lead_data, dict) \
+                   or not all(field in lead_data for field in REQUIRED_FIELDS) \
+                   or not isinstance(search_id, int):
+                    erros_detalhes.append({'index': index, 'error': 'Dados incompletos ou formato inválido (search_id obrigatório e inteiro)'})
+                    continue
+
+                if not known_search_ids.get(search_id):
+                    erros_detalhes.append({'index': index, 'error': f'Search ID {search_id} não encontrado'})
+                    continue
+
+                batch.append((index, {
+                    'search_id': search_id,
+                    'name': lead_data.get('nome_empresa'),
+                    'phone': lead_data.get('contato_telefonico'),
+                    'email': lead_data.get('email'),
+                    'address': lead_data.get('endereco'),
+                    'activity_summary': lead_data.get('resumo_atividade'),
+                }))
+            yield batch
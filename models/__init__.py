@@ -1,5 +1,17 @@
 # -*- coding: utf-8 -*-
 from . import pesquisa_aiia_search
+from . import pesquisa_aiia_search_history
 from . import pesquisa_aiia_lead
+from . import pesquisa_aiia_outbox
 from . import pesquisa_aiia_search_wizard
-from . import res_config_settings
\ No newline at end of file
+from . import res_config_settings
+from . import ir_config_parameter
+from . import pesquisa_aiia_metric
+from . import pesquisa_aiia_idempotency
+from . import pesquisa_aiia_rate_bucket
+from . import pesquisa_aiia_lead_archive
+from . import pesquisa_aiia_export_wizard
+from . import mail_mail
+from . import pesquisa_aiia_report_daily
+from . import pesquisa_aiia_campaign
+from . import pesquisa_aiia_campaign_wizard
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, tools
+
+from ..utils.settings import AiiaSettings, PARAM_PREFIX
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model
+    @tools.ormcache()
+    def _get_pesquisa_aiia_settings(self):
+        """
+        Carrega todos os parâmetros 'pesquisa_aiia.*' com uma única consulta.
+        O resultado fica em cache por registry e é invalidado pelo próprio
+        create/write/unlink de ir.config_parameter (inclusive ao salvar as
+        Configurações), que já limpam o ormcache.
+        """
+        self.env.cr.execute("SELECT key, value FROM ir_config_parameter WHERE key LIKE %s",
+                            [PARAM_PREFIX.replace('_', '\\_') + '%'])
+        return AiiaSettings.from_params(dict(self.env.cr.fetchall()))
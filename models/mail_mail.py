@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+class MailMail(models.Model):
+    _inherit = 'mail.mail'
+
+    # Pesquisa de origem dos e-mails enfileirados pelo envio em massa (progresso na pesquisa)
+    pesquisa_aiia_search_id = fields.Many2one('pesquisa_aiia.search', string='Pesquisa AIIA',
+                                              ondelete='set null', index='btree_not_null')
+
+    def _postprocess_sent_message(self, success_pids, failure_reason=False, failure_type=None):
+        if failure_type:
+            # O mail apaga (auto_delete) até falhas de destinatário: as do envio em massa
+            # ficam guardadas para o progresso da pesquisa contá-las como falha
+            self.filtered(lambda mail: mail.pesquisa_aiia_search_id and mail.auto_delete).write(
+                {'auto_delete': False})
+        return super()._postprocess_sent_message(success_pids, failure_reason=failure_reason,
+                                                 failure_type=failure_type)
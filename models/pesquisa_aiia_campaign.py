@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+import logging
+
+from ..utils import metrics, templates
+from ..utils.normalize import normalize_query
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaCampaign(models.Model):
+    """
+    Campanha: um lote de pesquisas (lista de termos ou termos × locais)
+    criado de uma vez. O despachante respeita `max_parallel`, e o progresso
+    e os totais de leads são somados a partir das pesquisas filhas.
+    """
+    _name = 'pesquisa_aiia.campaign'
+    _description = 'Campanha de Pesquisas AIIA'
+    _order = 'create_date desc'
+    _inherit = ['mail.thread']
+
+    name = fields.Char(string='Nome', required=True, tracking=True)
+    user_id = fields.Many2one('res.users', string='Iniciada por', default=lambda self: self.env.user, readonly=True)
+    max_parallel = fields.Integer(string='Pesquisas em Paralelo', default=5,
+                                  help="Máximo de pesquisas desta campanha processando no N8N ao mesmo tempo. 0 = sem limite.")
+    search_ids = fields.One2many('pesquisa_aiia.search', 'campaign_id', string='Pesquisas', readonly=True)
+    # --- Totais somados das pesquisas (uma agregação para todo o recordset) ---
+    search_count = fields.Integer(string='Pesquisas', compute='_compute_progress')
+    search_done_count = fields.Integer(string='Finalizadas', compute='_compute_progress')
+    search_error_count = fields.Integer(string='Com Erro', compute='_compute_progress')
+    search_processing_count = fields.Integer(string='Processando', compute='_compute_progress')
+    progress = fields.Float(string='Progresso (%)', compute='_compute_progress')
+    lead_total = fields.Integer(string='Total de Leads', compute='_compute_progress')
+    contact_created_count = fields.Integer(string='Contatos Criados', compute='_compute_progress')
+    state = fields.Selection([
+        ('running', 'Em Andamento'),
+        ('done', 'Concluída'),
+    ], string='Situação', compute='_compute_progress')
+
+    # Evita campanhas acidentais gigantes (ex.: listas coladas erradas)
+    _MAX_QUERIES = 5000
+
+    def _compute_progress(self):
+        campaign_ids = [campaign_id for campaign_id in self._origin.ids if campaign_id]
+        stats = {}
+        if campaign_ids:
+            groups = self.env['pesquisa_aiia.search']._read_group(
+                [('campaign_id', 'in', campaign_ids)], ['campaign_id', 'status'],
+                ['__count', 'lead_total:sum', 'contact_created_count:sum'])
+            for campaign, status, count, leads, contacts in groups:
+                values = stats.setdefault(campaign.id, {'total': 0, 'done': 0, 'error': 0, 'processing': 0,
+                                                        'leads': 0, 'contacts': 0})
+                values['total'] += count
+                values['done'] += count if status in ('completed', 'error') else 0
+                values['error'] += count if status == 'error' else 0
+                values['processing'] += count if status == 'processing' else 0
+                values['leads'] += leads or 0
+                values['contacts'] += contacts or 0
+        for campaign in self:
+            values = stats.get(campaign._origin.id, {})
+            total = values.get('total', 0)
+            campaign.search_count = total
+            campaign.search_done_count = values.get('done', 0)
+            campaign.search_error_count = values.get('error', 0)
+            campaign.search_processing_count = values.get('processing', 0)
+            campaign.progress = values.get('done', 0) * 100.0 / total if total else 0.0
+            campaign.lead_total = values.get('leads', 0)
+            campaign.contact_created_count = values.get('contacts', 0)
+            campaign.state = 'done' if total and values.get('done', 0) >= total else 'running'
+
+    @api.model
+    def _parse_lines(self, text):
+        """Uma entrada por linha (ou lista), sem vazias nem repetidas, mantendo a ordem."""
+        lines = text.splitlines() if isinstance(text, str) else list(text or [])
+        return list(dict.fromkeys(line.strip() for line in lines if line and line.strip()))
+
+    @api.model
+    def _build_queries(self, terms, locations=None):
+        """Termos puros ou o produto termo × local ("dentistas em Campinas")."""
+        terms = self._parse_lines(terms)
+        locations = self._parse_lines(locations)
+        if not terms:
+            raise ValidationError(_("Informe ao menos um termo de pesquisa."))
+        queries = ["%s em %s" % (term, location) for term in terms for location in locations] if locations else terms
+        # Termos que só diferem em maiúsculas/acentos/pontuação viram uma única pesquisa
+        unique = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query) or query, query)
+        queries = list(unique.values())
+        if len(queries) > self._MAX_QUERIES:
+            raise UserError(_("A campanha geraria %s pesquisas; o máximo é %s.") % (len(queries), self._MAX_QUERIES))
+        return queries
+
+    @api.model
+    def start_campaign(self, name, terms, locations=None, max_parallel=5, message=None,
+                       auto_paginate=False, auto_max_pages=0, auto_max_leads=0, force_refresh=False):
+        """
+        Cria a campanha e todas as pesquisas filhas de uma vez: termos com
+        resultado recente no cache são atendidos na hora; os demais são criados
+        com um único create e enfileirados com um único insert na outbox.
+
+        :return: a campanha criada
+        """
+        queries = self._build_queries(terms, locations)
+        Search = self.env['pesquisa_aiia.search']
+        campaign = self.create({
+            'name': name or queries[0],
+            'max_parallel': max(int(max_parallel or 0), 0),
+        })
+
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        cached = {}
+        if settings.result_cache_ttl_hours > 0:
+            if force_refresh:
+                metrics.inc('pesquisa_aiia_result_cache_total', len(queries), outcome='refresh')
+            else:
+                cached = Search._find_cached_results(queries)
+        to_send = []
+        for query in queries:
+            source = cached.get(normalize_query(query))
+            if source:
+                Search._start_from_cache(query, source, {'campaign_id': campaign.id})
+            else:
+                to_send.append(query)
+        if settings.result_cache_ttl_hours > 0 and not force_refresh:
+            metrics.inc('pesquisa_aiia_result_cache_total', len(queries) - len(to_send), outcome='hit')
+            metrics.inc('pesquisa_aiia_result_cache_total', len(to_send), outcome='miss')
+
+        if to_send:
+            # Falha cedo se a integração não estiver configurada
+            Search._get_n8n_trigger_url()
+            searches = Search.create([{
+                'search_query': query,
+                'user_id': self.env.user.id,
+                'status': 'new',
+                'campaign_id': campaign.id,
+                'page_count': 1,
+                'auto_paginate': bool(auto_paginate),
+                'auto_max_pages': max(int(auto_max_pages or 0), 0),
+                'auto_max_leads': max(int(auto_max_leads or 0), 0),
+            } for query in to_send])
+            self.env['pesquisa_aiia.outbox']._enqueue_many([(search, 'start', {
+                'search_id': search.id,
+                'query': search.search_query,
+                'message': templates.render(message, {'search_query': search.search_query}, keep_missing=True)
+                           if message else message,
+                'odoo_user_id': search.user_id.id,
+                'odoo_user_name': search.user_id.name,
+                'campaign_id': campaign.id,
+            }) for search in searches])
+
+        _logger.info("Campanha ID %s: %d pesquisa(s) criada(s), %d do cache.",
+                     campaign.id, len(queries), len(queries) - len(to_send))
+        campaign.message_post(
+            body=_("%s pesquisa(s) criada(s) (%s atendida(s) pelo cache), até %s em paralelo.")
+            % (len(queries), len(queries) - len(to_send), campaign.max_parallel or _("ilimitadas")),
+            message_type='comment', subtype_xmlid='mail.mt_note')
+        return campaign
+
+    def action_view_searches(self):
+        self.ensure_one()
+        action = self.env['ir.actions.act_window']._for_xml_id('pesquisa_aiia.action_pesquisa_aiia_search_main')
+        action['name'] = _('Pesquisas da Campanha: %s') % self.name
+        action['display_name'] = action['name']
+        action['domain'] = [('campaign_id', '=', self.id)]
+        action['context'] = {'create': False}
+        return action
+
+    def action_view_results(self):
+        self.ensure_one()
+        action = self.env['ir.actions.act_window']._for_xml_id('pesquisa_aiia.action_pesquisa_aiia_leads')
+        action['name'] = _('Leads da Campanha: %s') % self.name
+        action['display_name'] = action['name']
+        search_ids = self.search_ids.ids
+        action['domain'] = ['|', ('search_id', 'in', search_ids), ('linked_search_ids', 'in', search_ids)]
+        action['context'] = {'create': False}
+        return action
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaCampaignWizard(models.TransientModel):
+    _name = 'pesquisa_aiia.campaign.wizard'
+    _description = 'Assistente para Iniciar Campanha de Pesquisas AIIA'
+
+    name = fields.Char(string='Nome da Campanha', required=True)
+    mode = fields.Selection([
+        ('list', 'Lista de Termos'),
+        ('product', 'Termos × Locais'),
+    ], string='Tipo', required=True, default='list',
+        help="Lista: uma pesquisa por termo. Termos × Locais: uma pesquisa para cada combinação \"termo em local\".")
+    terms = fields.Text(string='Termos', required=True, help="Um termo por linha.")
+    locations = fields.Text(string='Locais', help="Um local por linha (ex.: cidades).")
+    query_count = fields.Integer(string='Pesquisas a Criar', compute='_compute_query_count')
+    max_parallel = fields.Integer(string='Pesquisas em Paralelo', default=5,
+                                  help="Máximo de pesquisas desta campanha processando no N8N ao mesmo tempo. 0 = sem limite.")
+    use_default_message = fields.Boolean(string='Usar Mensagem Padrão?', default=True,
+                                         help="Se marcado, usará a mensagem padrão definida nas configurações.")
+    custom_message = fields.Text(string='Mensagem Personalizada')
+    auto_paginate = fields.Boolean(string='Paginação Automática',
+                                   help="Busca as próximas páginas de cada pesquisa automaticamente até o fim ou até um dos limites.")
+    auto_max_pages = fields.Integer(string='Máximo de Páginas', default=0, help="0 = sem limite.")
+    auto_max_leads = fields.Integer(string='Máximo de Leads', default=0, help="0 = sem limite.")
+    force_refresh = fields.Boolean(string='Forçar Nova Consulta',
+                                   help="Ignora o cache de resultados e consulta o N8N para todos os termos.")
+
+    @api.depends('mode', 'terms', 'locations')
+    def _compute_query_count(self):
+        Campaign = self.env['pesquisa_aiia.campaign']
+        for wizard in self:
+            terms = len(Campaign._parse_lines(wizard.terms))
+            locations = len(Campaign._parse_lines(wizard.locations)) if wizard.mode == 'product' else 0
+            wizard.query_count = terms * locations if locations else terms
+
+    def _get_message_to_send(self):
+        """Mensagem padrão ou personalizada; o [Pesquisa] é preenchido por termo na campanha."""
+        self.ensure_one()
+        if self.use_default_message:
+            return self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().default_whatsapp_msg
+        if not self.custom_message or not self.custom_message.strip():
+            raise UserError(_("Você escolheu usar uma mensagem personalizada, mas não a digitou."))
+        return self.custom_message.strip()
+
+    def action_start_campaign(self):
+        self.ensure_one()
+        if self.mode == 'product' and not self.env['pesquisa_aiia.campaign']._parse_lines(self.locations):
+            raise UserError(_("Informe ao menos um local para combinar com os termos."))
+        campaign = self.env['pesquisa_aiia.campaign'].start_campaign(
+            name=self.name.strip(),
+            terms=self.terms,
+            locations=self.locations if self.mode == 'product' else None,
+            max_parallel=self.max_parallel,
+            message=self._get_message_to_send(),
+            auto_paginate=self.auto_paginate,
+            auto_max_pages=self.auto_max_pages,
+            auto_max_leads=self.auto_max_leads,
+            force_refresh=self.force_refresh,
+        )
+        _logger.info("Wizard: Campanha ID %s iniciada com %d pesquisa(s).", campaign.id, len(campaign.search_ids))
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Campanha Iniciada'),
+            'res_model': 'pesquisa_aiia.campaign',
+            'res_id': campaign.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
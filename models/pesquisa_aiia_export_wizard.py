@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from urllib.parse import urlencode
+
+from ..utils import lead_export
+
+class PesquisaAiiaExportWizard(models.TransientModel):
+    _name = 'pesquisa_aiia.export.wizard'
+    _description = 'Assistente de Exportação de Leads Pesquisa AIIA'
+
+    search_id = fields.Many2one('pesquisa_aiia.search', string='Pesquisa', required=True, ondelete='cascade')
+    export_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ], string='Formato', required=True, default='csv')
+    field_ids = fields.Many2many('ir.model.fields', 'pesquisa_aiia_export_wizard_field_rel', 'wizard_id', 'field_id',
+                                 string='Campos', default=lambda self: self._default_field_ids(),
+                                 domain=[('model', '=', 'pesquisa_aiia.lead'), ('name', 'in', lead_export.EXPORT_FIELDS)])
+
+    @api.model
+    def _default_field_ids(self):
+        return self.env['ir.model.fields'].search([('model', '=', 'pesquisa_aiia.lead'),
+                                                   ('name', 'in', lead_export.DEFAULT_FIELDS)])
+
+    def action_export(self):
+        """Abre o endpoint de exportação em fluxo com o formato e os campos escolhidos."""
+        self.ensure_one()
+        if not self.field_ids:
+            raise UserError(_("Selecione ao menos um campo para exportar."))
+        # Mantém a ordem padrão das colunas, independente da ordem de seleção
+        selected = set(self.field_ids.mapped('name'))
+        field_names = [name for name in lead_export.EXPORT_FIELDS if name in selected]
+        query = urlencode({'format': self.export_format, 'fields': ','.join(field_names)})
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/pesquisa_aiia/export/%s?%s' % (self.search_id.id, query),
+            'target': 'self',
+        }
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+import hashlib
+import logging
+
+from psycopg2 import errors
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaIdempotency(models.Model):
+    """
+    Chaves de idempotência das rotas chamadas pelo N8N. A chave é reservada
+    na mesma transação que processa a requisição e recebe a resposta gerada;
+    uma retentativa com a mesma chave recebe essa resposta de volta, sem
+    tocar em leads ou pesquisas. Se a requisição falhar, o rollback desfaz a
+    reserva junto com o resto e a retentativa é processada normalmente.
+    """
+    _name = 'pesquisa_aiia.idempotency'
+    _description = 'Chave de Idempotência Pesquisa AIIA'
+    _order = 'id desc'
+    _log_access = False
+
+    key = fields.Char(string='Chave', required=True, readonly=True)
+    route = fields.Char(string='Rota', readonly=True)
+    response_status = fields.Integer(string='Status HTTP', readonly=True)
+    response_body = fields.Text(string='Resposta', readonly=True)
+    created_at = fields.Datetime(string='Recebida em', readonly=True, default=fields.Datetime.now)
+    expires_at = fields.Datetime(string='Expira em', readonly=True, index=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'A chave de idempotência deve ser única.'),
+    ]
+
+    # Linhas removidas por lote na limpeza das chaves expiradas
+    _EVICT_BATCH_SIZE = 10000
+
+    @api.model
+    def _derive_key(self, route, *parts):
+        """Chave derivada quando o N8N não envia o header Idempotency-Key."""
+        digest = hashlib.sha256()
+        for part in (route,) + parts:
+            digest.update(str(part if part is not None else '').encode('utf-8'))
+            digest.update(b'\x00')
+        return 'derived:' + digest.hexdigest()
+
+    @api.model
+    def _claim(self, key, route, ttl_hours):
+        """
+        Reserva a chave na transação atual (INSERT ... ON CONFLICT).
+
+        :return: ('claimed', id, None) se esta requisição deve ser processada,
+                 ('replay', id, (status, corpo)) se a chave já foi concluída, ou
+                 ('busy', None, None) se outra requisição com a mesma chave
+                 ainda está em andamento
+        """
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    INSERT INTO pesquisa_aiia_idempotency (key, route, created_at, expires_at)
+                    VALUES (%s, %s, now() at time zone 'UTC', now() at time zone 'UTC' + make_interval(hours => %s))
+                    ON CONFLICT (key) DO UPDATE
+                       SET route = EXCLUDED.route, created_at = EXCLUDED.created_at, expires_at = EXCLUDED.expires_at,
+                           response_status = NULL, response_body = NULL
+                     WHERE pesquisa_aiia_idempotency.expires_at < now() at time zone 'UTC'
+                    RETURNING id
+                """, (key, route, max(int(ttl_hours), 1)))
+                row = self.env.cr.fetchone()
+        except errors.SerializationFailure:
+            # A linha concorrente não é visível no snapshot desta transação
+            return ('busy', None, None)
+        if row:
+            return ('claimed', row[0], None)
+        self.env.cr.execute("""
+            SELECT id, response_status, response_body FROM pesquisa_aiia_idempotency
+             WHERE key = %s AND response_status IS NOT NULL
+        """, (key,))
+        row = self.env.cr.fetchone()
+        if row:
+            return ('replay', row[0], (row[1], row[2]))
+        # A linha concorrente foi gravada depois do início desta transação
+        return ('busy', None, None)
+
+    @api.model
+    def _store_response(self, claim_id, status, body):
+        """Grava a resposta da requisição dona da chave (mesma transação)."""
+        self.env.cr.execute("""
+            UPDATE pesquisa_aiia_idempotency SET response_status = %s, response_body = %s WHERE id = %s
+        """, (status, body, claim_id))
+
+    @api.model
+    def _release(self, claim_id):
+        """Libera a chave: respostas de erro não são reaproveitadas."""
+        self.env.cr.execute("DELETE FROM pesquisa_aiia_idempotency WHERE id = %s", (claim_id,))
+
+    @api.model
+    def _cron_evict_expired(self):
+        """Remove as chaves expiradas em lotes, com commit por lote."""
+        total = 0
+        while True:
+            self.env.cr.execute("""
+                DELETE FROM pesquisa_aiia_idempotency
+                 WHERE id IN (SELECT id FROM pesquisa_aiia_idempotency
+                               WHERE expires_at < now() at time zone 'UTC'
+                               LIMIT %s)
+            """, (self._EVICT_BATCH_SIZE,))
+            deleted = self.env.cr.rowcount
+            total += deleted
+            self.env.cr.commit()
+            if deleted < self._EVICT_BATCH_SIZE:
+                break
+        if total:
+            _logger.info("Idempotência Pesquisa AIIA: %d chave(s) expirada(s) removida(s).", total)
+        return total
@@ -1,8 +1,21 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, Command, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.osv import expression
+from odoo.tools import SQL
+from datetime import timedelta
 import urllib.parse
 import re # Para validação básica de telefone
+import csv
+import hashlib
+import io
+import json
+import logging
+
+from ..utils import templates
+from ..utils.normalize import DEFAULT_COUNTRY_CODE, lead_keys, normalize_phone_e164
+
+_logger = logging.getLogger(__name__)
 
 class PesquisaAiiaLead(models.Model):
     _name = 'pesquisa_aiia.lead'
@@ -10,25 +23,365 @@ class PesquisaAiiaLead(models.Model):
     _order = 'create_date desc' # Ordena os mais recentes primeiro
 
     search_id = fields.Many2one('pesquisa_aiia.search', string='Pesquisa Origem', ondelete='set null', index=True)
-    name = fields.Char(string='Nome da Empresa', required=True)
+    name = fields.Char(string='Nome da Empresa', required=True, index='trigram')
     phone = fields.Char(string='Telefone')
-    email = fields.Char(string='E-mail')
+    email = fields.Char(string='E-mail', index='trigram')
     address = fields.Text(string='Endereço')
     activity_summary = fields.Text(string='Resumo da Atividade')
     message_text = fields.Text(string='Texto da Mensagem', default="")
     use_default_message = fields.Boolean(string='Usar Mensagem Padrão?', default=True)
     contact_created = fields.Boolean(string='Contato Criado?', default=False, readonly=True, copy=False)
 
+    # --- Chaves Normalizadas (Deduplicação) ---
+    phone_normalized = fields.Char(string='Telefone (E.164)', compute='_compute_normalized_keys',
+                                   store=True, readonly=True, index=True, copy=False)
+    email_normalized = fields.Char(string='E-mail Normalizado', compute='_compute_normalized_keys',
+                                   store=True, readonly=True, index=True, copy=False)
+    fingerprint = fields.Char(string='Impressão Digital (Nome/Endereço)', compute='_compute_normalized_keys',
+                              store=True, readonly=True, index=True, copy=False,
+                              help="Hash do nome e endereço simplificados, usado para detectar duplicatas.")
+    linked_search_ids = fields.Many2many('pesquisa_aiia.search', 'pesquisa_aiia_lead_search_rel', 'lead_id', 'search_id',
+                                         string='Também Encontrado Em', readonly=True, copy=False,
+                                         help="Outras pesquisas que retornaram este mesmo lead.")
+
+    # Busca textual: usa a coluna tsvector mantida pelo PostgreSQL (ver init)
+    text_search = fields.Char(string='Busca Textual', compute='_compute_text_search', search='_search_text_search',
+                              help="Palavras no nome, resumo da atividade ou endereço (índice de texto completo).")
+
+    _DEDUP_MERGE_FIELDS = ('name', 'phone', 'email', 'address', 'activity_summary')
+
+    # Coluna gerada pelo PostgreSQL (fora do ORM): nome (peso A), atividade (B), endereço (C)
+    _SEARCH_VECTOR_SQL = """
+        setweight(to_tsvector('portuguese', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(activity_summary, '')), 'B') ||
+        setweight(to_tsvector('portuguese', coalesce(address, '')), 'C')
+    """
+
+    def init(self):
+        # Mantida pelo próprio banco a cada INSERT/UPDATE, sem custo no ORM
+        self.env.cr.execute("""
+            ALTER TABLE pesquisa_aiia_lead
+            ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (%s) STORED
+        """ % self._SEARCH_VECTOR_SQL)
+        tools.create_index(self.env.cr, 'pesquisa_aiia_lead_search_vector_idx', self._table,
+                           ['search_vector'], method='gin')
+        # Resumo diário: leads alterados desde a marca d'água e leads de um dia
+        tools.create_index(self.env.cr, 'pesquisa_aiia_lead_write_date_idx', self._table, ['write_date'])
+        tools.create_index(self.env.cr, 'pesquisa_aiia_lead_create_date_idx', self._table, ['create_date'])
+
+    def _compute_text_search(self):
+        for lead in self:
+            lead.text_search = False
+
+    def _search_text_search(self, operator, value):
+        if operator not in ('ilike', '=', 'like', 'not ilike', '!=', 'not like') or not value:
+            raise UserError(_("Operação não suportada na busca textual."))
+        query = ("""
+            SELECT id FROM pesquisa_aiia_lead
+             WHERE search_vector @@ websearch_to_tsquery('portuguese', %s)
+        """, [value])
+        return [('id', 'not inselect' if operator in ('not ilike', '!=', 'not like') else 'inselect', query)]
+
+    @api.model
+    def search_ranked(self, query, limit=50, offset=0, search_id=None):
+        """
+        Busca textual ordenada por relevância: palavras no nome, atividade e
+        endereço (índice GIN do tsvector) e trechos do nome/e-mail (índices
+        trigrama). Respeita as regras de acesso do usuário.
+
+        :return: lista de dicts com id, name, phone, email, search_id e rank
+        """
+        query = (query or '').strip()
+        if not query:
+            return []
+        self.check_access_rights('read')
+        pattern = '%%%s%%' % query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        domain = []
+        if search_id:
+            domain = ['|', ('search_id', '=', int(search_id)), ('linked_search_ids', 'in', int(search_id))]
+        # _search aplica as regras de acesso dentro da consulta: LIMIT/OFFSET
+        # paginam apenas leads visíveis, sem páginas menores que o limite
+        allowed = self._search(domain)
+        self.flush_model(['name', 'email', 'activity_summary', 'address', 'search_id'])
+        self.env.cr.execute(SQL("""
+            WITH q AS (SELECT websearch_to_tsquery('portuguese', %(query)s) AS tsq)
+            SELECT l.id,
+                   ts_rank_cd(l.search_vector, q.tsq)
+                   + CASE WHEN l.name ILIKE %(pattern)s THEN 0.5 ELSE 0 END
+                   + CASE WHEN l.email ILIKE %(pattern)s THEN 0.3 ELSE 0 END AS rank
+              FROM pesquisa_aiia_lead l, q
+             WHERE (l.search_vector @@ q.tsq OR l.name ILIKE %(pattern)s OR l.email ILIKE %(pattern)s)
+               AND l.id IN %(allowed)s
+             ORDER BY rank DESC, l.id DESC
+             LIMIT %(limit)s OFFSET %(offset)s
+        """, query=query, pattern=pattern, allowed=allowed.subselect(),
+            limit=max(min(int(limit), 500), 1), offset=max(int(offset), 0)))
+        rows = self.env.cr.fetchall()
+        leads = self.browse([lead_id for lead_id, _rank in rows])
+        return [{
+            'id': lead.id,
+            'name': lead.name,
+            'phone': lead.phone or False,
+            'email': lead.email or False,
+            'search_id': lead.search_id.id or False,
+            'rank': round(rank, 4),
+        } for lead, (_lead_id, rank) in zip(leads, rows)]
+
+    @api.depends('phone', 'email', 'name', 'address')
+    def _compute_normalized_keys(self):
+        for lead in self:
+            keys = lead_keys({'phone': lead.phone, 'email': lead.email, 'name': lead.name, 'address': lead.address})
+            lead.phone_normalized = keys['phone_normalized']
+            lead.email_normalized = keys['email_normalized']
+            lead.fingerprint = keys['fingerprint']
+
+    # --- Ingestão em Lote (Webhook) ---
+
+    @api.model
+    def _ingest_vals_batched(self, indexed_vals, batch_size=500, dedup_policy='skip'):
+        """
+        Cria os leads em lotes com um único create(vals_list) por lote.
+        Antes de criar, cada lote é deduplicado contra a base com uma única
+        consulta pelas chaves normalizadas, aplicando a política configurada:
+        'skip' (ignora), 'merge' (completa o lead existente) ou 'link'
+        (vincula o lead existente à nova pesquisa).
+        Cada lote roda dentro de um savepoint: se falhar, é dividido ao meio
+        (bisseção) até isolar as linhas com problema, sem abortar a transação.
+
+        :param indexed_vals: lista de tuplas (índice_no_payload, vals)
+        :return: dicionário com 'created', 'duplicates', 'merged', 'linked' e 'errors'
+        """
+        batch_size = max(int(batch_size or 1), 1)
+        batches = (indexed_vals[start:start + batch_size] for start in range(0, len(indexed_vals), batch_size))
+        return self._ingest_batches(batches, dedup_policy=dedup_policy)
+
+    @api.model
+    def _ingest_batches(self, batches, dedup_policy='skip', release_cache=False):
+        """
+        Mesma ingestão de `_ingest_vals_batched`, consumindo um iterável de
+        lotes [(índice, vals), ...] sob demanda (ex.: gerado por um parser
+        incremental do corpo da requisição).
+        Com `release_cache`, o cache do ambiente é esvaziado após cada lote,
+        para que a memória fique limitada ao tamanho do lote.
+        """
+        summary = {'created': 0, 'duplicates': 0, 'merged': 0, 'linked': 0, 'errors': []}
+        stats_delta = {}
+        for batch in batches:
+            chunk = self._dedup_chunk(batch, dedup_policy, summary)
+            created = self._create_chunk_bisect(chunk, summary['errors'])
+            summary['created'] += len(created)
+            self._add_stats_delta(stats_delta, created._get_stats_pairs())
+            if release_cache:
+                self.env.invalidate_all()
+        # Estatísticas por pesquisa: um único UPDATE para toda a requisição
+        self.env['pesquisa_aiia.search']._apply_lead_stats_delta(stats_delta)
+        return summary
+
+    @api.model
+    def _add_stats_delta(self, delta, search_leads, sign=1):
+        """Acumula em `delta` os incrementos de estatísticas para pares (search_id, lead)."""
+        now = fields.Datetime.now() if sign > 0 else None
+        for search_id, lead in search_leads:
+            if not search_id:
+                continue
+            values = delta.setdefault(search_id, {'total': 0, 'phone': 0, 'email': 0, 'contacts': 0, 'last_at': None})
+            values['total'] += sign
+            values['phone'] += sign if lead.phone else 0
+            values['email'] += sign if lead.email else 0
+            values['contacts'] += sign if lead.contact_created else 0
+            values['last_at'] = now
+        return delta
+
+    def _get_stats_pairs(self):
+        """
+        Pares (search_id, lead) que as estatísticas contam: a pesquisa dona do
+        lead e as vinculadas pela deduplicação (ou pelo cache de resultados).
+        """
+        return [(search_id, lead) for lead in self
+                for search_id in dict.fromkeys([lead.search_id.id] + lead.linked_search_ids.ids) if search_id]
+
+    def _dedup_chunk(self, chunk, policy, summary):
+        """
+        Calcula as chaves normalizadas do lote, descarta duplicatas internas e
+        resolve as duplicatas já existentes com uma consulta baseada em conjuntos.
+        Antes da consulta, trava (advisory lock da transação) as chaves do lote:
+        webhooks concorrentes com os mesmos leads esperam o commit um do outro
+        e enxergam o lead já criado, em vez de criá-lo duas vezes.
+        Retorna apenas os itens que devem ser inseridos.
+        """
+        key_names = ('phone_normalized', 'email_normalized', 'fingerprint')
+        unique_chunk = []
+        seen = {}
+        extra_search_ids = {}  # id(vals do primeiro item) -> outras pesquisas das duplicatas internas
+        for index, vals in chunk:
+            vals.update(lead_keys(vals))
+            first = next((seen[(key, vals[key])] for key in key_names
+                          if vals[key] and (key, vals[key]) in seen), None)
+            if first is not None:
+                # Duplicata dentro do próprio payload
+                summary['duplicates'] += 1
+                if policy == 'merge':
+                    # Completa o primeiro item
+                    for field_name in self._DEDUP_MERGE_FIELDS:
+                        if not first.get(field_name) and vals.get(field_name):
+                            first[field_name] = vals[field_name]
+                    first.update(lead_keys(first))
+                    for key in key_names:
+                        if first[key]:
+                            seen.setdefault((key, first[key]), first)
+                if policy in ('merge', 'link') and vals.get('search_id') \
+                        and vals['search_id'] != first.get('search_id'):
+                    # Outra pesquisa encontrou o mesmo lead: vincula em vez de perder
+                    extra_search_ids.setdefault(id(first), set()).add(vals['search_id'])
+                continue
+            for key in key_names:
+                if vals[key]:
+                    seen[(key, vals[key])] = vals
+            unique_chunk.append((index, vals))
+
+        domains = []
+        for key in key_names:
+            values = list({vals[key] for _index, vals in unique_chunk if vals[key]})
+            if values:
+                domains.append([(key, 'in', values)])
+        if not domains:
+            return unique_chunk
+
+        self._lock_dedup_keys([(key, vals[key]) for _index, vals in unique_chunk for key in key_names if vals[key]])
+        existing_by_key = {}
+        for lead in self.search(expression.OR(domains), order='id'):
+            for key in key_names:
+                if lead[key]:
+                    existing_by_key.setdefault((key, lead[key]), lead)
+
+        to_create = []
+        link_map = {}  # search_id -> leads existentes a vincular
+        fills = {}  # lead existente -> campos a completar (política 'merge')
+        for index, vals in unique_chunk:
+            search_ids = [vals.get('search_id')] + sorted(extra_search_ids.get(id(vals), ()))
+            existing = next((existing_by_key[(key, vals[key])] for key in key_names
+                             if vals[key] and (key, vals[key]) in existing_by_key), None)
+            if existing is None:
+                if search_ids[1:]:
+                    vals['linked_search_ids'] = [Command.link(search_id) for search_id in search_ids[1:]]
+                to_create.append((index, vals))
+                continue
+            summary['duplicates'] += 1
+            if policy == 'merge':
+                pending = fills.setdefault(existing, {})
+                for field_name in self._DEDUP_MERGE_FIELDS:
+                    if vals.get(field_name) and not existing[field_name] and field_name not in pending:
+                        pending[field_name] = vals[field_name]
+            if policy in ('merge', 'link'):
+                for search_id in search_ids:
+                    if search_id and search_id != existing.search_id.id and search_id not in existing.linked_search_ids.ids:
+                        link_map.setdefault(search_id, self.browse())
+                        link_map[search_id] |= existing
+
+        # Um único write por conjunto de valores a completar (e não um por lead)
+        fill_groups = {}
+        for lead, fill_vals in fills.items():
+            if fill_vals:
+                fill_groups.setdefault(tuple(sorted(fill_vals.items())), self.browse())
+                fill_groups[tuple(sorted(fill_vals.items()))] |= lead
+        for fill_items, leads in fill_groups.items():
+            fill_vals = dict(fill_items)
+            leads.write(fill_vals)
+            summary['merged'] += len(leads)
+
+        # As estatísticas das pesquisas acompanham esses writes (ver `write`)
+        for search_id, leads in link_map.items():
+            leads.write({'linked_search_ids': [Command.link(search_id)]})
+            summary['linked'] += len(leads)
+        return to_create
+
+    @api.model
+    def _lock_dedup_keys(self, keys):
+        """
+        Advisory locks (liberados no fim da transação) para as chaves
+        normalizadas, sempre em ordem crescente para reduzir a chance de
+        deadlock entre lotes concorrentes.
+        """
+        lock_ids = sorted({int.from_bytes(hashlib.blake2b(('pesquisa_aiia.lead:%s:%s' % key).encode('utf-8'),
+                                                          digest_size=8).digest(), 'big', signed=True)
+                           for key in keys})
+        if lock_ids:
+            self.env.cr.execute("SELECT pg_advisory_xact_lock(lock_id) FROM unnest(%s::bigint[]) AS lock_id",
+                                [lock_ids])
+
+    def _create_chunk_bisect(self, chunk, errors):
+        """Cria um lote em savepoint; em caso de erro, bisecta o lote e registra apenas as linhas ruins."""
+        if not chunk:
+            return self.browse()
+        try:
+            with self.env.cr.savepoint():
+                return self.create([vals for _index, vals in chunk])
+        except Exception as e:
+            if len(chunk) == 1:
+                index = chunk[0][0]
+                _logger.warning("Ingestão AIIA (item %d): Erro ao criar lead - %s", index, str(e))
+                errors.append({'index': index, 'error': f'Erro interno: {str(e)}'})
+                return self.browse()
+            middle = len(chunk) // 2
+            return self._create_chunk_bisect(chunk[:middle], errors) + self._create_chunk_bisect(chunk[middle:], errors)
+
+    def unlink(self):
+        stats_delta = self._add_stats_delta({}, self._get_stats_pairs(), sign=-1)
+        # Exclusões não deixam write_date: o resumo diário precisa saber dos dias
+        self.env['pesquisa_aiia.report.daily'].sudo()._mark_dirty(self.mapped('create_date'))
+        res = super().unlink()
+        self.env['pesquisa_aiia.search']._apply_lead_stats_delta(stats_delta)
+        return res
+
+    # Campos que alteram as estatísticas das pesquisas do lead
+    _STATS_FIELDS = ('search_id', 'linked_search_ids', 'phone', 'email', 'contact_created')
+
+    def write(self, vals):
+        if not any(field_name in vals for field_name in self._STATS_FIELDS):
+            return super().write(vals)
+        before = self._add_stats_delta({}, self._get_stats_pairs(), sign=-1)
+        res = super().write(vals)
+        stats_delta = self._add_stats_delta(before, self._get_stats_pairs())
+        # Só a entrada do lead em uma pesquisa conta como "último lead recebido"
+        for values in stats_delta.values():
+            if values['total'] <= 0:
+                values['last_at'] = None
+        self.env['pesquisa_aiia.search'].sudo()._apply_lead_stats_delta(
+            {search_id: values for search_id, values in stats_delta.items()
+             if any(values[key] for key in ('total', 'phone', 'email', 'contacts'))})
+        return res
+
     # --- Actions Methods ---
 
-    def _get_message_to_send(self):
-        """Helper para obter a mensagem correta (padrão ou customizada)."""
+    def _get_message_template(self, settings=None):
+        """Modelo (ainda com marcadores) da mensagem deste lead: padrão ou customizada."""
         self.ensure_one()
         if self.use_default_message:
-            default_msg = self.env['ir.config_parameter'].sudo().get_param('pesquisa_aiia.default_whatsapp_msg', '')
-            return default_msg
-        else:
-            return self.message_text or ''
+            settings = settings or self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+            return settings.default_whatsapp_msg
+        return self.message_text or ''
+
+    def _get_template_values(self):
+        """Valores dos marcadores de mensagem ([Nome da Empresa], [Endereço], ...) deste lead."""
+        self.ensure_one()
+        return {
+            'name': self.name,
+            'address': self.address,
+            'activity_summary': self.activity_summary,
+            'search_query': self.search_id.search_query,
+        }
+
+    def _render_messages(self):
+        """Mensagem de cada lead do recordset já renderizada: {lead.id: texto}."""
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        return {lead.id: templates.render(lead._get_message_template(settings), lead._get_template_values())
+                for lead in self}
+
+    def _get_message_to_send(self):
+        """Helper para obter a mensagem correta (padrão ou customizada), com os marcadores preenchidos."""
+        self.ensure_one()
+        return self._render_messages()[self.id]
 
     def _clean_phone(self, phone_number):
         """Remove caracteres não numéricos. Simples, pode precisar de melhorias."""
@@ -37,27 +390,110 @@ class PesquisaAiiaLead(models.Model):
         # Remove +, -, (, ), ' '
         return re.sub(r'[+\-\(\) ]', '', phone_number)
 
+    def _prepare_whatsapp_links(self):
+        """
+        Gera os links wa.me de todo o recordset em uma única passada.
+        Usa o telefone E.164 já armazenado (ou normaliza na hora) e codifica
+        cada texto distinto uma única vez.
+
+        :return: tupla (links, inválidos), listas de dicionários
+        """
+        messages = self._render_messages()
+        encoded_cache = {}
+        links = []
+        invalid = []
+        for lead in self:
+            phone = lead.phone_normalized or normalize_phone_e164(lead.phone)
+            if not phone:
+                invalid.append({
+                    'id': lead.id,
+                    'name': lead.name,
+                    'phone': lead.phone or '',
+                    'reason': _("Sem telefone") if not lead.phone else _("Telefone inválido"),
+                })
+                continue
+            message = messages[lead.id]
+            encoded_message = encoded_cache.get(message)
+            if encoded_message is None:
+                encoded_message = encoded_cache[message] = urllib.parse.quote(message)
+            links.append({
+                'id': lead.id,
+                'name': lead.name,
+                'phone': phone,
+                'url': f"https://wa.me/{phone.lstrip('+')}?text={encoded_message}",
+            })
+        return links, invalid
+
+    @api.model
+    def _whatsapp_links_csv(self, links, invalid):
+        """CSV com os links válidos seguidos dos números inválidos (coluna 'status')."""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['id', 'empresa', 'telefone', 'status', 'link_whatsapp', 'motivo'])
+        for link in links:
+            writer.writerow([link['id'], link['name'], link['phone'], 'ok', link['url'], ''])
+        for item in invalid:
+            writer.writerow([item['id'], item['name'], item['phone'], 'invalido', '', item['reason']])
+        return output.getvalue().encode('utf-8-sig')  # BOM para o Excel reconhecer UTF-8
+
+    # Exportações de links WhatsApp: anexos temporários (só o criador lê, sem res_model)
+    # marcados pela descrição e apagados pelo cron depois do prazo
+    _WHATSAPP_EXPORT_MARKER = 'pesquisa_aiia.whatsapp_links'
+    _WHATSAPP_EXPORT_TTL = timedelta(hours=1)
+
+    def action_export_whatsapp_links(self, export_format='csv'):
+        """
+        Exporta os links wa.me dos leads selecionados (CSV ou JSON) como
+        download. O arquivo é um anexo temporário do usuário, removido por
+        `_cron_gc_whatsapp_exports` após `_WHATSAPP_EXPORT_TTL`.
+        """
+        if not self:
+            raise UserError(_("Selecione ao menos um lead."))
+        links, invalid = self._prepare_whatsapp_links()
+        if export_format == 'json':
+            content = json.dumps({'links': links, 'invalid': invalid}, ensure_ascii=False).encode('utf-8')
+            mimetype = 'application/json'
+        else:
+            export_format = 'csv'
+            content = self._whatsapp_links_csv(links, invalid)
+            mimetype = 'text/csv'
+        attachment = self.env['ir.attachment'].create({
+            'name': 'links_whatsapp_%s.%s' % (fields.Datetime.now().strftime('%Y%m%d_%H%M%S'), export_format),
+            'raw': content,
+            'mimetype': mimetype,
+            'description': self._WHATSAPP_EXPORT_MARKER,
+        })
+        _logger.info("Links WhatsApp exportados: %d válidos, %d inválidos.", len(links), len(invalid))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
+        }
+
+    @api.model
+    def _cron_gc_whatsapp_exports(self):
+        """Apaga os anexos de exportação de links WhatsApp mais antigos que o prazo."""
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('description', '=', self._WHATSAPP_EXPORT_MARKER),
+            ('res_model', '=', False),
+            ('create_date', '<', fields.Datetime.now() - self._WHATSAPP_EXPORT_TTL),
+        ])
+        attachments.unlink()
+        return len(attachments)
+
     def action_send_whatsapp(self):
         self.ensure_one()
         if not self.phone:
             raise UserError(_("Este lead não possui um número de telefone."))
 
-        cleaned_phone = self._clean_phone(self.phone)
-        # Adiciona o código do país se não estiver presente (exemplo: Brasil '55')
-        # Adapte conforme necessário para sua região
-        if len(cleaned_phone) <= 11 and not cleaned_phone.startswith('55'): # Simples verificação de tamanho
-             cleaned_phone = f"55{cleaned_phone}"
-
-        message = self._get_message_to_send()
-        encoded_message = urllib.parse.quote(message)
+        links, invalid = self._prepare_whatsapp_links()
+        if invalid:
+            raise UserError(_("O telefone deste lead é inválido: %s", self.phone))
 
-        # Gera a URL do WhatsApp Click-to-Chat
-        whatsapp_url = f"https://wa.me/{cleaned_phone}?text={encoded_message}"
-
-        # Retorna uma ação para abrir a URL em uma nova aba
+        # Retorna uma ação para abrir a URL do WhatsApp Click-to-Chat em uma nova aba
         return {
             'type': 'ir.actions.act_url',
-            'url': whatsapp_url,
+            'url': links[0]['url'],
             'target': 'new', # Abre em nova aba
         }
 
@@ -67,16 +503,17 @@ class PesquisaAiiaLead(models.Model):
             raise UserError(_("Este lead não possui um endereço de e-mail."))
 
         # Buscar configurações padrão
-        config_params = self.env['ir.config_parameter'].sudo()
-        default_subject = config_params.get_param('pesquisa_aiia.default_email_subject', _('Contato via Pesquisa AIIA'))
-        default_body = config_params.get_param('pesquisa_aiia.default_email_body', '')
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        default_subject = settings.default_email_subject or _('Contato via Pesquisa AIIA')
+        default_body = settings.default_email_body
 
-        # Determinar assunto e corpo
-        subject_to_send = default_subject # Assunto não costuma variar tanto, mas pode ser adaptado
+        # Determinar assunto e corpo, com os marcadores ([Nome da Empresa], ...) preenchidos
+        template_values = self._get_template_values()
+        subject_to_send = templates.render(default_subject, template_values)
         if self.use_default_message:
-            body_to_send = default_body
+            body_to_send = templates.render(default_body or '', template_values)
         else:
-            body_to_send = self.message_text or ''
+            body_to_send = templates.render(self.message_text or '', template_values)
 
         # Usar um template de email ou criar um mail.mail simples pode ser mais robusto
         # Aqui, abriremos o compositor de e-mail pré-preenchido
@@ -154,4 +591,210 @@ class PesquisaAiiaLead(models.Model):
             }
 
         except Exception as e:
-             raise UserError(_("Erro ao criar contato: %s", str(e)))
\ No newline at end of file
+             raise UserError(_("Erro ao criar contato: %s", str(e)))
+
+    def _prepare_partner_vals(self):
+        self.ensure_one()
+        return {
+            'name': self.name,
+            'phone': self.phone,
+            'email': self.email,
+            'street': self.address, # Mapeamento simples, pode precisar refinar
+            'comment': self.activity_summary, # Usar campo de Notas internas
+            'is_company': True, # Assumindo que é uma empresa
+        }
+
+    def _find_partners_by_keys(self):
+        """
+        Busca, em uma única consulta, os contatos ativos que batem com o e-mail
+        normalizado ou com o telefone (comparando apenas os dígitos) dos leads.
+        Retorna dois dicionários: {email_normalizado: parceiro} e {telefone_e164: parceiro}.
+        """
+        emails = list({lead.email_normalized for lead in self if lead.email_normalized})
+        phone_digits = set()
+        for lead in self.filtered('phone_normalized'):
+            digits = lead.phone_normalized.lstrip('+')
+            phone_digits.add(digits)
+            if digits.startswith(DEFAULT_COUNTRY_CODE):
+                # Contatos costumam ser gravados sem o DDI
+                phone_digits.add(digits[len(DEFAULT_COUNTRY_CODE):])
+        if not emails and not phone_digits:
+            return {}, {}
+        self.env['res.partner'].flush_model(['email_normalized', 'phone', 'mobile', 'active'])
+        self.env.cr.execute(r"""
+            SELECT id, email_normalized, phone, mobile
+              FROM res_partner
+             WHERE active
+               AND (email_normalized = ANY(%s)
+                    OR regexp_replace(COALESCE(phone, ''), '\D', '', 'g') = ANY(%s)
+                    OR regexp_replace(COALESCE(mobile, ''), '\D', '', 'g') = ANY(%s))
+             ORDER BY id
+        """, [emails, list(phone_digits), list(phone_digits)])
+        rows = self.env.cr.fetchall()
+        partners = self.env['res.partner'].browse([row[0] for row in rows])
+        by_email = {}
+        by_phone = {}
+        for partner, (_id, email_normalized, phone, mobile) in zip(partners, rows):
+            if email_normalized:
+                by_email.setdefault(email_normalized, partner)
+            for number in (phone, mobile):
+                key = normalize_phone_e164(number)
+                if key:
+                    by_phone.setdefault(key, partner)
+        return by_email, by_phone
+
+    def _create_contacts_batch(self):
+        """
+        Cria contatos para vários leads de uma vez: uma consulta para achar
+        contatos existentes, um único create(vals_list) e um único write.
+
+        :return: dicionário com 'created' (ids dos leads), 'skipped' e 'conflicts'
+        """
+        summary = {'created': [], 'skipped': [], 'conflicts': []}
+        pending = self.filtered(lambda lead: not lead.contact_created)
+        summary['skipped'] = [{'id': lead.id, 'name': lead.name, 'reason': _("Contato já criado")}
+                              for lead in self - pending]
+
+        by_email, by_phone = pending._find_partners_by_keys()
+        to_create_ids = []
+        seen_keys = set()
+        for lead in pending:
+            existing = by_email.get(lead.email_normalized) or by_phone.get(lead.phone_normalized)
+            if existing:
+                summary['conflicts'].append({'id': lead.id, 'name': lead.name,
+                                             'partner_id': existing.id, 'partner_name': existing.name})
+                continue
+            lead_keys_set = {key for key in (lead.email_normalized, lead.phone_normalized) if key}
+            if lead_keys_set & seen_keys:
+                # Mesmo e-mail/telefone de outro lead desta seleção
+                summary['skipped'].append({'id': lead.id, 'name': lead.name,
+                                           'reason': _("Duplicado na seleção")})
+                continue
+            seen_keys |= lead_keys_set
+            to_create_ids.append(lead.id)
+
+        to_create = self.browse(to_create_ids)
+        if to_create:
+            self.env['res.partner'].create([lead._prepare_partner_vals() for lead in to_create])
+            to_create.write({'contact_created': True})
+        summary['created'] = to_create.ids
+        _logger.info("Criação de contatos em lote: %d criados, %d ignorados, %d conflitos.",
+                     len(summary['created']), len(summary['skipped']), len(summary['conflicts']))
+        return summary
+
+    def action_create_contacts_batch(self):
+        """Ação em lote (lista): cria os contatos e exibe um resumo."""
+        summary = self._create_contacts_batch()
+        message = _("%(created)s contato(s) criado(s), %(skipped)s ignorado(s), %(conflicts)s conflito(s) com contatos existentes.",
+                    created=len(summary['created']), skipped=len(summary['skipped']),
+                    conflicts=len(summary['conflicts']))
+        if summary['conflicts']:
+            message += "\n" + _("Conflitos: %s", ", ".join(
+                "%s → %s" % (item['name'], item['partner_name']) for item in summary['conflicts'][:20]))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Criar Contatos"),
+                'message': message,
+                'type': 'warning' if summary['conflicts'] else 'success',
+                'sticky': bool(summary['conflicts']),
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
+
+    # --- Envio de e-mail em massa ---
+
+    def _get_email_contents(self, settings):
+        """Modelos de assunto e corpo (texto, com marcadores) do e-mail deste lead: padrão ou mensagem própria."""
+        self.ensure_one()
+        subject = settings.default_email_subject or _('Contato via Pesquisa AIIA')
+        body = settings.default_email_body if self.use_default_message else (self.message_text or '')
+        return subject, body or ''
+
+    def _enqueue_mass_email(self):
+        """
+        Enfileira um mail.mail por lead com e-mail, para o cron de envio do
+        módulo mail: contatos resolvidos em uma consulta, assunto/corpo
+        renderizados uma vez por modelo distinto e criação em lotes, cada lote
+        agendado um intervalo depois do anterior.
+
+        :return: dicionário com 'queued', 'batches' e 'skipped' (leads sem e-mail)
+        """
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        email_from = self.env.user.email_formatted or self.env.company.email_formatted
+        if not email_from:
+            raise UserError(_("Configure um e-mail no seu usuário ou na empresa para enviar e-mails."))
+        batch_size = max(settings.mass_mail_batch_size, 1)
+        interval = max(settings.mass_mail_batch_interval, 0)
+
+        with_email = self.filtered('email')
+        summary = {'queued': 0, 'batches': 0, 'skipped': len(self) - len(with_email)}
+        if not with_email:
+            return summary
+
+        by_email, _by_phone = with_email._find_partners_by_keys()
+        # Cada modelo distinto é convertido para HTML e compilado uma única vez;
+        # por lead resta só preencher os marcadores (valores escapados no corpo HTML)
+        compiled = {}
+        vals_list = []
+        queued_by_search = {}
+        for lead in with_email:
+            contents = lead._get_email_contents(settings)
+            if contents not in compiled:
+                subject, body = contents
+                compiled[contents] = (templates.compile_template(subject),
+                                      templates.compile_template(tools.plaintext2html(body)))
+            subject_template, body_template = compiled[contents]
+            values = lead._get_template_values()
+            html_values = {key: tools.html_escape(value) if value else value for key, value in values.items()}
+            partner = by_email.get(lead.email_normalized)
+            vals = {
+                'subject': subject_template.render(values),
+                'body_html': body_template.render(html_values),
+                'email_from': email_from,
+                # Sem model/res_id: o lead não é um mail.thread
+                'auto_delete': True,
+                'pesquisa_aiia_search_id': lead.search_id.id,
+            }
+            if partner:
+                vals['recipient_ids'] = [Command.link(partner.id)]
+            else:
+                vals['email_to'] = lead.email
+            vals_list.append(vals)
+            if lead.search_id:
+                queued_by_search[lead.search_id.id] = queued_by_search.get(lead.search_id.id, 0) + 1
+
+        Mail = self.env['mail.mail'].sudo()
+        now = fields.Datetime.now()
+        for batch_index, start in enumerate(range(0, len(vals_list), batch_size)):
+            scheduled_date = now + timedelta(seconds=interval * batch_index)
+            batch = vals_list[start:start + batch_size]
+            for vals in batch:
+                vals['scheduled_date'] = scheduled_date
+            Mail.create(batch)
+            summary['batches'] += 1
+        summary['queued'] = len(vals_list)
+
+        if queued_by_search:
+            self.env['pesquisa_aiia.search'].sudo()._add_mass_mail_queued(queued_by_search)
+        _logger.info("Envio em massa: %d e-mail(s) enfileirado(s) em %d lote(s), %d lead(s) sem e-mail.",
+                     summary['queued'], summary['batches'], summary['skipped'])
+        return summary
+
+    def action_mass_send_email(self):
+        """Ação em lote (lista): enfileira os e-mails e exibe um resumo."""
+        if not self:
+            raise UserError(_("Selecione ao menos um lead."))
+        summary = self._enqueue_mass_email()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Envio de E-mails em Massa"),
+                'message': _("%(queued)s e-mail(s) enfileirado(s) em %(batches)s lote(s); %(skipped)s lead(s) sem e-mail.",
+                             queued=summary['queued'], batches=summary['batches'], skipped=summary['skipped']),
+                'type': 'success' if summary['queued'] else 'warning',
+                'sticky': False,
+            },
+        }
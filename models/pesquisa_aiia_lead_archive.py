@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, Command
+from datetime import timedelta
+import json
+import logging
+import zlib
+
+import psycopg2
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaLeadArchive(models.Model):
+    """
+    Camada de arquivo dos leads antigos. Cada linha guarda um lote de leads
+    de uma mesma pesquisa como JSON comprimido (zlib), na coluna `payload`
+    (bytea, criada em init e acessada apenas por SQL). O cron de retenção
+    move os leads para cá em lotes; `pesquisa_aiia.search` pode restaurá-los.
+    """
+    _name = 'pesquisa_aiia.lead.archive'
+    _description = 'Arquivo de Leads Pesquisa AIIA'
+    _order = 'id desc'
+    _log_access = False
+
+    search_id = fields.Many2one('pesquisa_aiia.search', string='Pesquisa', ondelete='cascade', index=True, readonly=True)
+    lead_count = fields.Integer(string='Leads', readonly=True)
+    archived_at = fields.Datetime(string='Arquivado em', readonly=True)
+    payload_size = fields.Integer(string='Tamanho Comprimido (bytes)', readonly=True)
+
+    # Campos do lead copiados para o arquivo (além do id original e das pesquisas vinculadas)
+    _ARCHIVED_FIELDS = ('search_id', 'name', 'phone', 'email', 'address', 'activity_summary',
+                        'message_text', 'use_default_message', 'contact_created', 'create_date')
+
+    def init(self):
+        self.env.cr.execute("ALTER TABLE pesquisa_aiia_lead_archive ADD COLUMN IF NOT EXISTS payload bytea")
+
+    @api.model
+    def _cron_apply_retention(self):
+        """
+        Aplica a política de retenção: leads sem contato criado mais antigos
+        que o limite vão para o arquivo, em lotes com commit por lote (travas
+        curtas); depois, pesquisas finalizadas antigas e sem leads são arquivadas.
+        """
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        batch_size = max(settings.retention_batch_size, 1)
+        moved = 0
+        if settings.retention_lead_days > 0:
+            cutoff = fields.Datetime.now() - timedelta(days=settings.retention_lead_days)
+            while True:
+                count = self._archive_leads_batch(cutoff, batch_size)
+                self.env.cr.commit()
+                moved += count
+                if count < batch_size:
+                    break
+            if moved:
+                _logger.info("Retenção Pesquisa AIIA: %d lead(s) movido(s) para o arquivo.", moved)
+
+        if settings.retention_search_days > 0:
+            cutoff = fields.Datetime.now() - timedelta(days=settings.retention_search_days)
+            Search = self.env['pesquisa_aiia.search'].with_context(active_test=True)
+            while True:
+                searches = Search.search([('create_date', '<', cutoff),
+                                          ('status', 'in', ('completed', 'error')),
+                                          ('lead_total', '=', 0)], limit=batch_size)
+                if not searches:
+                    break
+                searches.write({'active': False})
+                self.env.cr.commit()
+                _logger.info("Retenção Pesquisa AIIA: %d pesquisa(s) arquivada(s).", len(searches))
+                if len(searches) < batch_size:
+                    break
+        return moved
+
+    @api.model
+    def _archive_leads_batch(self, cutoff, batch_size):
+        """Move um lote de leads elegíveis para o arquivo (DELETE ... RETURNING). Retorna a quantidade."""
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT id FROM pesquisa_aiia_lead
+             WHERE create_date < %s AND NOT COALESCE(contact_created, false)
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (cutoff, batch_size))
+        lead_ids = [row[0] for row in cr.fetchall()]
+        if not lead_ids:
+            return 0
+
+        cr.execute("""
+            SELECT lead_id, array_agg(search_id) FROM pesquisa_aiia_lead_search_rel
+             WHERE lead_id = ANY(%s) GROUP BY lead_id
+        """, (lead_ids,))
+        linked = dict(cr.fetchall())
+        cr.execute("""
+            DELETE FROM pesquisa_aiia_lead WHERE id = ANY(%%s)
+            RETURNING id, %s
+        """ % ", ".join(self._ARCHIVED_FIELDS), (lead_ids,))
+
+        by_search = {}
+        stats_delta = {}
+        dirty_dates = set()
+        for row in cr.fetchall():
+            lead_id, values = row[0], dict(zip(self._ARCHIVED_FIELDS, row[1:]))
+            values['id'] = lead_id
+            dirty_dates.add(values['create_date'])
+            values['create_date'] = fields.Datetime.to_string(values['create_date'])
+            values['linked_search_ids'] = linked.get(lead_id, [])
+            by_search.setdefault(values['search_id'], []).append(values)
+            # O lead deixa de contar na pesquisa dona e nas vinculadas
+            for search_id in dict.fromkeys([values['search_id']] + values['linked_search_ids']):
+                if not search_id:
+                    continue
+                delta = stats_delta.setdefault(search_id, {'total': 0, 'phone': 0, 'email': 0, 'contacts': 0, 'last_at': None})
+                delta['total'] -= 1
+                delta['phone'] -= 1 if values['phone'] else 0
+                delta['email'] -= 1 if values['email'] else 0
+
+        rows = []
+        for search_id, leads in by_search.items():
+            payload = zlib.compress(json.dumps(leads, ensure_ascii=False).encode('utf-8'), 6)
+            rows.append((search_id, len(leads), len(payload), psycopg2.Binary(payload)))
+        cr.execute("""
+            INSERT INTO pesquisa_aiia_lead_archive (search_id, lead_count, payload_size, payload, archived_at)
+            VALUES %s
+        """ % ", ".join(["(%s, %s, %s, %s, now() at time zone 'UTC')"] * len(rows)),
+            [item for row in rows for item in row])
+        self.env['pesquisa_aiia.search']._apply_lead_stats_delta(stats_delta)
+        self.env['pesquisa_aiia.report.daily']._mark_dirty(dirty_dates)
+        self.env.invalidate_all()
+        return len(lead_ids)
+
+    def _restore(self, batch_size=1000):
+        """
+        Recria os leads destes lotes de arquivo e apaga os lotes. Os leads
+        restaurados recebem nova data de criação, para não voltarem ao
+        arquivo na próxima execução do cron. Leads que voltaram a ser
+        ingeridos depois do arquivamento são tratados pela política de
+        deduplicação configurada, como na ingestão. Retorna os leads criados.
+        """
+        if not self:
+            return self.env['pesquisa_aiia.lead']
+        self.env.cr.execute("SELECT id, payload FROM pesquisa_aiia_lead_archive WHERE id IN %s FOR UPDATE",
+                            (tuple(self.ids),))
+        Lead = self.env['pesquisa_aiia.lead'].with_context(tracking_disable=True)
+        archived = []
+        for _archive_id, payload in self.env.cr.fetchall():
+            if payload is not None:
+                archived.extend(json.loads(zlib.decompress(bytes(payload)).decode('utf-8')))
+        # Pesquisas próprias e vinculadas que ainda existem (podem ser de outros lotes)
+        search_ids = {values.get('search_id') for values in archived} | {
+            search_id for values in archived for search_id in values.get('linked_search_ids') or []}
+        search_ids.discard(None)
+        existing_searches = set(self.env['pesquisa_aiia.search'].with_context(active_test=False)
+                                .browse(search_ids).exists().ids)
+        vals_list = []
+        for index, values in enumerate(archived):
+            vals = {field: values.get(field) for field in self._ARCHIVED_FIELDS if field != 'create_date'}
+            if vals['search_id'] not in existing_searches:
+                vals['search_id'] = False
+            vals['linked_search_ids'] = [Command.set([search_id for search_id in values.get('linked_search_ids') or []
+                                                      if search_id in existing_searches])]
+            vals_list.append((index, vals))
+
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        summary = {'created': 0, 'duplicates': 0, 'merged': 0, 'linked': 0, 'errors': []}
+        created_ids = []
+        stats_delta = {}
+        for start in range(0, len(vals_list), batch_size):
+            chunk = Lead._dedup_chunk(vals_list[start:start + batch_size], settings.dedup_policy, summary)
+            leads = Lead.create([vals for _index, vals in chunk])
+            Lead._add_stats_delta(stats_delta, leads._get_stats_pairs())
+            created_ids.extend(leads.ids)
+        self.env['pesquisa_aiia.search']._apply_lead_stats_delta(stats_delta)
+        self.unlink()
+        _logger.info("Retenção Pesquisa AIIA: %d lead(s) restaurado(s) do arquivo, %d duplicado(s) (política '%s').",
+                     len(created_ids), summary['duplicates'], settings.dedup_policy)
+        return Lead.browse(created_ids)
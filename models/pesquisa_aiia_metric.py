@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+import logging
+
+from ..utils import metrics
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaMetric(models.Model):
+    """
+    Armazenamento compartilhado das métricas: cada worker soma aqui os
+    incrementos acumulados no processo (ver utils/metrics.py), de modo que o
+    endpoint /pesquisa_aiia/metrics exponha o total de todos os workers.
+    """
+    _name = 'pesquisa_aiia.metric'
+    _description = 'Métrica Pesquisa AIIA'
+    _order = 'name, labels'
+    _log_access = False
+
+    name = fields.Char(string='Métrica', required=True, readonly=True)
+    labels = fields.Char(string='Labels', required=True, default='', readonly=True)
+    value = fields.Float(string='Valor', readonly=True, default=0.0)
+
+    _sql_constraints = [
+        ('name_labels_uniq', 'unique(name, labels)', 'A combinação métrica/labels deve ser única.'),
+    ]
+
+    # Intervalo mínimo (s) entre persistências feitas pelo mesmo processo
+    _FLUSH_INTERVAL = 5.0
+
+    @api.model
+    def _flush_process_metrics(self, force=False):
+        """
+        Soma na tabela os incrementos pendentes deste processo. Usa um cursor
+        próprio para não depender (nem ser desfeito por) a transação da requisição.
+        """
+        pending = metrics.drain(0.0 if force else self._FLUSH_INTERVAL)
+        if not pending:
+            return
+        # Ordenado pela chave do ON CONFLICT: processos concorrentes travam as
+        # mesmas linhas na mesma ordem e não entram em deadlock
+        rows = sorted((name, labels, value) for (name, labels), value in pending.items())
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO pesquisa_aiia_metric (name, labels, value)
+                    VALUES %s
+                    ON CONFLICT (name, labels) DO UPDATE SET value = pesquisa_aiia_metric.value + EXCLUDED.value
+                """ % ", ".join(["(%s, %s, %s)"] * len(rows)), [item for row in rows for item in row])
+        except Exception as e:
+            # Métricas nunca devem derrubar a requisição; tenta de novo no próximo flush
+            _logger.warning("Métricas Pesquisa AIIA: falha ao persistir (%s); incrementos mantidos em memória.", e)
+            metrics.restore(pending)
+
+    @api.model
+    def _render_prometheus(self):
+        """Texto de exposição com os contadores persistidos e os gauges calculados na hora."""
+        self._flush_process_metrics(force=True)
+        self.env.cr.execute("SELECT name, labels, value FROM pesquisa_aiia_metric")
+        samples = list(self.env.cr.fetchall())
+        self.env.cr.execute("SELECT status, COUNT(*) FROM pesquisa_aiia_search GROUP BY status")
+        samples.extend(('pesquisa_aiia_searches', metrics.format_labels({'status': status}), count)
+                       for status, count in self.env.cr.fetchall())
+        return metrics.render(samples)
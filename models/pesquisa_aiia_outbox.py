@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+import random
+import time
+
+from ..utils import metrics, n8n_client
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaOutbox(models.Model):
+    """
+    Caixa de saída (outbox) das chamadas para o N8N.
+    O payload é gravado na mesma transação da pesquisa e enviado depois por
+    um cron, sem bloquear os workers HTTP do Odoo.
+    """
+    _name = 'pesquisa_aiia.outbox'
+    _description = 'Fila de Envio para o N8N'
+    _order = 'id'
+
+    search_id = fields.Many2one('pesquisa_aiia.search', string='Pesquisa', required=True, ondelete='cascade', index=True)
+    kind = fields.Selection([
+        ('start', 'Nova Pesquisa'),
+        ('next_page', 'Próxima Página'),
+    ], string='Tipo', required=True, default='start', readonly=True)
+    payload = fields.Text(string='Payload (JSON)', required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pendente'),
+        ('sending', 'Enviando'),
+        ('done', 'Enviado'),
+        ('dead', 'Falhou (Dead Letter)'),
+    ], string='Estado', default='pending', required=True, readonly=True, index=True)
+    attempt_count = fields.Integer(string='Tentativas', default=0, readonly=True)
+    next_attempt_at = fields.Datetime(string='Próxima Tentativa', default=fields.Datetime.now, readonly=True, index=True)
+    lease_until = fields.Datetime(string='Reservado até', readonly=True, copy=False,
+                                  help="Mensagens em envio com reserva expirada (ex.: worker morto) voltam a ser reivindicadas.")
+    sent_at = fields.Datetime(string='Enviado em', readonly=True)
+    last_error = fields.Text(string='Último Erro', readonly=True)
+
+    # Tempo máximo de uma execução do cron; o restante fica para a próxima
+    _DISPATCH_TIME_BUDGET = 50
+    # Reserva de uma mensagem em envio antes de poder ser reivindicada de novo
+    _LEASE_SECONDS = 300
+    # Candidatas lidas por vaga, para que um usuário no limite não trave a fila dos outros
+    _CLAIM_SCAN_FACTOR = 10
+
+    @api.model
+    def _enqueue(self, search, kind, payload):
+        """Registra o payload na fila (mesma transação) e agenda o despachante."""
+        return self._enqueue_many([(search, kind, payload)])
+
+    @api.model
+    def _enqueue_many(self, items):
+        """Versão em lote de _enqueue: um único create para [(pesquisa, tipo, payload)]."""
+        outbox = self.sudo().create([{
+            'search_id': search.id,
+            'kind': kind,
+            'payload': json.dumps(payload),
+        } for search, kind, payload in items])
+        self._trigger_dispatch()
+        return outbox
+
+    @api.model
+    def _trigger_dispatch(self, at=None):
+        cron = self.env.ref('pesquisa_aiia.ir_cron_pesquisa_aiia_outbox_dispatch', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=at)
+
+    def _get_dispatch_config(self):
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        max_workers = max(settings.outbox_max_workers, 1)
+        return {
+            'url': settings.n8n_scrape_trigger_url,
+            'client': n8n_client.ClientConfig(
+                connect_timeout=settings.http_connect_timeout,
+                read_timeout=settings.http_read_timeout,
+                max_retries=max(settings.http_max_retries, 0),
+                backoff_base=n8n_client.DEFAULT_CONFIG.backoff_base,
+                breaker_threshold=max(settings.http_breaker_threshold, 1),
+                breaker_cooldown=settings.http_breaker_cooldown,
+                pool_maxsize=max_workers,
+            ),
+            'max_workers': max_workers,
+            'max_attempts': max(settings.outbox_max_attempts, 1),
+            'retry_base_seconds': max(settings.outbox_retry_base_seconds, 1),
+        }
+
+    @api.model
+    def _cron_dispatch(self):
+        """
+        Drena a fila: reivindica lotes de mensagens pendentes com
+        FOR UPDATE SKIP LOCKED (vários workers podem rodar em paralelo),
+        envia com concorrência limitada e aplica retry com backoff exponencial.
+        """
+        config = self._get_dispatch_config()
+        if not config['url']:
+            _logger.warning("Outbox Pesquisa AIIA: URL de trigger do N8N não configurada; envio adiado.")
+            return
+
+        try:
+            self._dispatch_until_budget(config)
+        finally:
+            self.env['pesquisa_aiia.metric']._flush_process_metrics(force=True)
+
+    def _dispatch_until_budget(self, config):
+        started_at = time.monotonic()
+        while time.monotonic() - started_at < self._DISPATCH_TIME_BUDGET:
+            batch, retry_in = self._claim_batch(config['max_workers'] * 4)
+            if not batch:
+                if retry_in is None:
+                    return
+                # Fila barrada pelo limite de taxa: espera a próxima ficha dentro do orçamento
+                remaining = self._DISPATCH_TIME_BUDGET - (time.monotonic() - started_at)
+                if retry_in > remaining:
+                    self._trigger_dispatch(at=fields.Datetime.now() + timedelta(seconds=retry_in))
+                    return
+                time.sleep(retry_in)
+                continue
+            # Lê os payloads aqui: as threads não podem tocar no ORM/cursor
+            jobs = [(message.id, message.payload) for message in batch]
+            with ThreadPoolExecutor(max_workers=min(config['max_workers'], len(batch))) as executor:
+                results = list(executor.map(
+                    lambda job: self._post_payload(config['url'], job[1], config['client'], job[0]), jobs))
+            for message, result in zip(batch, results):
+                message._apply_result(result, config)
+            self.env.cr.commit()
+        # Orçamento de tempo esgotado: reagenda para continuar drenando
+        self._trigger_dispatch()
+
+    def _claim_batch(self, limit):
+        """
+        Reserva um lote (pendentes vencidos ou envios com reserva expirada),
+        marca as pesquisas como 'processing' e faz commit ANTES da chamada
+        externa, para que o update do N8N nunca concorra com esta transação.
+
+        Mensagens novas só saem se os limites de taxa e de pesquisas em
+        andamento (globais, por usuário e por campanha) permitirem; as demais ficam na fila,
+        com a pesquisa em 'new', e são liberadas em ordem de chegada.
+
+        :return: (lote, segundos até o limite de taxa liberar uma ficha ou None)
+        """
+        self.env.cr.execute("""
+            SELECT o.id, s.user_id, s.campaign_id, o.state = 'sending'
+              FROM pesquisa_aiia_outbox o
+              JOIN pesquisa_aiia_search s ON s.id = o.search_id
+             WHERE (o.state = 'pending' AND o.next_attempt_at <= (now() at time zone 'UTC'))
+                OR (o.state = 'sending' AND o.lease_until < (now() at time zone 'UTC'))
+             ORDER BY o.id
+             LIMIT %s
+               FOR UPDATE OF o SKIP LOCKED
+        """, [limit * self._CLAIM_SCAN_FACTOR])
+        rows = self.env.cr.fetchall()
+        # Reservas expiradas já foram admitidas antes: não passam de novo pelos limites
+        expired_ids = [outbox_id for outbox_id, _user_id, _campaign_id, expired in rows if expired][:limit]
+        admitted_ids, retry_in = self.env['pesquisa_aiia.rate.bucket']._admit(
+            [(outbox_id, user_id, campaign_id) for outbox_id, user_id, campaign_id, expired in rows if not expired],
+            limit - len(expired_ids))
+        claim_ids = expired_ids + admitted_ids
+        if claim_ids:
+            self.env.cr.execute("""
+                UPDATE pesquisa_aiia_outbox
+                   SET state = 'sending',
+                       attempt_count = attempt_count + 1,
+                       lease_until = (now() at time zone 'UTC') + %s * interval '1 second'
+                 WHERE id IN %s
+            """, [self._LEASE_SECONDS, tuple(claim_ids)])
+        batch = self.browse(sorted(claim_ids))
+        if batch:
+            self.invalidate_model(['state', 'attempt_count', 'lease_until'])
+            batch.search_id.filtered(lambda search: search.status == 'new').write(
+                {'status': 'processing', 'error_message': False})
+        # Libera as linhas travadas e grava os baldes consumidos
+        self.env.cr.commit()
+        return batch, retry_in
+
+    @staticmethod
+    def _post_payload(url, payload, client_config, message_id):
+        """
+        Executado nas threads do pool: apenas HTTP, sem acesso ao ORM.
+        Retorna um dicionário com 'ok', 'retryable' e 'error'.
+        """
+        # Com a Idempotency-Key, repetir após timeout/408/504 não duplica a pesquisa no N8N
+        headers = {'Idempotency-Key': 'pesquisa-aiia-outbox-%s' % message_id}
+        started_at = time.perf_counter()
+        try:
+            response = n8n_client.post(url, payload, config=client_config, headers=headers, idempotent=True)
+        except n8n_client.CircuitOpenError as e:
+            # Falha imediata, sem rede: reagenda para quando o circuito permitir um teste
+            metrics.inc('pesquisa_aiia_n8n_requests_total', outcome='circuit_open')
+            return {'ok': False, 'retryable': True, 'error': str(e), 'circuit_open': True,
+                    'retry_in': n8n_client.get_breaker(url, client_config).retry_in()}
+        except n8n_client.N8NClientError as e:
+            metrics.inc('pesquisa_aiia_n8n_requests_total', outcome='error')
+            metrics.observe('pesquisa_aiia_n8n_request_duration_seconds', time.perf_counter() - started_at, outcome='error')
+            return {'ok': False, 'retryable': e.retryable, 'error': str(e), 'status_code': e.status_code}
+        except Exception as e:
+            # Erro inesperado não pode abortar o executor.map das demais mensagens
+            _logger.exception("Outbox Pesquisa AIIA: Erro inesperado ao enviar a mensagem %s.", message_id)
+            metrics.inc('pesquisa_aiia_n8n_requests_total', outcome='error')
+            metrics.observe('pesquisa_aiia_n8n_request_duration_seconds', time.perf_counter() - started_at, outcome='error')
+            return {'ok': False, 'retryable': True, 'error': 'Erro inesperado: %s' % e}
+        metrics.inc('pesquisa_aiia_n8n_requests_total', outcome='ok')
+        metrics.observe('pesquisa_aiia_n8n_request_duration_seconds', time.perf_counter() - started_at, outcome='ok')
+        return {'ok': True, 'retryable': False, 'error': False, 'status_code': response.status_code}
+
+    def _apply_result(self, result, config):
+        self.ensure_one()
+        search = self.search_id
+        if result['ok']:
+            _logger.info("Outbox Pesquisa AIIA: mensagem %s (Search ID: %s) enviada ao N8N.", self.id, search.id)
+            self.write({'state': 'done', 'sent_at': fields.Datetime.now(), 'lease_until': False, 'last_error': False})
+            return
+
+        if result.get('circuit_open'):
+            # Não consome tentativa: o N8N nem foi chamado
+            self.write({
+                'state': 'pending',
+                'attempt_count': max(self.attempt_count - 1, 0),
+                'lease_until': False,
+                'last_error': result['error'],
+                'next_attempt_at': fields.Datetime.now() + timedelta(seconds=max(result['retry_in'], 1)),
+            })
+            if search.status == 'processing':
+                search.write({'status': 'new'})
+            return
+
+        if not result['retryable'] or self.attempt_count >= config['max_attempts']:
+            _logger.error("Outbox Pesquisa AIIA: mensagem %s (Search ID: %s) descartada após %d tentativa(s): %s",
+                          self.id, search.id, self.attempt_count, result['error'])
+            self.write({'state': 'dead', 'lease_until': False, 'last_error': result['error']})
+            search.write({'status': 'error', 'error_message': result['error']})
+            return
+
+        delay = config['retry_base_seconds'] * (2 ** (self.attempt_count - 1)) * random.uniform(0.8, 1.2)
+        _logger.warning("Outbox Pesquisa AIIA: falha ao enviar mensagem %s (Search ID: %s), nova tentativa em %ds: %s",
+                        self.id, search.id, delay, result['error'])
+        self.write({
+            'state': 'pending',
+            'lease_until': False,
+            'last_error': result['error'],
+            'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+        })
+        # Volta a ficar na fila
+        if search.status == 'processing':
+            search.write({'status': 'new'})
+
+    def action_requeue(self):
+        """Devolve mensagens em dead letter para a fila."""
+        dead = self.filtered(lambda msg: msg.state == 'dead')
+        dead.write({'state': 'pending', 'attempt_count': 0, 'last_error': False,
+                    'next_attempt_at': fields.Datetime.now()})
+        dead.search_id.write({'status': 'new', 'error_message': False})
+        self._trigger_dispatch()
+        return True
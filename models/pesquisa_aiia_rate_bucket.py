@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+import logging
+
+from psycopg2 import errors
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaRateBucket(models.Model):
+    """
+    Token buckets compartilhados entre os workers para limitar as chamadas
+    ao N8N: um balde global ('global') e um por usuário ('user:<id>').
+    As linhas são travadas com FOR UPDATE durante a reserva do despachante,
+    então dois workers nunca gastam a mesma ficha.
+    """
+    _name = 'pesquisa_aiia.rate.bucket'
+    _description = 'Limite de Taxa Pesquisa AIIA'
+    _order = 'key'
+    _log_access = False
+
+    key = fields.Char(string='Chave', required=True, readonly=True)
+    tokens = fields.Float(string='Fichas Disponíveis', readonly=True, default=0.0)
+    updated_at = fields.Datetime(string='Atualizado em', readonly=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'Cada balde deve ter uma chave única.'),
+    ]
+
+    @api.model
+    def _get_limits(self):
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        return {
+            'rps': max(settings.rate_limit_rps, 0.0),
+            'burst': max(settings.rate_limit_burst, 1),
+            'user_rps': max(settings.rate_limit_user_rps, 0.0),
+            'user_burst': max(settings.rate_limit_user_burst, 1),
+            'max_in_flight': max(settings.max_in_flight, 0),
+            'max_in_flight_per_user': max(settings.max_in_flight_per_user, 0),
+        }
+
+    @api.model
+    def _admit(self, candidates, limit):
+        """
+        Decide quais mensagens podem ser enviadas agora, na ordem recebida (FIFO).
+        Uma mensagem barrada bloqueia as seguintes do mesmo usuário; um limite
+        global barrado bloqueia todas. Campanhas no limite de pesquisas em
+        paralelo só barram as próprias mensagens. As barradas continuam na fila.
+
+        :param candidates: lista [(outbox_id, user_id, campaign_id)] em ordem de chegada
+        :param limit: máximo de mensagens admitidas
+        :return: (ids admitidos, segundos até haver ficha de novo ou None)
+        """
+        if not candidates:
+            return [], None
+        limits = self._get_limits()
+        campaign_slots = self._get_campaign_slots({campaign_id for _outbox_id, _user_id, campaign_id in candidates
+                                                   if campaign_id})
+        if not any((limits['rps'], limits['user_rps'], limits['max_in_flight'], limits['max_in_flight_per_user'])):
+            if not campaign_slots:
+                return [outbox_id for outbox_id, _user_id, _campaign_id in candidates[:limit]], None
+            admitted = []
+            for outbox_id, _user_id, campaign_id in candidates:
+                if len(admitted) >= limit:
+                    break
+                if campaign_id in campaign_slots:
+                    if campaign_slots[campaign_id] <= 0:
+                        continue
+                    campaign_slots[campaign_id] -= 1
+                admitted.append(outbox_id)
+            return admitted, None
+
+        try:
+            with self.env.cr.savepoint(flush=False):
+                buckets = self._lock_buckets(candidates, limits)
+        except errors.SerializationFailure:
+            # Outro worker acabou de atualizar os baldes: tenta de novo em seguida
+            return [], 1.0
+
+        in_flight = {}
+        if limits['max_in_flight'] or limits['max_in_flight_per_user']:
+            self.env.cr.execute("""
+                SELECT user_id, COUNT(*) FROM pesquisa_aiia_search WHERE status = 'processing' GROUP BY user_id
+            """)
+            in_flight = dict(self.env.cr.fetchall())
+        total_in_flight = sum(in_flight.values())
+
+        admitted = []
+        blocked_users = set()
+        waits = []
+        for outbox_id, user_id, campaign_id in candidates:
+            if len(admitted) >= limit:
+                break
+            if user_id in blocked_users:
+                continue
+            if campaign_slots.get(campaign_id, 1) <= 0:
+                continue
+            if limits['max_in_flight'] and total_in_flight >= limits['max_in_flight']:
+                break
+            global_bucket = buckets.get('global')
+            if global_bucket is not None and global_bucket['tokens'] < 1:
+                waits.append((1 - global_bucket['tokens']) / limits['rps'])
+                break
+            if limits['max_in_flight_per_user'] and in_flight.get(user_id, 0) >= limits['max_in_flight_per_user']:
+                blocked_users.add(user_id)
+                continue
+            user_bucket = buckets.get('user:%s' % user_id)
+            if user_bucket is not None and user_bucket['tokens'] < 1:
+                waits.append((1 - user_bucket['tokens']) / limits['user_rps'])
+                blocked_users.add(user_id)
+                continue
+
+            for bucket in (global_bucket, user_bucket):
+                if bucket is not None:
+                    bucket['tokens'] -= 1
+            in_flight[user_id] = in_flight.get(user_id, 0) + 1
+            total_in_flight += 1
+            if campaign_id in campaign_slots:
+                campaign_slots[campaign_id] -= 1
+            admitted.append(outbox_id)
+
+        if buckets:
+            self.env.cr.execute("""
+                UPDATE pesquisa_aiia_rate_bucket AS b
+                   SET tokens = v.tokens, updated_at = now() at time zone 'UTC'
+                  FROM (VALUES %s) AS v(key, tokens)
+                 WHERE b.key = v.key
+            """ % ", ".join(["(%s, %s::float)"] * len(buckets)),
+                [item for key, bucket in buckets.items() for item in (key, bucket['tokens'])])
+        return admitted, (min(waits) if waits else None)
+
+    @api.model
+    def _get_campaign_slots(self, campaign_ids):
+        """Vagas livres das campanhas com limite de pesquisas em paralelo: {campaign_id: vagas}."""
+        if not campaign_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT c.id, c.max_parallel - COUNT(s.id)
+              FROM pesquisa_aiia_campaign c
+              LEFT JOIN pesquisa_aiia_search s ON s.campaign_id = c.id AND s.status = 'processing'
+             WHERE c.id IN %s AND c.max_parallel > 0
+             GROUP BY c.id, c.max_parallel
+        """, [tuple(campaign_ids)])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _lock_buckets(self, candidates, limits):
+        """
+        Cria os baldes que faltam, trava todos em ordem de chave (sem deadlock
+        entre workers) e devolve {chave: {'tokens'}} já reabastecidos pelo
+        tempo decorrido desde a última atualização.
+        """
+        capacity = {}
+        if limits['rps']:
+            capacity['global'] = (limits['rps'], limits['burst'])
+        if limits['user_rps']:
+            for _outbox_id, user_id, _campaign_id in candidates:
+                capacity['user:%s' % user_id] = (limits['user_rps'], limits['user_burst'])
+        if not capacity:
+            return {}
+
+        keys = sorted(capacity)
+        self.env.cr.execute("""
+            INSERT INTO pesquisa_aiia_rate_bucket (key, tokens, updated_at)
+            VALUES %s
+            ON CONFLICT (key) DO NOTHING
+        """ % ", ".join(["(%s, %s, now() at time zone 'UTC')"] * len(keys)),
+            [item for key in keys for item in (key, capacity[key][1])])
+        self.env.cr.execute("""
+            SELECT key, tokens, EXTRACT(EPOCH FROM (now() at time zone 'UTC') - updated_at)
+              FROM pesquisa_aiia_rate_bucket
+             WHERE key IN %s
+             ORDER BY key
+               FOR UPDATE
+        """, [tuple(keys)])
+        buckets = {}
+        for key, tokens, elapsed in self.env.cr.fetchall():
+            rate, burst = capacity[key]
+            buckets[key] = {'tokens': min(float(burst), tokens + max(float(elapsed or 0), 0.0) * rate)}
+        return buckets
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from datetime import datetime, timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class PesquisaAiiaReportDaily(models.Model):
+    """
+    Resumo diário pré-agregado de pesquisas e leads, por dia de criação
+    (UTC), usuário e status atual da pesquisa. Os gráficos e tabelas
+    dinâmicas leem estas poucas linhas em vez de agrupar as tabelas de leads
+    e pesquisas inteiras. O cron recalcula apenas os dias afetados por
+    registros alterados desde a última atualização (marca d'água em
+    `refreshed_upto`) e os dias marcados como sujos por exclusões e
+    arquivamentos, que não deixam `write_date` para trás (tabela
+    `pesquisa_aiia_report_daily_dirty`, criada em init).
+    """
+    _name = 'pesquisa_aiia.report.daily'
+    _description = 'Resumo Diário Pesquisa AIIA'
+    _order = 'date desc, user_id, status'
+    _log_access = False
+
+    date = fields.Date(string='Dia', required=True, readonly=True, index=True)
+    user_id = fields.Many2one('res.users', string='Usuário', readonly=True)
+    status = fields.Selection(selection='_get_status_selection', string='Status da Pesquisa', readonly=True)
+    search_count = fields.Integer(string='Pesquisas', readonly=True)
+    lead_count = fields.Integer(string='Leads', readonly=True)
+    lead_with_phone_count = fields.Integer(string='Leads com Telefone', readonly=True)
+    lead_with_email_count = fields.Integer(string='Leads com E-mail', readonly=True)
+    contact_count = fields.Integer(string='Contatos Criados', readonly=True)
+    conversion_rate = fields.Float(string='Conversão em Contatos (%)', readonly=True, group_operator='avg',
+                                   help="Contatos criados / leads. Nos agrupamentos é recalculada a partir dos totais.")
+    refreshed_upto = fields.Datetime(string='Atualizado até', readonly=True)
+
+    # Margem para transações que gravaram antes da marca d'água mas fizeram commit depois
+    _REFRESH_OVERLAP = timedelta(minutes=5)
+
+    def init(self):
+        self.env.cr.execute("CREATE TABLE IF NOT EXISTS pesquisa_aiia_report_daily_dirty (date date PRIMARY KEY)")
+
+    @api.model
+    def _mark_dirty(self, dates):
+        """Marca dias (datas ou datetimes UTC de criação) para o próximo recálculo incremental."""
+        days = sorted({value.date() if isinstance(value, datetime) else value for value in dates if value})
+        if days:
+            self.env.cr.execute("""
+                INSERT INTO pesquisa_aiia_report_daily_dirty (date)
+                SELECT unnest(%s::date[]) ON CONFLICT DO NOTHING
+            """, [days])
+
+    @api.model
+    def _get_status_selection(self):
+        return self.env['pesquisa_aiia.search']._fields['status'].selection
+
+    @api.model
+    def read_group(self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
+        # A média das taxas diárias distorce o resultado: recalcula como soma(contatos) / soma(leads)
+        field_names = [spec.split(':')[0] for spec in fields]
+        with_rate = 'conversion_rate' in field_names
+        if with_rate:
+            fields = list(fields) + [spec for spec, name in (('lead_count:sum', 'lead_count'),
+                                                             ('contact_count:sum', 'contact_count'))
+                                     if name not in field_names]
+        result = super().read_group(domain, fields, groupby, offset=offset, limit=limit, orderby=orderby, lazy=lazy)
+        if with_rate:
+            for group in result:
+                leads = group.get('lead_count') or 0
+                group['conversion_rate'] = (group.get('contact_count') or 0) * 100.0 / leads if leads else 0.0
+        return result
+
+    @api.model
+    def _cron_refresh(self):
+        self._refresh()
+
+    @api.model
+    def _refresh(self, full=False):
+        """
+        Atualiza o resumo. Sem marca d'água (primeira execução) ou com
+        full=True, reconstrói tudo; senão recalcula só os dias com leads ou
+        pesquisas alterados desde a última execução (menos uma margem).
+        :return: número de dias recalculados (None na reconstrução completa)
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT GREATEST((SELECT MAX(write_date) FROM pesquisa_aiia_lead),
+                            (SELECT MAX(write_date) FROM pesquisa_aiia_search))
+        """)
+        new_mark = cr.fetchone()[0]
+        if new_mark is None:
+            # Nenhum lead nem pesquisa restante: o resumo fica vazio
+            cr.execute("DELETE FROM pesquisa_aiia_report_daily")
+            cr.execute("DELETE FROM pesquisa_aiia_report_daily_dirty")
+            self.invalidate_model()
+            return 0
+
+        cr.execute("SELECT MAX(refreshed_upto) FROM pesquisa_aiia_report_daily")
+        mark = cr.fetchone()[0]
+        if full or mark is None:
+            cr.execute("DELETE FROM pesquisa_aiia_report_daily")
+            cr.execute("DELETE FROM pesquisa_aiia_report_daily_dirty")
+            self._insert_aggregates(None, new_mark)
+            self.invalidate_model()
+            _logger.info("Relatório Pesquisa AIIA: resumo diário reconstruído.")
+            return None
+
+        since = mark - self._REFRESH_OVERLAP
+        # Dias afetados: leads criados/alterados, pesquisas criadas/alteradas,
+        # como o status é o atual, os dias dos leads de pesquisas alteradas e
+        # os dias marcados por exclusões/arquivamentos
+        cr.execute("""
+            SELECT create_date::date FROM pesquisa_aiia_lead WHERE write_date > %(since)s
+             UNION
+            SELECT create_date::date FROM pesquisa_aiia_search WHERE write_date > %(since)s
+             UNION
+            SELECT l.create_date::date
+              FROM pesquisa_aiia_search s
+              JOIN pesquisa_aiia_lead l ON l.search_id = s.id
+             WHERE s.write_date > %(since)s
+             UNION
+            SELECT date FROM pesquisa_aiia_report_daily_dirty
+        """, {'since': since})
+        days = sorted(row[0] for row in cr.fetchall() if row[0])
+        if not days:
+            return 0
+        # Só os dias lidos: marcas feitas por outras transações ficam para a próxima execução
+        cr.execute("DELETE FROM pesquisa_aiia_report_daily_dirty WHERE date = ANY(%s)", [days])
+        cr.execute("DELETE FROM pesquisa_aiia_report_daily WHERE date = ANY(%s)", [days])
+        self._insert_aggregates(days, new_mark)
+        self.invalidate_model()
+        _logger.info("Relatório Pesquisa AIIA: %d dia(s) recalculado(s).", len(days))
+        return len(days)
+
+    @api.model
+    def _insert_aggregates(self, days, mark):
+        """Agrega pesquisas e leads dos dias informados (todos se None) e grava as linhas."""
+        if days:
+            search_filter = "WHERE s.create_date >= %(first_day)s AND s.create_date::date = ANY(%(days)s)"
+            lead_filter = "WHERE l.create_date >= %(first_day)s AND l.create_date::date = ANY(%(days)s)"
+        else:
+            search_filter = lead_filter = ""
+        self.env.cr.execute("""
+            INSERT INTO pesquisa_aiia_report_daily
+                   (date, user_id, status, search_count, lead_count, lead_with_phone_count,
+                    lead_with_email_count, contact_count, conversion_rate, refreshed_upto)
+            SELECT day, user_id, status, SUM(searches), SUM(leads), SUM(phone), SUM(email), SUM(contacts),
+                   CASE WHEN SUM(leads) > 0 THEN SUM(contacts) * 100.0 / SUM(leads) ELSE 0 END,
+                   %%(mark)s
+              FROM (
+                    SELECT s.create_date::date AS day, s.user_id, s.status,
+                           COUNT(*) AS searches, 0 AS leads, 0 AS phone, 0 AS email, 0 AS contacts
+                      FROM pesquisa_aiia_search s
+                      %s
+                     GROUP BY 1, 2, 3
+                     UNION ALL
+                    SELECT l.create_date::date, s.user_id, s.status,
+                           0, COUNT(*),
+                           COUNT(*) FILTER (WHERE COALESCE(l.phone, '') != ''),
+                           COUNT(*) FILTER (WHERE COALESCE(l.email, '') != ''),
+                           COUNT(*) FILTER (WHERE l.contact_created)
+                      FROM pesquisa_aiia_lead l
+                      LEFT JOIN pesquisa_aiia_search s ON s.id = l.search_id
+                      %s
+                     GROUP BY 1, 2, 3
+                   ) AS agg
+             GROUP BY day, user_id, status
+        """ % (search_filter, lead_filter), {'days': days, 'first_day': days[0] if days else None, 'mark': mark})
+
+    def action_rebuild(self):
+        """Reconstrói o resumo inteiro (ex.: após importações por fora do ORM)."""
+        self._refresh(full=True)
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
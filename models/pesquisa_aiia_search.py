@@ -1,12 +1,23 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
-import requests
-import json
+from datetime import timedelta
 import logging
 
+from ..utils import metrics
+from ..utils.normalize import normalize_query
+
 _logger = logging.getLogger(__name__)
 
+# Notificação do bus com as atualizações de uma pesquisa, enviada ao parceiro do dono
+SEARCH_BUS_NOTIFICATION = 'pesquisa_aiia.search_update'
+
+
+def _merge_bus_updates(older, newer):
+    """Valores absolutos da mais recente; leads novos somados; mudança de status preservada."""
+    return dict(newer, new_leads=older.get('new_leads', 0) + newer.get('new_leads', 0),
+                status_changed=bool(older.get('status_changed') or newer.get('status_changed')))
+
 class PesquisaAiiaSearch(models.Model):
     _name = 'pesquisa_aiia.search'
     _description = 'Registro de Pesquisa AIIA'
@@ -25,10 +36,53 @@ class PesquisaAiiaSearch(models.Model):
         ('pending_next', 'Aguardando Próxima Página'),
         ('completed', 'Concluída'),
         ('error', 'Erro')
-    ], string='Status', default='new', readonly=True, copy=False, index=True, tracking=True)
+    ], string='Status', default='new', readonly=True, copy=False, index=True)
     lead_ids = fields.One2many('pesquisa_aiia.lead', 'search_id', string='Leads Encontrados')
     lead_count = fields.Integer(string='Nº Leads', compute='_compute_lead_count')
-    error_message = fields.Text(string='Mensagem de Erro', readonly=True, tracking=True)
+    # --- Estatísticas de leads mantidas incrementalmente pela ingestão ---
+    lead_total = fields.Integer(string='Total de Leads', readonly=True, default=0, copy=False)
+    lead_with_phone_count = fields.Integer(string='Leads com Telefone', readonly=True, default=0, copy=False)
+    lead_with_email_count = fields.Integer(string='Leads com E-mail', readonly=True, default=0, copy=False)
+    contact_created_count = fields.Integer(string='Contatos Criados', readonly=True, default=0, copy=False)
+    last_lead_at = fields.Datetime(string='Último Lead Recebido', readonly=True, copy=False, index=True)
+    error_message = fields.Text(string='Mensagem de Erro', readonly=True)
+    status_history_ids = fields.One2many('pesquisa_aiia.search.history', 'search_id', string='Histórico de Status', readonly=True)
+    active = fields.Boolean(string='Ativa', default=True,
+                            help="Pesquisas antigas são arquivadas pela política de retenção.")
+    archived_lead_count = fields.Integer(string='Leads no Arquivo', compute='_compute_archived_lead_count')
+    # --- Envio de e-mail em massa ---
+    mass_mail_queued_count = fields.Integer(string='E-mails Enfileirados', readonly=True, default=0, copy=False)
+    mass_mail_pending_count = fields.Integer(string='E-mails Aguardando Envio', compute='_compute_mass_mail_progress')
+    mass_mail_failed_count = fields.Integer(string='E-mails com Falha', compute='_compute_mass_mail_progress')
+    mass_mail_sent_count = fields.Integer(string='E-mails Enviados', compute='_compute_mass_mail_progress')
+    # --- Paginação automática ---
+    auto_paginate = fields.Boolean(string='Paginação Automática', default=False, copy=False,
+                                   help="Solicita as próximas páginas automaticamente, sem clique, até o N8N "
+                                        "concluir a pesquisa ou um dos limites abaixo ser atingido.")
+    auto_max_pages = fields.Integer(string='Máximo de Páginas', default=0,
+                                    help="Limite de páginas solicitadas (incluindo a primeira). 0 = sem limite.")
+    auto_max_leads = fields.Integer(string='Máximo de Leads', default=0,
+                                    help="Para de paginar quando a pesquisa atingir esse total de leads. 0 = sem limite.")
+    page_count = fields.Integer(string='Páginas Solicitadas', readonly=True, default=0, copy=False)
+    campaign_id = fields.Many2one('pesquisa_aiia.campaign', string='Campanha', readonly=True, copy=False,
+                                  ondelete='set null', index='btree_not_null')
+    # --- Cache de resultados ---
+    query_key = fields.Char(string='Termo Normalizado', compute='_compute_query_key', store=True, index=True)
+    completed_at = fields.Datetime(string='Concluída em', readonly=True, copy=False)
+    cache_hit = fields.Boolean(string='Resultado do Cache', readonly=True, copy=False,
+                               help="Os leads foram reaproveitados de uma pesquisa recente com o mesmo termo, sem chamar o N8N.")
+    cache_source_id = fields.Many2one('pesquisa_aiia.search', string='Reaproveitada de', readonly=True, copy=False,
+                                      ondelete='set null')
+
+    # Candidatas lidas por vaga livre, para pular usuários já no limite
+    _AUTO_PAGINATE_SCAN_FACTOR = 10
+
+    def init(self):
+        # Índice parcial para o cron de paginação automática: só as pesquisas aguardando página
+        tools.create_index(self.env.cr, 'pesquisa_aiia_search_auto_pending_idx', self._table,
+                           ['write_date', 'id'], where="status = 'pending_next' AND auto_paginate")
+        # Resumo diário: pesquisas alteradas desde a marca d'água
+        tools.create_index(self.env.cr, 'pesquisa_aiia_search_write_date_idx', self._table, ['write_date'])
 
     @api.depends('search_query')
     def _compute_name(self):
@@ -39,85 +93,329 @@ class PesquisaAiiaSearch(models.Model):
             else:
                 search.name = _('Pesquisa Vazia')
 
+    @api.depends('search_query')
+    def _compute_query_key(self):
+        for search in self:
+            search.query_key = normalize_query(search.search_query)
+
     @api.depends('lead_ids')
     def _compute_lead_count(self):
-        # Usando search_count é mais simples e geralmente eficiente para esta contagem
+        # Uma única agregação agrupada para todo o recordset (sem N+1 COUNTs)
+        search_ids = [search_id for search_id in self._origin.ids if search_id]
+        counts = {}
+        if search_ids:
+            lead_groups = self.env['pesquisa_aiia.lead']._read_group(
+                [('search_id', 'in', search_ids)], ['search_id'], ['__count'])
+            counts = {search.id: count for search, count in lead_groups}
+            # Leads de outras pesquisas vinculados pela deduplicação
+            self.env['pesquisa_aiia.lead'].flush_model(['linked_search_ids'])
+            self.env.cr.execute("""
+                SELECT search_id, COUNT(*) FROM pesquisa_aiia_lead_search_rel
+                 WHERE search_id IN %s GROUP BY search_id
+            """, [tuple(search_ids)])
+            for search_id, count in self.env.cr.fetchall():
+                counts[search_id] = counts.get(search_id, 0) + count
+        for search in self:
+            search.lead_count = counts.get(search._origin.id, 0)
+
+    def _compute_archived_lead_count(self):
+        search_ids = [search_id for search_id in self._origin.ids if search_id]
+        counts = {}
+        if search_ids:
+            archive_groups = self.env['pesquisa_aiia.lead.archive'].sudo()._read_group(
+                [('search_id', 'in', search_ids)], ['search_id'], ['lead_count:sum'])
+            counts = {search.id: total for search, total in archive_groups}
+        for search in self:
+            search.archived_lead_count = counts.get(search._origin.id, 0)
+
+    def _compute_mass_mail_progress(self):
+        # Os e-mails enviados são apagados pelo mail (auto_delete) e os com falha são mantidos
+        # (ver mail.mail._postprocess_sent_message): enviados = enfileirados - pendentes - falhas
+        search_ids = [search_id for search_id in self._origin.ids if search_id]
+        counts = {}
+        if search_ids:
+            mail_groups = self.env['mail.mail'].sudo()._read_group(
+                [('pesquisa_aiia_search_id', 'in', search_ids)], ['pesquisa_aiia_search_id', 'state'], ['__count'])
+            for search, state, count in mail_groups:
+                counts[(search.id, state)] = count
         for search in self:
-            search.lead_count = self.env['pesquisa_aiia.lead'].search_count([('search_id', '=', search.id)])
+            search_id = search._origin.id
+            pending = counts.get((search_id, 'outgoing'), 0)
+            failed = counts.get((search_id, 'exception'), 0) + counts.get((search_id, 'cancel'), 0)
+            search.mass_mail_pending_count = pending
+            search.mass_mail_failed_count = failed
+            search.mass_mail_sent_count = max(search.mass_mail_queued_count - pending - failed, 0)
+
+    @api.model
+    def _add_mass_mail_queued(self, queued_by_search):
+        """Soma os e-mails enfileirados por pesquisa (UPDATE atômico) e registra no chatter."""
+        self.env.cr.execute("""
+            UPDATE pesquisa_aiia_search AS s
+               SET mass_mail_queued_count = s.mass_mail_queued_count + v.queued
+              FROM (VALUES %s) AS v(id, queued)
+             WHERE s.id = v.id
+        """ % ", ".join(["(%s, %s)"] * len(queued_by_search)),
+            [item for search_id, queued in queued_by_search.items() for item in (search_id, queued)])
+        searches = self.browse(list(queued_by_search))
+        searches.invalidate_recordset(['mass_mail_queued_count'])
+        for search in searches:
+            search.message_post(body=_("%s e-mail(s) enfileirado(s) para envio em massa.") % queued_by_search[search.id],
+                                message_type='comment', subtype_xmlid='mail.mt_note')
+
+    def action_mass_send_email(self):
+        """Enfileira e-mails para todos os leads das pesquisas (próprios e vinculados)."""
+        leads = self.env['pesquisa_aiia.lead'].search(['|', ('search_id', 'in', self.ids),
+                                                       ('linked_search_ids', 'in', self.ids)])
+        if not leads:
+            raise UserError(_("Nenhum lead encontrado para as pesquisas selecionadas."))
+        return leads.action_mass_send_email()
+
+    def action_restore_archived_leads(self):
+        """Traz de volta os leads destas pesquisas que a política de retenção moveu para o arquivo."""
+        archives = self.env['pesquisa_aiia.lead.archive'].sudo().search([('search_id', 'in', self.ids)])
+        if not archives:
+            raise UserError(_("Não há leads arquivados para as pesquisas selecionadas."))
+        restored = archives._restore()
+        self.filtered(lambda search: not search.active).write({'active': True})
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Leads Restaurados"),
+                'message': _("%s lead(s) restaurado(s) do arquivo.") % len(restored),
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
+
+    _LEAD_STATS_FIELDS = ['lead_total', 'lead_with_phone_count', 'lead_with_email_count',
+                          'contact_created_count', 'last_lead_at']
+
+    @api.model
+    def _apply_lead_stats_delta(self, delta):
+        """
+        Aplica incrementos nas estatísticas com um único UPDATE atômico
+        (seguro entre webhooks concorrentes, sem ler os leads).
+
+        :param delta: {search_id: {'total', 'phone', 'email', 'contacts', 'last_at'}}
+        """
+        if not delta:
+            return
+        rows = []
+        params = []
+        for search_id, values in delta.items():
+            rows.append("(%s, %s, %s, %s, %s, %s::timestamp)")
+            params.extend([search_id, values.get('total', 0), values.get('phone', 0), values.get('email', 0),
+                           values.get('contacts', 0), values.get('last_at')])
+        self.env.cr.execute("""
+            UPDATE pesquisa_aiia_search AS s
+               SET lead_total = GREATEST(s.lead_total + v.total, 0),
+                   lead_with_phone_count = GREATEST(s.lead_with_phone_count + v.phone, 0),
+                   lead_with_email_count = GREATEST(s.lead_with_email_count + v.email, 0),
+                   contact_created_count = GREATEST(s.contact_created_count + v.contacts, 0),
+                   last_lead_at = GREATEST(s.last_lead_at, v.last_at)
+              FROM (VALUES %s) AS v(id, total, phone, email, contacts, last_at)
+             WHERE s.id = v.id
+         RETURNING s.id, s.status, s.lead_total, s.next_page_token IS NOT NULL AND s.next_page_token != '', v.total
+        """ % ", ".join(rows), params)
+        self._notify_bus([{
+            'search_id': search_id,
+            'status': status,
+            'lead_total': lead_total,
+            'has_next_page_token': has_token,
+            'new_leads': new_leads,
+            'status_changed': False,
+        } for search_id, status, lead_total, has_token, new_leads in self.env.cr.fetchall()])
+        self.browse(list(delta)).invalidate_recordset(self._LEAD_STATS_FIELDS)
+
+    @api.model
+    def _notify_bus(self, updates):
+        """
+        Publica no bus o estado compacto das pesquisas para atualizar o
+        formulário e a lista de leads abertos no navegador do dono da
+        pesquisa (canal do parceiro dele, não um canal global). As
+        atualizações da transação são agrupadas e enviadas no commit, uma por
+        pesquisa; o ritmo entre transações é limitado no navegador
+        (search_bus.js).
+        """
+        data = self.env.cr.precommit.data
+        pending = data.get('pesquisa_aiia.bus_updates')
+        if pending is None:
+            pending = data['pesquisa_aiia.bus_updates'] = {}
+            self.env.cr.precommit.add(self._send_bus_updates)
+        for update in updates:
+            previous = pending.get(update['search_id'])
+            pending[update['search_id']] = _merge_bus_updates(previous, update) if previous else update
+
+    @api.model
+    def _send_bus_updates(self):
+        pending = self.env.cr.precommit.data.pop('pesquisa_aiia.bus_updates', None)
+        if not pending:
+            return
+        searches = self.sudo().with_context(active_test=False).browse(list(pending)).exists()
+        self.env['bus.bus'].sudo()._sendmany([
+            (search.user_id.partner_id, SEARCH_BUS_NOTIFICATION, pending[search.id])
+            for search in searches if search.user_id
+        ])
+
+    def action_recompute_lead_stats(self):
+        """
+        Recalcula as estatísticas do zero (ex.: após importar leads por fora
+        da ingestão), contando os leads próprios e os vinculados, como a
+        atualização incremental.
+        """
+        if not self:
+            return True
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE pesquisa_aiia_search AS s
+               SET lead_total = COALESCE(agg.total, 0),
+                   lead_with_phone_count = COALESCE(agg.phone, 0),
+                   lead_with_email_count = COALESCE(agg.email, 0),
+                   contact_created_count = COALESCE(agg.contacts, 0),
+                   last_lead_at = agg.last_at
+              FROM pesquisa_aiia_search AS base
+              LEFT JOIN (
+                    SELECT search_id,
+                           COUNT(*) AS total,
+                           COUNT(*) FILTER (WHERE COALESCE(phone, '') != '') AS phone,
+                           COUNT(*) FILTER (WHERE COALESCE(email, '') != '') AS email,
+                           COUNT(*) FILTER (WHERE contact_created) AS contacts,
+                           MAX(create_date) AS last_at
+                      FROM (
+                            SELECT l.search_id, l.phone, l.email, l.contact_created, l.create_date
+                              FROM pesquisa_aiia_lead l
+                             WHERE l.search_id IN %(ids)s
+                             UNION ALL
+                            SELECT r.search_id, l.phone, l.email, l.contact_created, l.create_date
+                              FROM pesquisa_aiia_lead_search_rel r
+                              JOIN pesquisa_aiia_lead l ON l.id = r.lead_id
+                             WHERE r.search_id IN %(ids)s
+                               AND l.search_id IS DISTINCT FROM r.search_id
+                           ) AS leads
+                     GROUP BY search_id) AS agg ON agg.search_id = base.id
+             WHERE s.id = base.id AND base.id IN %(ids)s
+        """, {'ids': tuple(self.ids)})
+        self.invalidate_recordset(self._LEAD_STATS_FIELDS)
+        return True
 
     def _get_n8n_trigger_url(self):
-        config_params = self.env['ir.config_parameter'].sudo()
-        n8n_trigger_url = config_params.get_param('pesquisa_aiia.n8n_scrape_trigger_url')
+        n8n_trigger_url = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().n8n_scrape_trigger_url
         if not n8n_trigger_url:
             raise UserError(_("A 'URL Webhook N8N (Iniciar Scraping)' não está configurada."))
         return n8n_trigger_url
 
-    def _send_request_to_n8n(self, payload):
+    def _send_request_to_n8n(self, payload, kind='start'):
+        """
+        Registra o payload na caixa de saída (outbox), na mesma transação da
+        pesquisa. O envio HTTP é feito em segundo plano pelo cron despachante,
+        que muda o status para 'processing' quando o N8N aceita a solicitação.
+        """
         self.ensure_one()
-        n8n_trigger_url = self._get_n8n_trigger_url()
-        headers = {'Content-Type': 'application/json'}
-
-        _logger.info(f"Enviando payload para N8N (Search ID: {self.id}): {json.dumps(payload)}")
-
-        # Definindo o status para 'processing' antes de enviar
-        write_vals = {'status': 'processing', 'error_message': False}
-        # Chamamos write aqui, que por sua vez chamará message_post (se status mudar)
-        self.write(write_vals)
-        # Commit para garantir que o status seja atualizado antes da chamada externa
-        self.env.cr.commit()
-
-        try:
-            response = requests.post(n8n_trigger_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            _logger.info(f"Solicitação (Search ID: {self.id}) enviada com sucesso para N8N. Resposta N8N (status {response.status_code}): {response.text[:200]}")
-            # Não posta mensagem de sucesso aqui, espera o webhook de update
-            return True
+        # Falha cedo se a integração não estiver configurada
+        self._get_n8n_trigger_url()
 
-        except requests.exceptions.Timeout:
-            _logger.error(f"Timeout ao enviar solicitação (Search ID: {self.id}): {n8n_trigger_url}")
-            error_msg = _("Timeout N8N: O serviço externo demorou muito para responder.")
-            # Atualiza status e loga erro via write
-            self.write({'status': 'error', 'error_message': error_msg})
-            self.env.cr.commit()
-            raise UserError(error_msg)
-        except requests.exceptions.RequestException as e:
-            _logger.error(f"Erro ao enviar solicitação (Search ID: {self.id}): {e}")
-            error_details = str(e)
-            if hasattr(e, 'response') and e.response is not None:
-                 try: error_details = e.response.json()
-                 except json.JSONDecodeError: error_details = e.response.text[:500]
-            error_msg_user = _("Erro N8N: %s", error_details)
-            # Atualiza status e loga erro via write
-            self.write({'status': 'error', 'error_message': error_msg_user})
-            self.env.cr.commit()
-            raise UserError(error_msg_user)
-        except Exception as e:
-             _logger.exception(f"Erro inesperado ao enviar para N8N (Search ID: {self.id}):")
-             error_msg = _("Erro inesperado: %s", str(e))
-             # Atualiza status e loga erro via write
-             self.write({'status': 'error', 'error_message': error_msg})
-             self.env.cr.commit()
-             raise UserError(error_msg)
+        _logger.info(f"Enfileirando solicitação '{kind}' para N8N (Search ID: {self.id}).")
+        self.write({'status': 'new', 'error_message': False, 'page_count': self.page_count + 1})
+        self.env['pesquisa_aiia.outbox']._enqueue(self, kind, payload)
+        return True
 
     @api.model_create_multi
     def create(self, vals_list):
-        # Loga a criação após o registro ser efetivamente criado
-        records = super(PesquisaAiiaSearch, self).create(vals_list)
-        for record in records:
-            record.message_post(body=_("Pesquisa criada por %s com o termo: '%s'") % (record.user_id.name, record.search_query),
-                                message_type='comment', subtype_xmlid='mail.mt_comment')
-        return records
+        # Sem mensagem de criação, seguidores nem rastreamento de campos por
+        # registro no chatter: o histórico de status registra a criação em lote
+        records = super(PesquisaAiiaSearch, self.with_context(
+            mail_create_nolog=True, mail_create_nosubscribe=True, mail_notrack=True)).create(vals_list)
+        self.env['pesquisa_aiia.search.history'].sudo().create([{
+            'search_id': record.id,
+            'old_status': False,
+            'new_status': record.status,
+        } for record in records])
+        return records.with_env(self.env)
+
+    def unlink(self):
+        if self:
+            # Os leads ficam sem pesquisa (set null no banco, sem write_date):
+            # marca os dias deles e das pesquisas para o resumo diário
+            self.env.flush_all()
+            self.env.cr.execute("SELECT DISTINCT create_date::date FROM pesquisa_aiia_lead WHERE search_id IN %s",
+                                [tuple(self.ids)])
+            self.env['pesquisa_aiia.report.daily'].sudo()._mark_dirty(
+                [row[0] for row in self.env.cr.fetchall()] + self.mapped('create_date'))
+        return super().unlink()
 
     @api.model
-    def start_new_search(self, query, message=None):
+    def _find_cached_result(self, query):
+        """Pesquisa concluída mais recente, dentro do TTL do cache, com o mesmo termo normalizado."""
+        return self._find_cached_results([query]).get(normalize_query(query)) or self.browse()
+
+    @api.model
+    def _find_cached_results(self, queries):
+        """Versão em lote (uma consulta): {termo_normalizado: pesquisa de origem} para os termos com resultado no cache."""
+        ttl_hours = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().result_cache_ttl_hours
+        query_keys = {key for key in map(normalize_query, queries) if key}
+        if ttl_hours <= 0 or not query_keys:
+            return {}
+        sources = {}
+        for source in self.search([
+            ('query_key', 'in', list(query_keys)),
+            ('status', '=', 'completed'),
+            ('completed_at', '>=', fields.Datetime.now() - timedelta(hours=ttl_hours)),
+            ('lead_total', '>', 0),
+        ], order='completed_at desc'):
+            sources.setdefault(source.query_key, source)
+        return sources
+
+    def _link_cached_leads(self, source):
+        """
+        Vincula a esta pesquisa, com um único INSERT ... SELECT, os leads da
+        pesquisa de origem (próprios e vinculados) e copia as estatísticas.
+        """
+        self.ensure_one()
+        self.env.flush_all()
+        self.env.cr.execute("""
+            INSERT INTO pesquisa_aiia_lead_search_rel (lead_id, search_id)
+            SELECT id, %(target)s FROM pesquisa_aiia_lead WHERE search_id = %(source)s
+             UNION
+            SELECT lead_id, %(target)s FROM pesquisa_aiia_lead_search_rel WHERE search_id = %(source)s
+            ON CONFLICT DO NOTHING
+        """, {'target': self.id, 'source': source.id})
+        linked = self.env.cr.rowcount
+        self.env['pesquisa_aiia.lead'].invalidate_model(['linked_search_ids'])
+        self.write({
+            'lead_total': source.lead_total,
+            'lead_with_phone_count': source.lead_with_phone_count,
+            'lead_with_email_count': source.lead_with_email_count,
+            'contact_created_count': source.contact_created_count,
+            'last_lead_at': source.last_lead_at,
+        })
+        return linked
+
+    @api.model
+    def start_new_search(self, query, message=None, auto_paginate=False, auto_max_pages=0, auto_max_leads=0,
+                         force_refresh=False):
         if not query or not query.strip():
             raise ValidationError(_("O termo de pesquisa não pode estar vazio."))
 
+        # Mesmo termo concluído recentemente: reaproveita os leads sem chamar o N8N
+        if self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().result_cache_ttl_hours > 0:
+            if force_refresh:
+                metrics.inc('pesquisa_aiia_result_cache_total', outcome='refresh')
+            else:
+                source = self._find_cached_result(query)
+                metrics.inc('pesquisa_aiia_result_cache_total', outcome='hit' if source else 'miss')
+                if source:
+                    return self._start_from_cache(query, source)
+
         # Create chamará o message_post de criação
         search_record = self.create({
             'search_query': query.strip(),
             'user_id': self.env.user.id,
             'status': 'new',
+            'auto_paginate': bool(auto_paginate),
+            'auto_max_pages': max(int(auto_max_pages or 0), 0),
+            'auto_max_leads': max(int(auto_max_leads or 0), 0),
         })
         _logger.info(f"Novo registro de pesquisa criado ID: {search_record.id} para query: '{query}'")
 
@@ -129,13 +427,27 @@ class PesquisaAiiaSearch(models.Model):
             'odoo_user_name': search_record.user_id.name
         }
 
-        try:
-            # _send_request_to_n8n atualizará o status para 'processing' e logará
-            search_record._send_request_to_n8n(payload)
-            return search_record.id
-        except (UserError, ValidationError) as e:
-            # Erros já logados por _send_request_to_n8n
-            raise e
+        # Apenas enfileira: retorna imediatamente com status 'new'
+        search_record._send_request_to_n8n(payload, kind='start')
+        return search_record.id
+
+    @api.model
+    def _start_from_cache(self, query, source, extra_vals=None):
+        search_record = self.create(dict({
+            'search_query': query.strip(),
+            'user_id': self.env.user.id,
+            'status': 'completed',
+            'completed_at': fields.Datetime.now(),
+            'cache_hit': True,
+            'cache_source_id': source.id,
+        }, **(extra_vals or {})))
+        linked = search_record._link_cached_leads(source)
+        search_record.message_post(
+            body=_("Resultado reaproveitado da pesquisa '%s' (concluída em %s): %s lead(s) vinculado(s), sem nova consulta ao N8N.")
+            % (source.name, fields.Datetime.to_string(source.completed_at), linked),
+            message_type='comment', subtype_xmlid='mail.mt_note')
+        _logger.info(f"Pesquisa ID {search_record.id} atendida pelo cache (origem ID {source.id}, {linked} leads).")
+        return search_record.id
 
     def search_next_page(self):
         self.ensure_one()
@@ -150,9 +462,6 @@ class PesquisaAiiaSearch(models.Model):
              raise UserError(_("Esta pesquisa já foi concluída."))
 
         _logger.info(f"Solicitando próxima página para Search ID: {self.id} usando token.")
-        # Loga a intenção ANTES de enviar
-        self.message_post(body=_("Solicitando próxima página de resultados."),
-                          message_type='comment', subtype_xmlid='mail.mt_comment')
 
         payload = {
             'search_id': self.id,
@@ -161,64 +470,184 @@ class PesquisaAiiaSearch(models.Model):
             'odoo_user_name': self.user_id.name
         }
 
-        try:
-             # _send_request_to_n8n atualizará o status para 'processing' e logará a mudança
-             self._send_request_to_n8n(payload)
-             return True
-        except (UserError, ValidationError) as e:
-             # Erros já logados por _send_request_to_n8n
-             raise e
+        self._send_request_to_n8n(payload, kind='next_page')
+        return True
+
+    def _auto_paginate_limit_reached(self):
+        self.ensure_one()
+        return bool((self.auto_max_pages and self.page_count >= self.auto_max_pages)
+                    or (self.auto_max_leads and self.lead_total >= self.auto_max_leads))
+
+    @api.model
+    def _trigger_auto_paginate(self):
+        cron = self.env.ref('pesquisa_aiia.ir_cron_pesquisa_aiia_auto_paginate', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _cron_expire_processing(self):
+        """
+        Passa para 'Erro' as pesquisas em 'Processando' sem atividade (retorno
+        de status ou leads) além do tempo limite: sem o update_search do N8N,
+        elas ocupariam para sempre as vagas dos limites de pesquisas em
+        andamento (global, por usuário, por campanha e da paginação automática).
+        """
+        timeout = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().processing_timeout_minutes
+        if timeout <= 0:
+            return 0
+        self.env.flush_all()
+        # last_lead_at: os leads chegam por UPDATE direto, que não mexe em write_date
+        self.env.cr.execute("""
+            SELECT id FROM pesquisa_aiia_search
+             WHERE status = 'processing'
+               AND GREATEST(write_date, COALESCE(last_lead_at, write_date)) < (now() at time zone 'UTC') - %s * interval '1 minute'
+             ORDER BY id
+               FOR UPDATE SKIP LOCKED
+        """, [timeout])
+        stale = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if stale:
+            stale.write({
+                'status': 'error',
+                'error_message': _("Sem retorno do N8N por mais de %s minuto(s); pesquisa encerrada por tempo limite.") % timeout,
+            })
+            _logger.warning("Pesquisa AIIA: %d pesquisa(s) em 'Processando' expirada(s) por tempo limite.", len(stale))
+        return len(stale)
+
+    @api.model
+    def _cron_auto_paginate(self):
+        """
+        Solicita a próxima página das pesquisas com paginação automática que
+        estão em 'pending_next', respeitando os limites de pesquisas em
+        andamento (global e por usuário). As mais antigas na espera vão
+        primeiro, e um usuário no limite não bloqueia os demais.
+        """
+        settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+        global_limit = max(settings.auto_paginate_max_concurrent, 1)
+        per_user_limit = max(settings.auto_paginate_max_per_user, 1)
+
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT user_id, COUNT(*) FROM pesquisa_aiia_search
+             WHERE auto_paginate AND status IN ('new', 'processing')
+             GROUP BY user_id
+        """)
+        in_flight = dict(self.env.cr.fetchall())
+        slots = global_limit - sum(in_flight.values())
+        if slots <= 0:
+            return 0
+
+        self.env.cr.execute("""
+            SELECT id, user_id FROM pesquisa_aiia_search
+             WHERE status = 'pending_next' AND auto_paginate
+             ORDER BY write_date, id
+             LIMIT %s
+             FOR UPDATE SKIP LOCKED
+        """, (slots * self._AUTO_PAGINATE_SCAN_FACTOR,))
+        selected = []
+        for search_id, user_id in self.env.cr.fetchall():
+            if len(selected) >= slots:
+                break
+            if in_flight.get(user_id, 0) >= per_user_limit:
+                continue
+            in_flight[user_id] = in_flight.get(user_id, 0) + 1
+            selected.append(search_id)
+
+        requested = 0
+        for search in self.browse(selected):
+            if search._auto_paginate_limit_reached():
+                _logger.info(f"Paginação automática: limite atingido para Search ID {search.id} "
+                             f"({search.page_count} página(s), {search.lead_total} lead(s)).")
+                search.write({'auto_paginate': False})
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    search.search_next_page()
+                requested += 1
+            except (UserError, ValidationError) as e:
+                _logger.warning(f"Paginação automática desativada para Search ID {search.id}: {e}")
+                search.write({'auto_paginate': False})
+        if requested:
+            _logger.info(f"Paginação automática: {requested} próxima(s) página(s) solicitada(s).")
+        return requested
 
     def action_view_results(self):
         self.ensure_one()
         action = self.env['ir.actions.act_window']._for_xml_id('pesquisa_aiia.action_pesquisa_aiia_leads')
         action['name'] = _('Leads da Pesquisa: %s') % self.name
         action['display_name'] = action['name']
-        action['domain'] = [('search_id', '=', self.id)]
+        # Inclui leads de outras pesquisas vinculados a esta pela deduplicação
+        action['domain'] = ['|', ('search_id', '=', self.id), ('linked_search_ids', 'in', self.id)]
         # Adiciona contexto para pré-filtrar a busca na view de leads
         action['context'] = {'default_search_id': self.id,
                              'search_default_search_id': self.id,
                              'create': False} # Opcional: desabilitar criação direta de leads a partir daqui
         return action
 
+    def action_open_export_wizard(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Exportar Leads'),
+            'res_model': 'pesquisa_aiia.export.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_search_id': self.id},
+        }
+
     def write(self, vals):
         # Mapeia o status *antes* da escrita, apenas se o status estiver sendo alterado
         old_status_map = {}
         if 'status' in vals:
             old_status_map = {rec.id: rec.status for rec in self}
+            if vals['status'] == 'completed' and 'completed_at' not in vals:
+                vals = dict(vals, completed_at=fields.Datetime.now())
 
         res = super(PesquisaAiiaSearch, self).write(vals)
 
-        # Logar mudança de status APÓS a escrita ser bem sucedida
-        if 'status' in vals:
-            # *** CORREÇÃO AQUI: Obter o dicionário de seleção ***
-            selection_dict = dict(self._fields['status']._description_selection(self.env))
+        if 'status' in vals or 'next_page_token' in vals:
+            self._notify_bus([{
+                'search_id': record.id,
+                'status': record.status,
+                'lead_total': record.lead_total,
+                'has_next_page_token': bool(record.next_page_token),
+                'new_leads': 0,
+                'status_changed': 'status' in vals,
+            } for record in self])
 
+        if vals.get('auto_paginate') and any(rec.status == 'pending_next' for rec in self):
+            # Paginação automática ligada numa pesquisa que já aguarda a próxima página
+            self._trigger_auto_paginate()
+
+        # Registra as transições APÓS a escrita ser bem sucedida, com um único create
+        if 'status' in vals:
             new_status = vals['status']
-            # Itera apenas nos registros que *realmente* tiveram o status avaliado na entrada do método
-            for record in self.filtered(lambda r: r.id in old_status_map):
-                old_status = old_status_map.get(record.id)
-
-                # Loga apenas se o status realmente mudou
-                if old_status != new_status:
-                    # *** CORREÇÃO AQUI: Usar o dicionário para buscar as labels ***
-                    old_label = selection_dict.get(old_status, old_status) # Usa a chave como fallback
-                    new_label = selection_dict.get(new_status, new_status) # Usa a chave como fallback
-
-                    message = _("Status alterado de '%s' para '%s'") % (old_label, new_label)
-
-                    # Pega a mensagem de erro ou token dos valores sendo escritos OU do próprio registro
-                    error_msg_val = vals.get('error_message', record.error_message)
-                    next_page_token_val = vals.get('next_page_token', record.next_page_token)
-
-                    # Adiciona detalhes à mensagem de log
-                    if new_status == 'error' and error_msg_val:
-                         message += _(" - Erro: %s") % error_msg_val
-                    elif new_status == 'pending_next' and next_page_token_val:
-                         message += _(". Próxima página disponível.")
-                    elif new_status == 'completed':
-                         message += _(". Pesquisa concluída.")
-
-                    # Posta a mensagem no chatter
-                    record.message_post(body=message, message_type='comment', subtype_xmlid='mail.mt_comment')
-        return res
\ No newline at end of file
+            changed = self.filtered(lambda r: r.id in old_status_map and old_status_map[r.id] != new_status)
+            if changed:
+                self.env['pesquisa_aiia.search.history'].sudo().create([{
+                    'search_id': record.id,
+                    'old_status': old_status_map[record.id],
+                    'new_status': new_status,
+                    'error_message': record.error_message if new_status == 'error' else False,
+                    'has_next_page_token': bool(record.next_page_token),
+                } for record in changed])
+                settings = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings()
+                if new_status in ('pending_next', 'completed', 'error') and changed.filtered('auto_paginate'):
+                    # Página pronta ou vaga liberada: agenda o cron sem esperar o intervalo
+                    self._trigger_auto_paginate()
+                if (settings.max_in_flight or settings.max_in_flight_per_user or changed.filtered('campaign_id')) \
+                        and any(old_status_map[record.id] == 'processing' for record in changed):
+                    # Uma pesquisa saiu de 'processing': pode liberar mensagens barradas na fila
+                    self.env['pesquisa_aiia.outbox']._trigger_dispatch()
+                if new_status in ('completed', 'error') and settings.chatter_status_summary:
+                    changed._post_status_summary()
+        return res
+
+    def _post_status_summary(self):
+        """Resumo opcional no chatter quando a pesquisa termina (concluída ou com erro)."""
+        selection_dict = dict(self._fields['status']._description_selection(self.env))
+        for record in self:
+            message = _("Pesquisa finalizada com status '%s': %s lead(s), %s transição(ões) de status.") % (
+                selection_dict.get(record.status, record.status), record.lead_total, len(record.status_history_ids))
+            if record.status == 'error' and record.error_message:
+                message += _(" - Erro: %s") % record.error_message
+            record.message_post(body=message, message_type='comment', subtype_xmlid='mail.mt_note')
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+class PesquisaAiiaSearchHistory(models.Model):
+    """
+    Histórico compacto (somente inserção) das transições de status de uma
+    pesquisa. Substitui as mensagens de chatter por transição: é gravado em
+    lote, sem notificações nem seguidores.
+    """
+    _name = 'pesquisa_aiia.search.history'
+    _description = 'Histórico de Status da Pesquisa AIIA'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    search_id = fields.Many2one('pesquisa_aiia.search', string='Pesquisa', required=True, ondelete='cascade', index=True, readonly=True)
+    date = fields.Datetime(string='Data', required=True, default=fields.Datetime.now, readonly=True)
+    old_status = fields.Selection(selection='_get_status_selection', string='Status Anterior', readonly=True)
+    new_status = fields.Selection(selection='_get_status_selection', string='Novo Status', required=True, readonly=True)
+    error_message = fields.Text(string='Erro', readonly=True)
+    has_next_page_token = fields.Boolean(string='Próxima Página Disponível?', readonly=True)
+
+    @api.model
+    def _get_status_selection(self):
+        return self.env['pesquisa_aiia.search']._fields['status'].selection
+
@@ -3,6 +3,8 @@ from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 import logging
 
+from ..utils import templates
+
 _logger = logging.getLogger(__name__)
 
 class PesquisaAiiaSearchWizard(models.TransientModel):
@@ -24,22 +26,34 @@ class PesquisaAiiaSearchWizard(models.TransientModel):
     show_custom_message = fields.Boolean(compute='_compute_show_custom_message', store=False)
     # --- FIM CAMPOS MENSAGEM ---
 
+    # --- PAGINAÇÃO AUTOMÁTICA ---
+    auto_paginate = fields.Boolean(string='Paginação Automática',
+                                   help="Busca as próximas páginas automaticamente até o fim da pesquisa ou até um dos limites.")
+    auto_max_pages = fields.Integer(string='Máximo de Páginas', default=0, help="0 = sem limite.")
+    auto_max_leads = fields.Integer(string='Máximo de Leads', default=0, help="0 = sem limite.")
+    force_refresh = fields.Boolean(string='Forçar Nova Consulta',
+                                   help="Ignora o cache de resultados e consulta o N8N mesmo que o termo tenha sido pesquisado recentemente.")
+
 
     def _get_message_to_send(self):
-        """ Pega a mensagem correta (padrão das config ou customizada do wizard) """
+        """
+        Pega a mensagem correta (padrão das config ou customizada do wizard).
+        O marcador [Pesquisa] já é preenchido aqui; os marcadores do lead
+        ([Nome da Empresa], ...) ficam para a renderização de cada lead.
+        """
         self.ensure_one()
         if self.use_default_message:
             # Busca a mensagem padrão configurada nos Ajustes
-            default_msg = self.env['ir.config_parameter'].sudo().get_param('pesquisa_aiia.default_whatsapp_msg', '')
+            message = self.env['ir.config_parameter'].sudo()._get_pesquisa_aiia_settings().default_whatsapp_msg
             _logger.info("Wizard: Usando mensagem padrão das configurações.")
-            return default_msg
         else:
             # Verifica se a mensagem customizada foi preenchida
             if not self.custom_message or not self.custom_message.strip():
                  # Levanta um erro se desmarcou "Usar Padrão" mas não digitou nada
                  raise UserError(_("Você escolheu usar uma mensagem personalizada, mas não a digitou."))
             _logger.info("Wizard: Usando mensagem personalizada fornecida.")
-            return self.custom_message.strip()
+            message = self.custom_message.strip()
+        return templates.render(message or '', {'search_query': (self.search_query or '').strip()}, keep_missing=True)
 
     def action_start_search(self):
         """
@@ -58,9 +72,13 @@ class PesquisaAiiaSearchWizard(models.TransientModel):
             # Chama o método no modelo principal 'pesquisa_aiia.search'
             search_id = self.env['pesquisa_aiia.search'].start_new_search(
                 query=self.search_query.strip(),
-                message=message_to_send
+                message=message_to_send,
+                auto_paginate=self.auto_paginate,
+                auto_max_pages=self.auto_max_pages,
+                auto_max_leads=self.auto_max_leads,
+                force_refresh=self.force_refresh,
             )
-            _logger.info(f"Wizard: Pesquisa ID: {search_id} criada e requisição inicial enviada.")
+            _logger.info(f"Wizard: Pesquisa ID: {search_id} criada e requisição inicial enfileirada.")
 
             # *** ALTERAÇÃO: Redireciona para a view da pesquisa criada ***
             return {
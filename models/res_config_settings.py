@@ -16,6 +16,41 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='pesquisa_aiia.webhook_secret',
         help="Um segredo opcional para validar a origem do webhook."
     )
+    aiia_webhook_batch_size = fields.Integer(
+        string='Tamanho do Lote (Webhook)',
+        config_parameter='pesquisa_aiia.webhook_batch_size',
+        default=500,
+        help="Quantidade de leads criados por lote (um INSERT e um savepoint por lote) ao receber o webhook."
+    )
+    aiia_webhook_max_body_mb = fields.Integer(
+        string='Tamanho Máximo do Corpo (MB)',
+        config_parameter='pesquisa_aiia.webhook_max_body_mb',
+        default=50,
+        help="Limite para o corpo dos webhooks, comprimido e descomprimido (gzip/deflate). "
+             "Requisições maiores são recusadas com HTTP 413. Use 0 para não limitar."
+    )
+    aiia_idempotency_ttl_hours = fields.Integer(
+        string='Retenção das Chaves de Idempotência (h)',
+        config_parameter='pesquisa_aiia.idempotency_ttl_hours',
+        default=24,
+        help="Por quanto tempo uma retentativa do N8N (mesmo header Idempotency-Key ou mesmo corpo) "
+             "recebe a resposta original em vez de ser processada de novo."
+    )
+    aiia_dedup_policy = fields.Selection(
+        [('skip', 'Ignorar duplicados'),
+         ('merge', 'Mesclar no lead existente'),
+         ('link', 'Vincular lead existente à nova pesquisa')],
+        string='Leads Duplicados',
+        config_parameter='pesquisa_aiia.dedup_policy',
+        default='skip',
+        help="O que fazer quando um lead recebido já existe (mesmo telefone E.164, e-mail ou nome/endereço)."
+    )
+    aiia_chatter_status_summary = fields.Boolean(
+        string='Resumo no Chatter ao Finalizar',
+        config_parameter='pesquisa_aiia.chatter_status_summary',
+        help="Posta uma única mensagem de resumo no chatter quando a pesquisa é concluída ou falha. "
+             "As transições de status são sempre gravadas no histórico da pesquisa."
+    )
     aiia_default_whatsapp_msg = fields.Char(
         string='Mensagem Padrão WhatsApp',
         config_parameter='pesquisa_aiia.default_whatsapp_msg',
@@ -43,6 +78,144 @@ Sua Equipe
         config_parameter='pesquisa_aiia.n8n_scrape_trigger_url',
         help="URL do webhook no N8N que recebe a solicitação de pesquisa do Odoo."
     )
+    aiia_outbox_max_workers = fields.Integer(
+        string='Envios Simultâneos (Fila N8N)',
+        config_parameter='pesquisa_aiia.outbox_max_workers',
+        default=4,
+        help="Quantidade máxima de chamadas paralelas ao N8N feitas pelo despachante da fila."
+    )
+    aiia_outbox_max_attempts = fields.Integer(
+        string='Máximo de Tentativas (Fila N8N)',
+        config_parameter='pesquisa_aiia.outbox_max_attempts',
+        default=5,
+        help="Após esse número de falhas a mensagem vai para dead letter e a pesquisa fica com erro."
+    )
+    aiia_outbox_retry_base_seconds = fields.Integer(
+        string='Espera Inicial entre Tentativas (s)',
+        config_parameter='pesquisa_aiia.outbox_retry_base_seconds',
+        default=30,
+        help="Base do backoff exponencial: base, 2x base, 4x base..."
+    )
+    aiia_http_connect_timeout = fields.Float(
+        string='Timeout de Conexão N8N (s)',
+        config_parameter='pesquisa_aiia.http_connect_timeout',
+        default=5.0,
+    )
+    aiia_http_read_timeout = fields.Float(
+        string='Timeout de Leitura N8N (s)',
+        config_parameter='pesquisa_aiia.http_read_timeout',
+        default=30.0,
+    )
+    aiia_http_max_retries = fields.Integer(
+        string='Retentativas Imediatas (HTTP)',
+        config_parameter='pesquisa_aiia.http_max_retries',
+        default=2,
+        help="Retentativas com jitter feitas pelo cliente HTTP quando a falha garante que o N8N não processou o pedido."
+    )
+    aiia_http_breaker_threshold = fields.Integer(
+        string='Falhas para Abrir o Circuito',
+        config_parameter='pesquisa_aiia.http_breaker_threshold',
+        default=5,
+        help="Após esse número de falhas seguidas as chamadas ao N8N falham imediatamente, sem aguardar timeout."
+    )
+    aiia_http_breaker_cooldown = fields.Float(
+        string='Circuito Aberto por (s)',
+        config_parameter='pesquisa_aiia.http_breaker_cooldown',
+        default=60.0,
+    )
+    aiia_rate_limit_rps = fields.Float(
+        string='Limite Global (requisições/s)',
+        config_parameter='pesquisa_aiia.rate_limit_rps',
+        default=0.0,
+        help="Chamadas por segundo ao N8N somando todos os usuários e workers. 0 = sem limite."
+    )
+    aiia_rate_limit_burst = fields.Integer(
+        string='Rajada Global',
+        config_parameter='pesquisa_aiia.rate_limit_burst',
+        default=5,
+        help="Chamadas que podem sair de uma vez antes de o limite por segundo valer."
+    )
+    aiia_rate_limit_user_rps = fields.Float(
+        string='Limite por Usuário (requisições/s)',
+        config_parameter='pesquisa_aiia.rate_limit_user_rps',
+        default=0.0,
+        help="Chamadas por segundo ao N8N por usuário que iniciou a pesquisa. 0 = sem limite."
+    )
+    aiia_rate_limit_user_burst = fields.Integer(
+        string='Rajada por Usuário',
+        config_parameter='pesquisa_aiia.rate_limit_user_burst',
+        default=2,
+    )
+    aiia_max_in_flight = fields.Integer(
+        string='Pesquisas em Andamento (Global)',
+        config_parameter='pesquisa_aiia.max_in_flight',
+        default=0,
+        help="Máximo de pesquisas em 'Processando' ao mesmo tempo. As demais aguardam na fila como 'Nova'. 0 = sem limite."
+    )
+    aiia_max_in_flight_per_user = fields.Integer(
+        string='Pesquisas em Andamento (por Usuário)',
+        config_parameter='pesquisa_aiia.max_in_flight_per_user',
+        default=0,
+        help="Máximo de pesquisas em 'Processando' por usuário. 0 = sem limite."
+    )
+    aiia_processing_timeout_minutes = fields.Integer(
+        string='Tempo Limite em Processamento (min)',
+        config_parameter='pesquisa_aiia.processing_timeout_minutes',
+        default=60,
+        help="Pesquisas em 'Processando' sem retorno nem leads do N8N por mais tempo que isso passam para 'Erro', "
+             "liberando as vagas dos limites de pesquisas em andamento. 0 = nunca expira."
+    )
+    aiia_auto_paginate_max_concurrent = fields.Integer(
+        string='Paginação Automática: Pesquisas Simultâneas',
+        config_parameter='pesquisa_aiia.auto_paginate_max_concurrent',
+        default=4,
+        help="Máximo de pesquisas com paginação automática aguardando o N8N ao mesmo tempo."
+    )
+    aiia_auto_paginate_max_per_user = fields.Integer(
+        string='Paginação Automática: Pesquisas por Usuário',
+        config_parameter='pesquisa_aiia.auto_paginate_max_per_user',
+        default=2,
+        help="Máximo de pesquisas com paginação automática em andamento por usuário, "
+             "para que pesquisas longas de um usuário não atrasem as dos demais."
+    )
+    aiia_result_cache_ttl_hours = fields.Integer(
+        string='Cache de Resultados (horas)',
+        config_parameter='pesquisa_aiia.result_cache_ttl_hours',
+        default=0,
+        help="Uma nova pesquisa com o mesmo termo (ignorando maiúsculas, acentos e pontuação) de uma pesquisa "
+             "concluída há menos que isso reaproveita os leads dela, sem chamar o N8N. 0 = desativado."
+    )
+    aiia_mass_mail_batch_size = fields.Integer(
+        string='E-mails por Lote (Envio em Massa)',
+        config_parameter='pesquisa_aiia.mass_mail_batch_size',
+        default=200,
+        help="Quantidade de e-mails agendados para o mesmo horário no envio em massa."
+    )
+    aiia_mass_mail_batch_interval = fields.Integer(
+        string='Intervalo entre Lotes (s)',
+        config_parameter='pesquisa_aiia.mass_mail_batch_interval',
+        default=60,
+        help="Cada lote do envio em massa é agendado este número de segundos após o anterior. 0 = todos de uma vez."
+    )
+    aiia_retention_lead_days = fields.Integer(
+        string='Arquivar Leads Após (dias)',
+        config_parameter='pesquisa_aiia.retention_lead_days',
+        default=0,
+        help="Leads sem contato criado mais antigos que isso vão para o arquivo comprimido "
+             "(podem ser restaurados pela pesquisa). 0 = nunca."
+    )
+    aiia_retention_search_days = fields.Integer(
+        string='Arquivar Pesquisas Após (dias)',
+        config_parameter='pesquisa_aiia.retention_search_days',
+        default=0,
+        help="Pesquisas concluídas ou com erro, sem leads ativos, mais antigas que isso são arquivadas. 0 = nunca."
+    )
+    aiia_retention_batch_size = fields.Integer(
+        string='Tamanho do Lote (Retenção)',
+        config_parameter='pesquisa_aiia.retention_batch_size',
+        default=5000,
+        help="Leads movidos por transação; lotes menores mantêm as travas mais curtas."
+    )
     aiia_odoo_update_webhook_url = fields.Char(
         string='URL Odoo (Update Pesquisa)',
         readonly=True, # Gerado automaticamente
@@ -54,6 +227,17 @@ Sua Equipe
         help="Segredo opcional para validar atualizações de status/token vindas do N8N."
     )
 
+    aiia_metrics_token = fields.Char(
+        string='Token das Métricas',
+        config_parameter='pesquisa_aiia.metrics_token',
+        help="Token exigido em /pesquisa_aiia/metrics (header 'Authorization: Bearer <token>'). "
+             "Sem token o endpoint fica desativado."
+    )
+    aiia_metrics_url = fields.Char(
+        string='URL das Métricas',
+        readonly=True,
+    )
+
     @api.model
     def get_values(self):
         res = super(ResConfigSettings, self).get_values()
@@ -65,4 +249,7 @@ Sua Equipe
         res.update(
              aiia_odoo_update_webhook_url=f"{base_url}/pesquisa_aiia/update_search"
         )
+        res.update(
+             aiia_metrics_url=f"{base_url}/pesquisa_aiia/metrics"
+        )
         return res
\ No newline at end of file
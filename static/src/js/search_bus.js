@@ -0,0 +1,86 @@
+/** @odoo-module **/
+
+import { patch } from "@web/core/utils/patch";
+import { useService } from "@web/core/utils/hooks";
+import { FormController } from "@web/views/form/form_controller";
+import { ListController } from "@web/views/list/list_controller";
+import { onWillUnmount } from "@odoo/owl";
+
+// Notificação publicada pelo servidor (no canal do dono) a cada mudança de status/leads de uma pesquisa
+const SEARCH_UPDATE = "pesquisa_aiia.search_update";
+// Intervalo mínimo entre recarregamentos da mesma tela
+const RELOAD_INTERVAL = 1000;
+
+/**
+ * Assina as atualizações das pesquisas enquanto o controlador estiver montado.
+ * O servidor envia uma notificação por pesquisa por transação; aqui os
+ * recarregamentos são limitados a um por RELOAD_INTERVAL, e o último pedido
+ * dentro do intervalo é executado ao fim dele (nunca descartado).
+ */
+function useSearchUpdates(accept, reload) {
+    const busService = useService("bus_service");
+    let timer = null;
+    let lastReload = 0;
+    const run = () => {
+        timer = null;
+        lastReload = Date.now();
+        reload();
+    };
+    const callback = (payload) => {
+        if (!accept(payload) || timer) {
+            return;
+        }
+        const wait = RELOAD_INTERVAL - (Date.now() - lastReload);
+        if (wait <= 0) {
+            run();
+        } else {
+            timer = setTimeout(run, wait);
+        }
+    };
+    busService.subscribe(SEARCH_UPDATE, callback);
+    onWillUnmount(() => {
+        clearTimeout(timer);
+        busService.unsubscribe(SEARCH_UPDATE, callback);
+    });
+}
+
+patch(FormController.prototype, {
+    setup() {
+        super.setup(...arguments);
+        if (this.props.resModel !== "pesquisa_aiia.search") {
+            return;
+        }
+        useSearchUpdates(
+            (payload) => this.model.root.resId === payload.search_id,
+            () => {
+                const record = this.model.root;
+                // Não descarta edições em andamento do usuário
+                if (!record.isDirty) {
+                    record.load();
+                }
+            }
+        );
+    },
+});
+
+patch(ListController.prototype, {
+    setup() {
+        super.setup(...arguments);
+        if (this.props.resModel !== "pesquisa_aiia.lead") {
+            return;
+        }
+        // Lista aberta a partir de uma pesquisa: só reage às atualizações dela
+        const searchId = this.props.context.default_search_id;
+        useSearchUpdates(
+            // Status novo também recarrega: a última leva de leads pode ter vindo junto
+            (payload) =>
+                (!searchId || payload.search_id === searchId) &&
+                Boolean(payload.new_leads || payload.status_changed),
+            () => {
+                if (!this.model.root.editedRecord) {
+                    this.model.load();
+                }
+            }
+        );
+    },
+});
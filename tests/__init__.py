@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+from . import test_benchmark
+from . import test_normalize
+from . import test_json_stream
+from . import test_n8n_client
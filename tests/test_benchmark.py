@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks dos caminhos quentes do módulo (fora da suíte padrão).
+
+Executar, por exemplo:
+
+    PESQUISA_AIIA_BENCH_OUTPUT=/tmp/bench.json \\
+    odoo-bin -d bench -i pesquisa_aiia --stop-after-init \\
+        --test-tags /pesquisa_aiia:pesquisa_aiia_bench
+
+Variáveis de ambiente:
+- PESQUISA_AIIA_BENCH_OUTPUT: caminho do JSON com os resultados (opcional).
+- PESQUISA_AIIA_BENCH_SIZES: tamanhos dos payloads do webhook (padrão 100,1000,10000,50000).
+- PESQUISA_AIIA_BENCH_SEARCHES: pesquisas iniciadas/despachadas/atualizadas (padrão 200).
+- PESQUISA_AIIA_BENCH_N8N_DELAY_MS: latência simulada do N8N de mentira (padrão 0).
+
+Os resultados trazem a versão do módulo e do Odoo, para comparar execuções
+entre versões.
+"""
+import json
+import logging
+import os
+import platform
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from odoo import fields, release
+from odoo.tests import HttpCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+WEBHOOK_SECRET = 'bench-webhook-secret'
+UPDATE_SECRET = 'bench-update-secret'
+
+
+def _env_list(name, default):
+    value = os.environ.get(name)
+    return [int(item) for item in value.split(',') if item.strip()] if value else default
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _latency_summary(latencies, queries):
+    return {
+        'count': len(latencies),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3) if latencies else 0.0,
+        'queries_per_call': round(queries / len(latencies), 2) if latencies else 0.0,
+    }
+
+
+def generate_leads(search_id, count, offset=0):
+    """Leads sintéticos no formato enviado pelo N8N, todos distintos entre si."""
+    for index in range(offset, offset + count):
+        yield {
+            'search_id': search_id,
+            'nome_empresa': 'Empresa Benchmark %d' % index,
+            'contato_telefonico': '+55 11 9%08d' % index,
+            'email': 'contato%d@benchmark.example.com' % index,
+            'endereco': 'Rua dos Testes, %d - São Paulo - SP' % index,
+            'resumo_atividade': 'Comércio varejista de produtos diversos, unidade %d.' % index,
+        }
+
+
+class N8NStub:
+    """Servidor HTTP local que faz o papel do webhook de trigger do N8N."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                with stub._lock:
+                    stub.requests += 1
+                body = b'{"status": "ok"}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%s/webhook/pesquisa' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@tagged('-standard', '-at_install', 'post_install', 'pesquisa_aiia_bench')
+class TestPesquisaAiiaBenchmark(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {
+            'module_version': cls.env['ir.module.module']._get('pesquisa_aiia').latest_version,
+            'odoo_version': release.version,
+            'python_version': platform.python_version(),
+            'started_at': fields.Datetime.to_string(fields.Datetime.now()),
+        }
+        cls.stub = N8NStub(delay=int(os.environ.get('PESQUISA_AIIA_BENCH_N8N_DELAY_MS', '0')) / 1000.0).start()
+        cls.addClassCleanup(cls.stub.stop)
+        cls.addClassCleanup(cls._write_results)
+        ICP = cls.env['ir.config_parameter'].sudo()
+        ICP.set_param('pesquisa_aiia.webhook_secret', WEBHOOK_SECRET)
+        ICP.set_param('pesquisa_aiia.aiia_odoo_update_secret', UPDATE_SECRET)
+        ICP.set_param('pesquisa_aiia.n8n_scrape_trigger_url', cls.stub.url)
+
+    @classmethod
+    def _write_results(cls):
+        _logger.info("Benchmark Pesquisa AIIA: %s", json.dumps(cls.results, ensure_ascii=False))
+        output = os.environ.get('PESQUISA_AIIA_BENCH_OUTPUT')
+        if output:
+            with open(output, 'w', encoding='utf-8') as handle:
+                json.dump(cls.results, handle, ensure_ascii=False, indent=2)
+
+    def _post_json(self, route, payload, secret_header, secret, timeout=600):
+        return self.url_open(route, data=json.dumps(payload).encode('utf-8'), timeout=timeout, headers={
+            'Content-Type': 'application/json',
+            secret_header: secret,
+        })
+
+    def _create_searches(self, count, status='new'):
+        return self.env['pesquisa_aiia.search'].create([{
+            'search_query': 'benchmark %d' % index,
+            'status': status,
+        } for index in range(count)])
+
+    def test_01_webhook_ingest(self):
+        """Throughput do webhook: leads/s, consultas SQL por lead e pico de memória."""
+        ingest = []
+        offset = 0
+        for size in _env_list('PESQUISA_AIIA_BENCH_SIZES', [100, 1000, 10000, 50000]):
+            run = {'size': size}
+            # 1ª passada: tempo e consultas; 2ª com tracemalloc (que distorce o tempo)
+            for measure_memory in (False, True):
+                search = self._create_searches(1)
+                payload = list(generate_leads(search.id, size, offset))
+                offset += size
+                if measure_memory:
+                    tracemalloc.start()
+                queries_before = self.cr.sql_log_count
+                started_at = time.perf_counter()
+                response = self._post_json('/pesquisa_aiia/webhook', payload, 'X-N8N-Signature', WEBHOOK_SECRET)
+                elapsed = time.perf_counter() - started_at
+                queries = self.cr.sql_log_count - queries_before
+                self.assertEqual(response.status_code, 200, response.text)
+                if measure_memory:
+                    _current, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    run['peak_memory_mb'] = round(peak / (1024 * 1024), 2)
+                    continue
+                summary = response.json()
+                self.assertEqual(summary['leads_created'], size)
+                run.update({
+                    'seconds': round(elapsed, 3),
+                    'leads_per_second': round(size / elapsed, 1) if elapsed else 0.0,
+                    'queries': queries,
+                    'queries_per_lead': round(queries / size, 3),
+                })
+            ingest.append(run)
+            _logger.info("Benchmark Pesquisa AIIA (webhook): %s", run)
+        self.results['webhook_ingest'] = ingest
+
+    def test_02_start_and_dispatch(self):
+        """Latência de start_new_search e vazão do despachante contra o N8N local."""
+        count = int(os.environ.get('PESQUISA_AIIA_BENCH_SEARCHES', '200'))
+        Search = self.env['pesquisa_aiia.search']
+        latencies = []
+        queries_before = self.cr.sql_log_count
+        for index in range(count):
+            started_at = time.perf_counter()
+            Search.start_new_search('benchmark start %d' % index)
+            latencies.append(time.perf_counter() - started_at)
+        self.results['start_new_search'] = _latency_summary(latencies, self.cr.sql_log_count - queries_before)
+
+        Outbox = self.env['pesquisa_aiia.outbox']
+        config = Outbox._get_dispatch_config()
+        requests_before = self.stub.requests
+        queries_before = self.cr.sql_log_count
+        started_at = time.perf_counter()
+        # O despachante faz commit por lote; no teste vira flush para manter o rollback
+        with patch.object(self.env.cr, 'commit', self.env.cr.flush):
+            Outbox._dispatch_until_budget(config)
+        elapsed = time.perf_counter() - started_at
+        sent = self.stub.requests - requests_before
+        self.assertEqual(sent, count)
+        self.results['dispatch'] = {
+            'messages': sent,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(sent / elapsed, 1) if elapsed else 0.0,
+            'queries_per_message': round((self.cr.sql_log_count - queries_before) / sent, 2) if sent else 0.0,
+            'max_workers': config['max_workers'],
+            'n8n_delay_ms': round(self.stub.delay * 1000, 1),
+        }
+
+    def test_03_update_search(self):
+        """Latência do update_search (N8N -> Odoo) com pesquisas em processamento."""
+        count = int(os.environ.get('PESQUISA_AIIA_BENCH_SEARCHES', '200'))
+        searches = self._create_searches(count, status='processing')
+        latencies = []
+        queries_before = self.cr.sql_log_count
+        for search in searches:
+            started_at = time.perf_counter()
+            response = self._post_json('/pesquisa_aiia/update_search', {
+                'search_id': search.id,
+                'status': 'pending_next',
+                'next_page_token': 'bench-token-%d' % search.id,
+            }, 'X-N8N-Odoo-Update-Secret', UPDATE_SECRET, timeout=60)
+            latencies.append(time.perf_counter() - started_at)
+            self.assertEqual(response.status_code, 200, response.text)
+        self.results['update_search'] = _latency_summary(latencies, self.cr.sql_log_count - queries_before)
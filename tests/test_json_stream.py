@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo.tests import BaseCase, tagged
+
+from ..utils.json_stream import StreamFormatError, iter_json_array, iter_ndjson
+
+
+def _chunks(text, size):
+    data = text.encode('utf-8')
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@tagged('post_install', '-at_install')
+class TestJsonStream(BaseCase):
+
+    def _assert_all_chunk_sizes(self, text):
+        """O resultado não pode depender de onde os blocos são cortados."""
+        expected = json.loads(text)
+        for size in range(1, len(text.encode('utf-8')) + 1):
+            items = [item for _index, item in iter_json_array(_chunks(text, size))]
+            self.assertEqual(items, expected, "blocos de %d byte(s)" % size)
+
+    def test_numbers_across_chunks(self):
+        self._assert_all_chunk_sizes('[12345, 6.5e3, -1, -0.5, 0, 1E-7, 2.25e+10]')
+
+    def test_numbers_only_array(self):
+        self._assert_all_chunk_sizes('[-12.75]')
+        self._assert_all_chunk_sizes('[1,2,3]')
+
+    def test_strings_with_escapes_across_chunks(self):
+        self._assert_all_chunk_sizes(r'["a\"b", "c\\d", "été", "São Paulo ção", "x\ny", "]", ","]')
+
+    def test_nested_objects_across_chunks(self):
+        self._assert_all_chunk_sizes(json.dumps([
+            {'nome_empresa': 'Empresa "A"', 'tags': [1, 2.5, {'x': None}], 'ativo': True},
+            {'nome_empresa': 'Café & Cia', 'endereco': {'rua': 'R. 1', 'numero': -3}},
+            [], {}, None, False,
+        ], ensure_ascii=False))
+
+    def test_empty_array_and_whitespace(self):
+        self._assert_all_chunk_sizes(' \n[ ]\n ')
+        self._assert_all_chunk_sizes('[ 1 ,\n 2 ]')
+
+    def test_malformed_bodies(self):
+        for text in ('{"a": 1}', '[1 2]', '[1,', '[6.]', '[1] x', '[tru]'):
+            for size in (1, 3, len(text)):
+                with self.assertRaises(StreamFormatError, msg="%r em blocos de %d" % (text, size)):
+                    list(iter_json_array(_chunks(text, size)))
+
+    def test_item_size_limit(self):
+        text = '[{"a": "%s"}, 2]' % ('x' * 100)
+        self.assertEqual(len(list(iter_json_array(_chunks(text, 16), max_item_size=200))), 2)
+        # Item que nunca fecha: erro ao passar do limite, sem ler o resto do corpo
+        text = '["%s' % ('x' * 1000)
+        consumed = []
+        chunks = _chunks(text, 16)
+
+        def tracked():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        with self.assertRaises(StreamFormatError):
+            list(iter_json_array(tracked(), max_item_size=100))
+        self.assertLess(len(consumed), len(chunks))
+        with self.assertRaises(StreamFormatError):
+            list(iter_ndjson(_chunks('{"a": "%s"}\n' % ('x' * 1000), 16), max_item_size=100))
+
+    def test_ndjson_invalid_line_does_not_stop(self):
+        text = '{"a": 1}\nnão é json\n\n{"b": 2}'
+        items = list(iter_ndjson(_chunks(text, 4)))
+        self.assertEqual([index for index, _item in items], [0, 1, 2])
+        self.assertEqual(items[0][1], {'a': 1})
+        self.assertIsInstance(items[1][1], StreamFormatError)
+        self.assertEqual(items[2][1], {'b': 2})
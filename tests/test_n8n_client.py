@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import http.server
+import threading
+from unittest import mock
+
+from odoo.tests import BaseCase, tagged
+
+from ..utils import n8n_client
+
+CONFIG = n8n_client.ClientConfig(
+    connect_timeout=2.0,
+    read_timeout=0.2,
+    max_retries=2,
+    backoff_base=0.01,
+    breaker_threshold=2,
+    breaker_cooldown=60.0,
+    pool_maxsize=2,
+)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Responde com a próxima resposta roteirizada: (status, headers, atraso em segundos)."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            status, headers, delay = server.script.pop(0) if server.script else (200, {}, 0)
+        if delay:
+            # Não usa time.sleep, que o teste substitui para pular o backoff
+            threading.Event().wait(delay)
+        body = b'{}'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@tagged('post_install', '-at_install')
+class TestN8NClient(BaseCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:%d/webhook' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        n8n_client.reset()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        n8n_client.reset()
+        self.server.hits = 0
+        self.server.script = []
+        # Sem esperas reais entre as tentativas; guarda os atrasos pedidos
+        self.delays = []
+        patcher = mock.patch.object(n8n_client.time, 'sleep', self.delays.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, *script, idempotent=False):
+        self.server.script = [entry if len(entry) == 3 else entry + (0,) for entry in script]
+        return n8n_client.post(self.url, '{}', config=CONFIG, idempotent=idempotent)
+
+    def _breaker(self):
+        return n8n_client.get_breaker(self.url, CONFIG)
+
+    def test_success(self):
+        response = self._post((200, {}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 1)
+        self.assertEqual(self._breaker().state, n8n_client.CircuitBreaker.CLOSED)
+
+    def test_safe_status_always_retried(self):
+        for status in sorted(n8n_client.SAFE_RETRY_STATUS):
+            n8n_client.reset()
+            self.server.hits = 0
+            response = self._post((status, {}), (status, {}), (200, {}))
+            self.assertEqual(response.status_code, 200, "HTTP %s" % status)
+            self.assertEqual(self.server.hits, 3, "HTTP %s" % status)
+
+    def test_idempotent_status_retried_only_when_idempotent(self):
+        for status in sorted(n8n_client.IDEMPOTENT_RETRY_STATUS):
+            n8n_client.reset()
+            self.server.hits = 0
+            with self.assertRaises(n8n_client.N8NClientError) as caught:
+                self._post((status, {}), (200, {}))
+            self.assertEqual(caught.exception.status_code, status)
+            self.assertTrue(caught.exception.retryable)
+            self.assertEqual(self.server.hits, 1, "HTTP %s sem idempotência" % status)
+
+            n8n_client.reset()
+            self.server.hits = 0
+            response = self._post((status, {}), (200, {}), idempotent=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.server.hits, 2, "HTTP %s idempotente" % status)
+
+    def test_other_server_error_not_retried(self):
+        with self.assertRaises(n8n_client.N8NClientError) as caught:
+            self._post((500, {}), (200, {}), idempotent=True)
+        self.assertTrue(caught.exception.retryable)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_client_error_not_retried_and_not_counted(self):
+        for _attempt in range(CONFIG.breaker_threshold + 1):
+            with self.assertRaises(n8n_client.N8NClientError) as caught:
+                self._post((400, {}))
+            self.assertFalse(caught.exception.retryable)
+        self.assertEqual(self.server.hits, CONFIG.breaker_threshold + 1)
+        self.assertEqual(self._breaker().state, n8n_client.CircuitBreaker.CLOSED)
+
+    def test_retries_exhausted(self):
+        with self.assertRaises(n8n_client.N8NClientError):
+            self._post((503, {}), (503, {}), (503, {}), (200, {}))
+        self.assertEqual(self.server.hits, CONFIG.max_retries + 1)
+
+    def test_read_timeout_retried_only_when_idempotent(self):
+        slow = (200, {}, CONFIG.read_timeout * 3)
+        with self.assertRaises(n8n_client.N8NClientError):
+            self._post(slow, (200, {}))
+        self.assertEqual(self.server.hits, 1)
+
+        n8n_client.reset()
+        self.server.hits = 0
+        response = self._post(slow, (200, {}), idempotent=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 2)
+
+    def test_retry_after_is_capped(self):
+        self._post((429, {'Retry-After': '3'}), (429, {'Retry-After': '3600'}), (200, {}))
+        self.assertEqual(self.delays, [3.0, n8n_client.MAX_RETRY_AFTER])
+
+    def test_breaker_opens_half_opens_and_closes(self):
+        breaker = self._breaker()
+        for _attempt in range(CONFIG.breaker_threshold):
+            with self.assertRaises(n8n_client.N8NClientError):
+                self._post((500, {}))
+        self.assertEqual(breaker.state, n8n_client.CircuitBreaker.OPEN)
+
+        # Aberto: falha na hora, sem chamar o servidor
+        hits = self.server.hits
+        with self.assertRaises(n8n_client.CircuitOpenError):
+            self._post((200, {}))
+        self.assertEqual(self.server.hits, hits)
+        self.assertGreater(breaker.retry_in(), 0)
+
+        # Fim do cooldown: a chamada de teste falha e o circuito reabre
+        breaker.opened_at -= CONFIG.breaker_cooldown
+        with self.assertRaises(n8n_client.N8NClientError):
+            self._post((500, {}))
+        self.assertEqual(breaker.state, n8n_client.CircuitBreaker.OPEN)
+
+        # Nova chamada de teste com sucesso fecha o circuito
+        breaker.opened_at -= CONFIG.breaker_cooldown
+        self._post((200, {}))
+        self.assertEqual(breaker.state, n8n_client.CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_unexpected_error_during_half_open_probe(self):
+        breaker = self._breaker()
+        for _attempt in range(CONFIG.breaker_threshold):
+            with self.assertRaises(n8n_client.N8NClientError):
+                self._post((500, {}))
+        breaker.opened_at -= CONFIG.breaker_cooldown
+
+        with mock.patch.object(n8n_client, '_post_attempts', side_effect=RuntimeError("falha inesperada")):
+            with self.assertRaises(RuntimeError):
+                self._post()
+        # Não pode ficar preso em meio-aberto recusando todas as chamadas
+        self.assertEqual(breaker.state, n8n_client.CircuitBreaker.OPEN)
+        breaker.opened_at -= CONFIG.breaker_cooldown
+        self._post((200, {}))
+        self.assertEqual(breaker.state, n8n_client.CircuitBreaker.CLOSED)
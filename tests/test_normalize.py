@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import BaseCase, tagged
+
+from ..utils.normalize import normalize_phone_e164
+
+
+@tagged('post_install', '-at_install')
+class TestNormalizePhone(BaseCase):
+
+    def test_local_number_gets_default_country_code(self):
+        self.assertEqual(normalize_phone_e164('(11) 98765-4321'), '+5511987654321')
+        self.assertEqual(normalize_phone_e164('(11) 3432-1234'), '+551134321234')
+        # Prefixo de tronco nacional (0 + DDD)
+        self.assertEqual(normalize_phone_e164('011 98765-4321'), '+5511987654321')
+
+    def test_number_with_country_code(self):
+        self.assertEqual(normalize_phone_e164('+55 11 98765-4321'), '+5511987654321')
+        self.assertEqual(normalize_phone_e164('55 11 98765-4321'), '+5511987654321')
+        self.assertEqual(normalize_phone_e164('0044 20 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone_e164('+44 20 7946 0958'), '+442079460958')
+
+    def test_number_without_area_code_is_rejected(self):
+        # Sem DDD não dá para completar: não pode virar um DDI estrangeiro
+        self.assertFalse(normalize_phone_e164('3432-1234'))
+        self.assertFalse(normalize_phone_e164('98765-4321'))
+        self.assertFalse(normalize_phone_e164('0 3432-1234'))
+
+    def test_invalid_values(self):
+        self.assertFalse(normalize_phone_e164(False))
+        self.assertFalse(normalize_phone_e164(''))
+        self.assertFalse(normalize_phone_e164('sem telefone'))
+        self.assertFalse(normalize_phone_e164('+1234'))
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from . import normalize
+from . import n8n_client
+from . import settings
+from . import metrics
+from . import http_body
+from . import json_stream
+from . import lead_export
+from . import templates
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura segura do corpo das requisições dos webhooks.
+
+- Autenticação sobre os bytes crus, antes de qualquer parse, com comparação
+  em tempo constante (segredo compartilhado ou HMAC-SHA256 do corpo).
+- Limite de tamanho, checado no Content-Length e durante a leitura.
+- Corpos com Content-Encoding gzip/deflate descomprimidos incrementalmente,
+  com limite no tamanho descomprimido (proteção contra "zip bombs").
+"""
+import hashlib
+import hmac
+import itertools
+import tempfile
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+HMAC_PREFIX = 'sha256='
+# Acima disso o corpo autenticado por HMAC é copiado para disco até a verificação
+SPOOL_MEMORY = 4 * 1024 * 1024
+
+
+class BodyError(Exception):
+    """Corpo rejeitado; `status` é o código HTTP a devolver."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_hmac_signature(header_value):
+    return bool(header_value) and header_value.lower().startswith(HMAC_PREFIX)
+
+
+def verify_shared_secret(secret, header_value):
+    """Modo legado: o header carrega o próprio segredo."""
+    if not header_value:
+        return False
+    return hmac.compare_digest(header_value.encode('utf-8'), secret.encode('utf-8'))
+
+
+def verify_hmac(secret, header_value, raw_body):
+    """Header no formato 'sha256=<hex>' com o HMAC-SHA256 dos bytes crus do corpo."""
+    if not is_hmac_signature(header_value):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), raw_body, hashlib.sha256).hexdigest()
+    received = header_value[len(HMAC_PREFIX):].strip().lower()
+    return hmac.compare_digest(received.encode('ascii', 'replace'), expected.encode('ascii'))
+
+
+def check_content_length(content_length, max_bytes):
+    if max_bytes and content_length and content_length > max_bytes:
+        raise BodyError("Corpo excede o limite de %d bytes." % max_bytes, status=413)
+
+
+def iter_raw(stream, max_bytes, chunk_size=CHUNK_SIZE):
+    """Lê o corpo cru em blocos, abortando assim que passar do limite."""
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if max_bytes and total > max_bytes:
+            raise BodyError("Corpo excede o limite de %d bytes." % max_bytes, status=413)
+        yield chunk
+
+
+def read_raw(stream, max_bytes, chunk_size=CHUNK_SIZE):
+    return b''.join(iter_raw(stream, max_bytes, chunk_size))
+
+
+def _decompressor(content_encoding, head=b''):
+    """
+    Descompressor para o Content-Encoding. Para 'deflate', `head` (os
+    primeiros bytes do corpo) decide entre cabeçalho zlib/gzip e deflate cru
+    (sem cabeçalho), que alguns clientes enviam.
+    """
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        if head[:2] == b'\x1f\x8b' or _is_zlib_header(head):
+            # Detecta automaticamente cabeçalho zlib ou gzip
+            return zlib.decompressobj(32 + zlib.MAX_WBITS)
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+    raise BodyError("Content-Encoding não suportado: %s" % content_encoding, status=415)
+
+
+def _is_zlib_header(head):
+    """CMF/FLG de um stream zlib (RFC 1950): método 8 e checagem módulo 31."""
+    return len(head) >= 2 and head[0] & 0x0F == 8 and head[0] >> 4 <= 7 and (head[0] << 8 | head[1]) % 31 == 0
+
+
+def _peek(chunks, size):
+    """Primeiros `size` bytes do iterável, e um iterável equivalente ao original."""
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    return head, itertools.chain([head] if head else [], chunks)
+
+
+def iter_decoded(chunks, content_encoding, max_bytes, chunk_size=CHUNK_SIZE):
+    """
+    Descomprime incrementalmente um iterável de blocos de bytes, gerando
+    blocos de no máximo `chunk_size` bytes e respeitando `max_bytes` no total.
+    """
+    decompressor = _decompressor(content_encoding)
+    if decompressor is not None:
+        head, chunks = _peek(chunks, 2)
+        decompressor = _decompressor(content_encoding, head)
+    total = 0
+
+    def _account(data):
+        nonlocal total
+        total += len(data)
+        if max_bytes and total > max_bytes:
+            raise BodyError("Corpo descomprimido excede o limite de %d bytes." % max_bytes, status=413)
+        return data
+
+    try:
+        for chunk in chunks:
+            if decompressor is None:
+                yield _account(chunk)
+                continue
+            data = decompressor.decompress(chunk, chunk_size)
+            while data:
+                yield _account(data)
+                data = decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+        if decompressor is not None:
+            tail = decompressor.flush()
+            if tail:
+                yield _account(tail)
+            # flush() não acusa corpo cortado: sem o fim do stream, a ingestão seria parcial
+            if not decompressor.eof:
+                raise BodyError("Corpo comprimido truncado.", status=400)
+    except zlib.error as e:
+        raise BodyError("Corpo comprimido inválido: %s" % e, status=400)
+
+
+def decode(raw_body, content_encoding, max_bytes, chunk_size=CHUNK_SIZE):
+    """Corpo final (descomprimido) a partir dos bytes crus."""
+    if _decompressor(content_encoding) is None:
+        return raw_body
+    blocks = (raw_body[i:i + chunk_size] for i in range(0, len(raw_body), chunk_size))
+    return b''.join(iter_decoded(blocks, content_encoding, max_bytes, chunk_size))
+
+
+def open_verified(stream, headers, secret, signature_header, max_bytes, spool_memory=SPOOL_MEMORY,
+                  with_digest=False):
+    """
+    Autentica o corpo de um webhook e retorna um iterador dos blocos já
+    descomprimidos, sem carregar o payload inteiro na memória.
+
+    Sem segredo configurado a autenticação é ignorada. Com segredo, o header
+    `signature_header` pode trazer o próprio segredo (verificado antes de ler
+    qualquer byte) ou 'sha256=<hex>': nesse caso o corpo cru é copiado para um
+    arquivo temporário (em disco acima de `spool_memory`) enquanto o HMAC é
+    calculado, e só é descomprimido/decodificado depois da verificação.
+
+    Com `with_digest`, o corpo também passa pelo arquivo temporário e o
+    retorno é (iterador, sha256 hexadecimal dos bytes crus).
+
+    :raises BodyError: 401 (assinatura), 413 (tamanho), 415 (codificação);
+        o iterador retornado também pode levantar 413/400 durante a leitura
+    """
+    check_content_length(_int_or_none(headers.get('Content-Length')), max_bytes)
+    content_encoding = headers.get('Content-Encoding')
+    _decompressor(content_encoding)  # rejeita codificações não suportadas antes de ler
+    signature = headers.get(signature_header)
+
+    if secret and not is_hmac_signature(signature):
+        if not verify_shared_secret(secret, signature):
+            raise BodyError("Unauthorized", status=401)
+        secret = None
+
+    if not secret and not with_digest:
+        # Descomprime direto do stream, sem guardar o corpo comprimido
+        return iter_decoded(iter_raw(stream, max_bytes), content_encoding, max_bytes)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_memory)
+    signer = hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256) if secret else None
+    body_hash = hashlib.sha256()
+    try:
+        for chunk in iter_raw(stream, max_bytes):
+            if signer is not None:
+                signer.update(chunk)
+            body_hash.update(chunk)
+            spool.write(chunk)
+        if signer is not None:
+            received = signature[len(HMAC_PREFIX):].strip().lower()
+            if not hmac.compare_digest(received.encode('ascii', 'replace'), signer.hexdigest().encode('ascii')):
+                raise BodyError("Unauthorized", status=401)
+    except BodyError:
+        spool.close()
+        raise
+    spool.seek(0)
+    chunks = _iter_spool(spool, content_encoding, max_bytes)
+    return (chunks, body_hash.hexdigest()) if with_digest else chunks
+
+
+def _iter_spool(spool, content_encoding, max_bytes):
+    with spool:
+        yield from iter_decoded(iter_raw(spool, 0), content_encoding, max_bytes)
+
+
+def read_verified(stream, headers, secret, signature_header, max_bytes):
+    """Como `open_verified`, mas retorna o corpo inteiro (descomprimido) em bytes."""
+    return b''.join(open_verified(stream, headers, secret, signature_header, max_bytes))
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Parsers incrementais para os corpos dos webhooks.
+
+Recebem um iterável de blocos de bytes (já descomprimidos) e geram um item
+por vez, de modo que a memória fica limitada ao tamanho do bloco e do item
+atual, não ao tamanho do payload.
+"""
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_START = '-0123456789'
+_NUMBER_CHARS = frozenset('0123456789+-.eE')
+# Tamanho máximo de um item (ou linha NDJSON) ainda incompleto no buffer:
+# um item que nunca fecha não pode acumular o corpo inteiro em memória
+MAX_ITEM_SIZE = 1024 * 1024
+
+
+class StreamFormatError(ValueError):
+    """O corpo não é um array JSON válido."""
+
+
+def _iter_text(chunks):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _check_item_size(size, max_item_size, index):
+    if max_item_size and size > max_item_size:
+        raise StreamFormatError("Item %d maior que o limite de %d bytes." % (index, max_item_size))
+
+
+def iter_ndjson(chunks, max_item_size=MAX_ITEM_SIZE):
+    """
+    Gera (índice, item) para cada linha não vazia de um corpo NDJSON.
+    Linhas inválidas geram (índice, StreamFormatError) em vez de interromper
+    o processamento das demais.
+
+    :raises StreamFormatError: se uma linha passar de `max_item_size` bytes
+    """
+    index = 0
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+        _check_item_size(len(pending), max_item_size, index)
+    if pending.strip():
+        yield index, _parse_line(pending)
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return StreamFormatError("JSON inválido: %s" % e)
+
+
+def iter_json_array(chunks, max_item_size=MAX_ITEM_SIZE):
+    """
+    Gera (índice, item) de um array JSON de nível superior, decodificando um
+    elemento por vez com `JSONDecoder.raw_decode` sobre um buffer deslizante.
+
+    :raises StreamFormatError: se o corpo não for um array, estiver malformado
+        ou um item passar de `max_item_size` caracteres
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    state = 'start'  # start -> value -> separator -> ... -> end
+    index = 0
+    text_chunks = _iter_text(chunks)
+    exhausted = False
+
+    while True:
+        # Pula espaços; busca mais texto quando o buffer acabar
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buffer):
+            if exhausted:
+                break
+            buffer, pos = buffer[pos:] + next(text_chunks, ''), 0
+            if not buffer:
+                exhausted = True
+            continue
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise StreamFormatError("Formato inválido. Esperava uma lista de leads.")
+            pos += 1
+            state = 'first'
+        elif state in ('first', 'value'):
+            if state == 'first' and char == ']':
+                pos += 1
+                state = 'end'
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # O item pode estar incompleto: busca mais texto antes de desistir
+                more = None if exhausted else next(text_chunks, None)
+                if more is None:
+                    raise StreamFormatError("Erro ao decodificar JSON: %s" % e)
+                buffer, pos = buffer[pos:] + more, 0
+                _check_item_size(len(buffer), max_item_size, index)
+                continue
+            if not exhausted and buffer[pos] in _NUMBER_START and _NUMBER_CHARS.issuperset(buffer[end:]):
+                # Números podem continuar no próximo bloco ("12" + "34", "6." + "5e3"):
+                # raw_decode aceita o prefixo válido e para antes de '.', 'e' ou no fim
+                more = next(text_chunks, None)
+                if more is None:
+                    exhausted = True
+                else:
+                    buffer, pos = buffer[pos:] + more, 0
+                    _check_item_size(len(buffer), max_item_size, index)
+                    continue
+            yield index, item
+            index += 1
+            pos = end
+            state = 'separator'
+        elif state == 'separator':
+            if char == ',':
+                state = 'value'
+            elif char == ']':
+                state = 'end'
+            else:
+                raise StreamFormatError("Erro ao decodificar JSON: esperava ',' ou ']' (item %d)." % index)
+            pos += 1
+        else:
+            raise StreamFormatError("Erro ao decodificar JSON: conteúdo após o fim da lista.")
+
+    if state != 'end':
+        raise StreamFormatError("Erro ao decodificar JSON: lista incompleta.")
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação de leads em fluxo (CSV/XLSX).
+
+As linhas chegam em lotes de um cursor do servidor; o CSV é escrito e
+enviado lote a lote, e o XLSX é montado em modo de memória constante num
+arquivo temporário antes de ser enviado em pedaços.
+"""
+import csv
+import io
+import tempfile
+
+try:
+    import xlsxwriter
+except ImportError:  # dependência do próprio Odoo, mas opcional aqui
+    xlsxwriter = None
+
+CHUNK_SIZE = 64 * 1024
+FETCH_SIZE = 2000
+
+# Campos armazenados que podem ser exportados, na ordem padrão das colunas
+EXPORT_FIELDS = ('name', 'phone', 'email', 'address', 'activity_summary', 'message_text',
+                 'contact_created', 'phone_normalized', 'email_normalized', 'create_date')
+DEFAULT_FIELDS = ('name', 'phone', 'email', 'address', 'activity_summary', 'contact_created', 'create_date')
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportError(ValueError):
+    """Parâmetros de exportação inválidos."""
+
+
+def parse_fields(value):
+    """Valida a lista de campos ('name,phone' ou lista) contra EXPORT_FIELDS."""
+    if not value:
+        return list(DEFAULT_FIELDS)
+    names = value.split(',') if isinstance(value, str) else list(value)
+    names = [name.strip() for name in names if name and name.strip()]
+    unknown = [name for name in names if name not in EXPORT_FIELDS]
+    if unknown:
+        raise ExportError("Campos não exportáveis: %s" % ", ".join(unknown))
+    # Remove repetidos mantendo a ordem pedida
+    return list(dict.fromkeys(names)) or list(DEFAULT_FIELDS)
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if value is True:
+        return 'Sim'
+    if value is False:
+        return 'Não'
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def iter_csv(headers, batches):
+    """
+    Gera o CSV em bytes: o cabeçalho sai imediatamente, depois um pedaço por
+    lote de linhas recebido.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(headers)
+    yield output.getvalue().encode('utf-8-sig')  # BOM para o Excel reconhecer UTF-8
+    for rows in batches:
+        output.seek(0)
+        output.truncate()
+        writer.writerows([_cell(value) for value in row] for row in rows)
+        yield output.getvalue().encode('utf-8')
+
+
+def iter_xlsx(headers, batches, sheet_name='Leads'):
+    """
+    Monta o XLSX com xlsxwriter em modo constant_memory (cada linha vai para
+    disco assim que escrita) e envia o arquivo final em pedaços.
+    """
+    if xlsxwriter is None:
+        raise ExportError("A biblioteca xlsxwriter não está instalada.")
+    with tempfile.TemporaryFile() as tmp:
+        workbook = xlsxwriter.Workbook(tmp, {'constant_memory': True, 'strings_to_urls': False,
+                                             'strings_to_formulas': False})
+        sheet = workbook.add_worksheet(sheet_name)
+        bold = workbook.add_format({'bold': True})
+        sheet.write_row(0, 0, headers, bold)
+        row_index = 1
+        for rows in batches:
+            for row in rows:
+                sheet.write_row(row_index, 0, [_cell(value) for value in row])
+                row_index += 1
+        workbook.close()
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas no estilo Prometheus acumuladas no processo.
+
+Contadores e histogramas guardam apenas os incrementos ainda não
+persistidos; o modelo `pesquisa_aiia.metric` drena esses incrementos
+periodicamente para uma tabela compartilhada, somando os valores de todos
+os workers. Histogramas são gravados como contadores cumulativos
+(`_bucket`, `_sum`, `_count`), portanto também são somáveis.
+
+Seguro entre threads e sem dependência do ORM.
+"""
+import collections
+import re
+import threading
+import time
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Limites dos histogramas de tamanho (leads por requisição)
+SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 2500, 5000, 10000, 50000)
+
+HELP = {
+    'pesquisa_aiia_requests_total': ('counter', 'Requisições recebidas por rota e status HTTP.'),
+    'pesquisa_aiia_request_bytes_total': ('counter', 'Bytes de corpo recebidos por rota.'),
+    'pesquisa_aiia_request_duration_seconds': ('histogram', 'Latência das rotas do módulo.'),
+    'pesquisa_aiia_webhook_leads_per_request': ('histogram', 'Leads recebidos por requisição do webhook.'),
+    'pesquisa_aiia_leads_created_total': ('counter', 'Leads criados pela ingestão.'),
+    'pesquisa_aiia_leads_errors_total': ('counter', 'Itens rejeitados pela ingestão.'),
+    'pesquisa_aiia_leads_duplicated_total': ('counter', 'Itens identificados como duplicados.'),
+    'pesquisa_aiia_idempotent_replays_total': ('counter', 'Retentativas respondidas com a resposta original.'),
+    'pesquisa_aiia_n8n_request_duration_seconds': ('histogram', 'Latência das chamadas ao N8N.'),
+    'pesquisa_aiia_n8n_requests_total': ('counter', 'Chamadas ao N8N por resultado.'),
+    'pesquisa_aiia_result_cache_total': ('counter', 'Consultas ao cache de resultados por desfecho (hit, miss, refresh).'),
+    'pesquisa_aiia_searches': ('gauge', 'Pesquisas por status.'),
+}
+
+_LE_RE = re.compile(r'(?:^|,)le="([^"]*)"')
+_SUFFIX_ORDER = {'_bucket': 0, '_sum': 1, '_count': 2}
+
+_lock = threading.Lock()
+_pending = collections.defaultdict(float)
+_last_flush = time.monotonic()
+
+
+def format_labels(labels):
+    """Serializa os labels de forma estável: k1="v1",k2="v2"."""
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for key, value in sorted(labels.items()))
+
+
+def inc(name, value=1.0, **labels):
+    with _lock:
+        _pending[(name, format_labels(labels))] += value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Registra uma observação em um histograma (buckets cumulativos)."""
+    with _lock:
+        for bound in buckets:
+            if value <= bound:
+                _pending[(name + '_bucket', format_labels(dict(labels, le=repr(float(bound)))))] += 1
+        _pending[(name + '_bucket', format_labels(dict(labels, le='+Inf')))] += 1
+        _pending[(name + '_sum', format_labels(labels))] += value
+        _pending[(name + '_count', format_labels(labels))] += 1
+
+
+def drain(min_interval=0.0):
+    """
+    Retorna e zera os incrementos pendentes {(nome, labels): valor}.
+    Com `min_interval`, só drena se o último dreno foi há mais tempo que isso.
+    """
+    global _last_flush
+    with _lock:
+        now = time.monotonic()
+        if not _pending or now - _last_flush < min_interval:
+            return {}
+        _last_flush = now
+        pending = dict(_pending)
+        _pending.clear()
+        return pending
+
+
+def restore(pending):
+    """Devolve incrementos que não puderam ser persistidos."""
+    with _lock:
+        for key, value in pending.items():
+            _pending[key] += value
+
+
+def _base_name(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in HELP:
+            return name[:-len(suffix)]
+    return name
+
+
+def _sort_key(sample):
+    """Agrupa por família e série; buckets em ordem crescente de 'le'."""
+    name, labels, _value = sample
+    family = _base_name(name)
+    match = _LE_RE.search(labels)
+    le = float('inf')
+    if match:
+        le = float(match.group(1)) if match.group(1) != '+Inf' else float('inf')
+        labels = _LE_RE.sub('', labels).strip(',')
+    return (family, labels, _SUFFIX_ORDER.get(name[len(family):], 0), le)
+
+
+def render(samples):
+    """
+    Gera o formato texto de exposição do Prometheus (0.0.4).
+    :param samples: iterável de (nome, labels_serializados, valor)
+    """
+    by_family = collections.OrderedDict()
+    for name, labels, value in sorted(samples, key=_sort_key):
+        by_family.setdefault(_base_name(name), []).append((name, labels, value))
+    lines = []
+    for family, family_samples in by_family.items():
+        metric_type, help_text = HELP.get(family, ('untyped', ''))
+        if help_text:
+            lines.append('# HELP %s %s' % (family, help_text))
+        lines.append('# TYPE %s %s' % (family, metric_type))
+        for name, labels, value in family_samples:
+            lines.append('%s%s %s' % (name, '{%s}' % labels if labels else '', repr(float(value))))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP compartilhado para todo o tráfego de saída para o N8N.
+
+- Um pool de sessões keep-alive por processo, chaveado pela URL de destino.
+- Timeouts separados de conexão e de leitura.
+- Retentativas com jitter apenas quando repetir é seguro.
+- Circuit breaker por URL: com o N8N fora do ar as chamadas falham na hora,
+  sem prender threads/workers esperando timeout.
+
+Não depende do ORM, para poder ser testado contra um servidor HTTP local.
+"""
+import collections
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+ClientConfig = collections.namedtuple('ClientConfig', [
+    'connect_timeout',    # segundos para abrir a conexão TCP/TLS
+    'read_timeout',       # segundos esperando a resposta
+    'max_retries',        # retentativas além da primeira chamada
+    'backoff_base',       # base (s) do backoff exponencial com jitter
+    'breaker_threshold',  # falhas consecutivas que abrem o circuito
+    'breaker_cooldown',   # segundos com o circuito aberto antes de testar de novo
+    'pool_maxsize',       # conexões keep-alive por URL
+])
+
+DEFAULT_CONFIG = ClientConfig(
+    connect_timeout=5.0,
+    read_timeout=30.0,
+    max_retries=2,
+    backoff_base=0.5,
+    breaker_threshold=5,
+    breaker_cooldown=60.0,
+    pool_maxsize=8,
+)
+
+# Status em que o servidor recusou o pedido sem processá-lo: sempre seguro repetir
+SAFE_RETRY_STATUS = frozenset({429, 502, 503})
+# Status em que o pedido pode ter sido processado: só repete se for idempotente
+IDEMPOTENT_RETRY_STATUS = frozenset({408, 504})
+# Teto para o header Retry-After, para não prender a thread indefinidamente
+MAX_RETRY_AFTER = 10.0
+
+
+class N8NClientError(Exception):
+    """Falha ao chamar o N8N. `retryable` indica se vale a pena tentar depois."""
+
+    def __init__(self, message, retryable=True, status_code=None, response_text=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+        self.response_text = response_text
+
+
+class CircuitOpenError(N8NClientError):
+    """O circuito para a URL está aberto: a chamada nem foi tentada."""
+
+
+class CircuitBreaker:
+    """Circuit breaker simples (fechado → aberto → meio-aberto), seguro entre threads."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = max(int(threshold), 1)
+        self.cooldown = float(cooldown)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Retorna True se uma chamada pode ser feita agora."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                # Deixa passar uma única chamada de teste
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def retry_in(self):
+        """Segundos até o circuito aceitar uma chamada de teste."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    _logger.warning("Cliente N8N: circuito aberto após %d falha(s) consecutiva(s).", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_sessions = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_session(url, config=DEFAULT_CONFIG):
+    """Sessão keep-alive do processo para a URL (criada na primeira chamada)."""
+    with _registry_lock:
+        session = _sessions.get(url)
+        if session is None:
+            session = requests.Session()
+            # Retentativas são feitas aqui, não pelo urllib3
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(int(config.pool_maxsize), 1), max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[url] = session
+        return session
+
+
+def get_breaker(url, config=DEFAULT_CONFIG):
+    with _registry_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = _breakers[url] = CircuitBreaker(config.breaker_threshold, config.breaker_cooldown)
+        else:
+            # Acompanha alterações nas configurações sem recriar o estado
+            breaker.threshold = max(int(config.breaker_threshold), 1)
+            breaker.cooldown = float(config.breaker_cooldown)
+        return breaker
+
+
+def reset():
+    """Fecha as sessões e zera os circuitos (útil em testes)."""
+    with _registry_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _breakers.clear()
+
+
+def _backoff_delay(config, attempt, response=None):
+    retry_after = response is not None and response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    # "Full jitter": espalha as retentativas de vários workers no tempo
+    return random.uniform(0, config.backoff_base * (2 ** attempt))
+
+
+def post(url, data, config=DEFAULT_CONFIG, headers=None, idempotent=False):
+    """
+    Faz POST para o N8N e retorna o `requests.Response` de sucesso (2xx).
+
+    Só repete automaticamente o que é seguro: timeout de conexão e 429/502/503
+    (o pedido não foi processado) sempre; timeouts de leitura, quedas de
+    conexão e 408/504 apenas se `idempotent` for True.
+
+    :raises CircuitOpenError: se o circuito para a URL estiver aberto
+    :raises N8NClientError: se a chamada falhar após as retentativas
+    """
+    breaker = get_breaker(url, config)
+    if not breaker.allow():
+        raise CircuitOpenError("N8N indisponível: circuito aberto, nova tentativa em %ds." % breaker.retry_in())
+
+    try:
+        return _post_attempts(url, data, config, breaker, headers, idempotent)
+    except N8NClientError:
+        # Falha (ou sucesso, em 4xx) já registrada no circuito
+        raise
+    except BaseException:
+        # Erro inesperado: sem registrar, uma chamada de teste deixaria o circuito
+        # preso em meio-aberto, recusando todas as chamadas seguintes
+        breaker.record_failure()
+        raise
+
+
+def _post_attempts(url, data, config, breaker, headers, idempotent):
+    """Laço de tentativas de `post`, registrando no circuito o resultado das chamadas."""
+    session = get_session(url, config)
+    request_headers = {'Content-Type': 'application/json'}
+    request_headers.update(headers or {})
+    timeout = (config.connect_timeout, config.read_timeout)
+    attempt = 0
+    while True:
+        response = None
+        try:
+            response = session.post(url, data=data, headers=request_headers, timeout=timeout)
+        except requests.exceptions.ConnectTimeout as e:
+            error = N8NClientError("Timeout ao conectar no N8N: %s" % e)
+            can_retry = True
+        except requests.exceptions.ReadTimeout:
+            error = N8NClientError("Timeout N8N: O serviço externo demorou muito para responder.")
+            can_retry = idempotent
+        except requests.exceptions.ConnectionError as e:
+            error = N8NClientError("Erro de conexão com o N8N: %s" % e)
+            can_retry = idempotent
+        except requests.exceptions.RequestException as e:
+            # Erros de uso (URL inválida etc.): repetir não resolve
+            breaker.record_failure()
+            raise N8NClientError("Erro N8N: %s" % e, retryable=False)
+        else:
+            if response.ok:
+                breaker.record_success()
+                return response
+            status = response.status_code
+            error = N8NClientError("Erro N8N (HTTP %s): %s" % (status, response.text[:500]),
+                                   retryable=status >= 500 or status in SAFE_RETRY_STATUS | IDEMPOTENT_RETRY_STATUS,
+                                   status_code=status, response_text=response.text[:500])
+            if not error.retryable:
+                # 4xx: o N8N respondeu, o problema é o pedido; não conta contra o circuito
+                breaker.record_success()
+                raise error
+            can_retry = status in SAFE_RETRY_STATUS or (idempotent and status in IDEMPOTENT_RETRY_STATUS)
+
+        if not can_retry or attempt >= config.max_retries:
+            breaker.record_failure()
+            raise error
+        delay = _backoff_delay(config, attempt, response)
+        _logger.info("Cliente N8N: tentativa %d falhou (%s); repetindo em %.2fs.", attempt + 1, error, delay)
+        attempt += 1
+        time.sleep(delay)
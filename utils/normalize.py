@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Funções puras de normalização usadas para deduplicar leads.
+Não dependem do ORM para que possam ser aplicadas em lote na ingestão.
+"""
+import hashlib
+import re
+import unicodedata
+
+DEFAULT_COUNTRY_CODE = '55'  # Brasil
+
+_NON_DIGITS_RE = re.compile(r'\D+')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def normalize_phone_e164(phone, default_country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Converte um telefone livre para E.164 (ex.: '+5511987654321').
+    Números sem DDI recebem o código padrão, desde que tenham DDD + número
+    (10 ou 11 dígitos): um número local sem DDD ('3432-1234') não tem como
+    ser completado e viraria um DDI estrangeiro. Retorna False se inválido.
+    """
+    if not phone or not isinstance(phone, str):
+        return False
+    phone = phone.strip()
+    has_plus = phone.startswith('+')
+    digits = _NON_DIGITS_RE.sub('', phone)
+    if not digits:
+        return False
+    if not has_plus:
+        if digits.startswith('00'):
+            # Prefixo internacional discado (00 + DDI)
+            digits = digits[2:]
+        elif default_country_code and digits.startswith(default_country_code) and len(digits) in (12, 13):
+            pass
+        else:
+            # Prefixo de operadora/tronco nacional (0 + DDD)
+            digits = digits.lstrip('0')
+            if default_country_code:
+                if len(digits) not in (10, 11):
+                    return False
+                digits = default_country_code + digits
+    # E.164: no máximo 15 dígitos; menos de 8 não é um número utilizável
+    if not 8 <= len(digits) <= 15:
+        return False
+    return '+' + digits
+
+
+def normalize_email(email):
+    """E-mail sem espaços e em minúsculas. Retorna False se não parecer um e-mail."""
+    if not email or not isinstance(email, str):
+        return False
+    email = email.strip().lower()
+    if email.startswith('mailto:'):
+        email = email[7:]
+    return email if _EMAIL_RE.match(email) else False
+
+
+def _simplify_text(text):
+    """Minúsculas, sem acentos e sem pontuação, para comparação aproximada."""
+    if not text or not isinstance(text, str):
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM_RE.sub(' ', text.lower()).strip()
+
+
+def normalize_query(query):
+    """Termo de pesquisa simplificado (sem acentos, pontuação e espaços extras), para o cache de resultados."""
+    return ' '.join(_simplify_text(query).split()) or False
+
+
+def lead_fingerprint(name, address):
+    """Hash estável de nome + endereço simplificados. Retorna False sem nome."""
+    simple_name = _simplify_text(name)
+    if not simple_name:
+        return False
+    key = '%s|%s' % (simple_name, _simplify_text(address))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def lead_keys(vals):
+    """Retorna as chaves normalizadas para um dicionário de valores de lead."""
+    return {
+        'phone_normalized': normalize_phone_e164(vals.get('phone')),
+        'email_normalized': normalize_email(vals.get('email')),
+        'fingerprint': lead_fingerprint(vals.get('name'), vals.get('address')),
+    }
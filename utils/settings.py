@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot tipado e imutável dos parâmetros `pesquisa_aiia.*`.
+Carregado de uma vez por `ir.config_parameter._get_pesquisa_aiia_settings()`.
+"""
+import dataclasses
+
+PARAM_PREFIX = 'pesquisa_aiia.'
+
+# Campos cuja chave em ir.config_parameter não segue o padrão prefixo + nome
+_PARAM_KEYS = {
+    'update_secret': 'pesquisa_aiia.aiia_odoo_update_secret',
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class AiiaSettings:
+    # Webhooks (N8N -> Odoo)
+    webhook_secret: str = ''
+    update_secret: str = ''
+    webhook_batch_size: int = 500
+    webhook_max_body_mb: int = 50
+    idempotency_ttl_hours: int = 24
+    dedup_policy: str = 'skip'
+    chatter_status_summary: bool = False
+    # Mensagens padrão
+    default_whatsapp_msg: str = ''
+    default_email_subject: str = ''
+    default_email_body: str = ''
+    result_cache_ttl_hours: int = 0
+    mass_mail_batch_size: int = 200
+    mass_mail_batch_interval: int = 60
+    # Disparo de pesquisas (Odoo -> N8N)
+    n8n_scrape_trigger_url: str = ''
+    outbox_max_workers: int = 4
+    outbox_max_attempts: int = 5
+    outbox_retry_base_seconds: int = 30
+    http_connect_timeout: float = 5.0
+    http_read_timeout: float = 30.0
+    http_max_retries: int = 2
+    http_breaker_threshold: int = 5
+    http_breaker_cooldown: float = 60.0
+    rate_limit_rps: float = 0.0
+    rate_limit_burst: int = 5
+    rate_limit_user_rps: float = 0.0
+    rate_limit_user_burst: int = 2
+    max_in_flight: int = 0
+    max_in_flight_per_user: int = 0
+    processing_timeout_minutes: int = 60
+    auto_paginate_max_concurrent: int = 4
+    auto_paginate_max_per_user: int = 2
+    # Retenção
+    retention_lead_days: int = 0
+    retention_search_days: int = 0
+    retention_batch_size: int = 5000
+    # Observabilidade
+    metrics_token: str = ''
+
+    @classmethod
+    def param_key(cls, field_name):
+        return _PARAM_KEYS.get(field_name, PARAM_PREFIX + field_name)
+
+    @classmethod
+    def from_params(cls, params):
+        """Monta o snapshot a partir de {chave: valor}, convertendo os tipos e
+        mantendo o padrão quando o valor está ausente ou inválido."""
+        values = {}
+        for field in dataclasses.fields(cls):
+            raw = params.get(cls.param_key(field.name))
+            if raw is None or raw == '':
+                continue
+            if field.type in (int, 'int'):
+                converter = int
+            elif field.type in (float, 'float'):
+                converter = float
+            elif field.type in (bool, 'bool'):
+                converter = lambda value: str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+            else:
+                converter = str
+            try:
+                values[field.name] = converter(raw)
+            except (TypeError, ValueError):
+                continue
+        return cls(**values)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Modelos de mensagem com marcadores por lead, ex.: "Olá [Nome da Empresa]".
+
+O texto é analisado uma única vez (cache por conteúdo: ao mudar a
+configuração, o novo texto vira outra entrada) e renderizado por simples
+concatenação, o que permite renderizar um recordset inteiro de uma vez.
+Marcadores desconhecidos ficam como estão.
+"""
+import functools
+import re
+
+# Marcador -> chave nos valores de renderização
+PLACEHOLDERS = {
+    '[Nome da Empresa]': 'name',
+    '[Endereço]': 'address',
+    '[Resumo da Atividade]': 'activity_summary',
+    '[Pesquisa]': 'search_query',
+}
+
+_PLACEHOLDER_RE = re.compile('|'.join(re.escape(placeholder) for placeholder in PLACEHOLDERS))
+
+
+class CompiledTemplate:
+    """Texto já dividido em trechos literais e chaves de marcador."""
+
+    __slots__ = ('parts', 'keys')
+
+    def __init__(self, parts):
+        # parts: tupla de (é_marcador, texto_ou_chave)
+        self.parts = parts
+        self.keys = frozenset(value for is_key, value in parts if is_key)
+
+    def render(self, values, keep_missing=False):
+        """
+        Substitui os marcadores pelos valores (None/False viram texto vazio).
+        Com keep_missing=True, chaves ausentes de `values` mantêm o marcador,
+        para uma renderização parcial (ex.: só a pesquisa, antes dos leads).
+        """
+        if not self.keys:
+            return ''.join(value for _is_key, value in self.parts)
+        output = []
+        for is_key, value in self.parts:
+            if not is_key:
+                output.append(value)
+            elif keep_missing and value not in values:
+                output.append(_KEY_PLACEHOLDERS[value])
+            else:
+                output.append(values.get(value) or '')
+        return ''.join(output)
+
+
+_KEY_PLACEHOLDERS = {key: placeholder for placeholder, key in PLACEHOLDERS.items()}
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(text):
+    """Analisa o texto uma vez; chamadas seguintes com o mesmo texto vêm do cache."""
+    parts = []
+    position = 0
+    for match in _PLACEHOLDER_RE.finditer(text or ''):
+        if match.start() > position:
+            parts.append((False, text[position:match.start()]))
+        parts.append((True, PLACEHOLDERS[match.group(0)]))
+        position = match.end()
+    if text and position < len(text):
+        parts.append((False, text[position:]))
+    return CompiledTemplate(tuple(parts))
+
+
+def render(text, values, keep_missing=False):
+    return compile_template(text).render(values, keep_missing=keep_missing)